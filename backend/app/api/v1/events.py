@@ -3,15 +3,18 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Any
 
-import csv
-import io
-
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
-from sqlalchemy import Select, and_, func, or_, select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, and_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import get_session
 from app.models.event import Event
+from app.services.csv_export import stream_csv
+from app.services.event_counts import COUNT_MODE_PATTERN, count_events, page_meta
+from app.services.event_pages import EVENT_FEED_ORDER, keyset_page, split_keyset_page
+from app.services.event_search import event_search_condition
+from app.services.event_text import EVENT_DESCRIPTION_COLUMNS, event_to_out, render_description
 
 router = APIRouter(prefix="/events")
 
@@ -23,25 +26,6 @@ def _parse_dt(value: str) -> datetime | None:
         return None
 
 
-def _event_to_out(e: Event) -> dict[str, Any]:
-    return {
-        "id": e.id,
-        "timestamp": e.timestamp.isoformat(),
-        "type": e.type,
-        "objectId": e.object_id,
-        "objectName": e.object_name,
-        "clientName": e.client_name,
-        "severity": e.severity,
-        "status": e.status,
-        "code": getattr(e, "code", None),
-        "codeText": getattr(e, "code_text", None),
-        "stateName": getattr(e, "state_name", None),
-        "description": e.description,
-        "location": e.location,
-        "operatorId": e.operator_id,
-    }
-
-
 @router.get("")
 async def list_events(
     page: int = Query(1, ge=1),
@@ -53,8 +37,17 @@ async def list_events(
     severity: str | None = None,
     status: str | None = None,
     search: str | None = None,
+    cursor: str | None = Query(None, description="Курсор nextCursor предыдущей страницы (пустой — первая страница)"),
+    count: str = Query("exact", pattern=COUNT_MODE_PATTERN, description="total: exact (кэш до синка) | estimate | none"),
     session: AsyncSession = Depends(get_session),
 ) -> dict[str, Any]:
+    """Лента событий.
+
+    По умолчанию — страницы page/pageSize с total. Способ подсчёта total выбирает клиент
+    (count, см. app.services.event_counts): при листании во время инцидента достаточно
+    estimate или none — следующая страница определяется по hasMore. С параметром cursor —
+    keyset-режим для бесконечной прокрутки: без total и OFFSET, следующая страница — по nextCursor.
+    """
     filters: list[Any] = []
 
     if type:
@@ -76,41 +69,91 @@ async def list_events(
             filters.append(Event.timestamp <= dt_to)
 
     if search and search.strip():
-        needle = f"%{search.strip()}%"
-        filters.append(
-            or_(
-                Event.description.ilike(needle),
-                Event.object_name.ilike(needle),
-                Event.client_name.ilike(needle),
-                Event.location.ilike(needle),
-            )
-        )
+        filters.append(await event_search_condition(session, search))
 
     where = and_(*filters) if filters else None
 
-    count_stmt = select(func.count()).select_from(Event)
-    if where is not None:
-        count_stmt = count_stmt.where(where)
-    total = (await session.execute(count_stmt)).scalar_one()
-
-    stmt: Select[tuple[Event]] = select(Event).order_by(Event.timestamp.desc())
+    if cursor is not None:
+        stmt = select(Event)
+        if where is not None:
+            stmt = stmt.where(where)
+        try:
+            stmt = keyset_page(stmt, cursor, pageSize)
+        except ValueError:
+            raise HTTPException(status_code=400, detail={"code": "VALIDATION", "message": "Invalid cursor"})
+        rows, next_cursor = split_keyset_page((await session.execute(stmt)).scalars().all(), pageSize)
+        return {
+            "data": [event_to_out(e) for e in rows],
+            "pageSize": pageSize,
+            "nextCursor": next_cursor,
+            "hasMore": next_cursor is not None,
+        }
+
+    total, count_mode = await count_events(session, where, count)
+
+    stmt: Select[tuple[Event]] = select(Event).order_by(*EVENT_FEED_ORDER)
     if where is not None:
         stmt = stmt.where(where)
-    stmt = stmt.offset((page - 1) * pageSize).limit(pageSize)
+    # Лишняя строка — признак следующей страницы без опоры на total.
+    stmt = stmt.offset((page - 1) * pageSize).limit(pageSize + 1)
 
-    rows = (await session.execute(stmt)).scalars().all()
-    page_items = [_event_to_out(e) for e in rows]
-    total_pages = (total + pageSize - 1) // pageSize if pageSize else 1
+    rows, next_cursor = split_keyset_page((await session.execute(stmt)).scalars().all(), pageSize)
 
     return {
-        "data": page_items,
-        "total": total,
-        "page": page,
-        "pageSize": pageSize,
-        "totalPages": total_pages,
+        "data": [event_to_out(e) for e in rows],
+        **page_meta(total, count_mode, page, pageSize, next_cursor is not None),
+        # Продолжение этой страницы в keyset-режиме (для перехода к «более старым»).
+        "nextCursor": next_cursor,
     }
 
 
+_EXPORT_HEADER = (
+    "id",
+    "timestamp",
+    "type",
+    "object_id",
+    "object_name",
+    "client_name",
+    "code",
+    "code_text",
+    "state_name",
+    "severity",
+    "status",
+    "location",
+    "description",
+)
+
+# Выгрузка читает только нужные колонки (без ORM-объектов Event).
+_EXPORT_COLUMNS = (
+    Event.timestamp,
+    Event.type,
+    Event.object_name,
+    Event.client_name,
+    Event.severity,
+    Event.status,
+    Event.location,
+    *EVENT_DESCRIPTION_COLUMNS,
+)
+
+
+def _export_row(e: Any) -> list[Any]:
+    return [
+        e.id,
+        e.timestamp.isoformat(),
+        e.type,
+        e.object_id or "",
+        e.object_name,
+        e.client_name,
+        e.code or "",
+        e.code_text or "",
+        e.state_name or "",
+        e.severity,
+        e.status,
+        e.location or "",
+        render_description(e).replace("\r\n", "\n"),
+    ]
+
+
 @router.get("/export")
 async def export_events_csv(
     dateFrom: str | None = None,
@@ -122,7 +165,7 @@ async def export_events_csv(
     search: str | None = None,
     limit: int = Query(50000, ge=1, le=200000),
     session: AsyncSession = Depends(get_session),
-) -> Response:
+) -> StreamingResponse:
     filters: list[Any] = []
 
     if type:
@@ -144,65 +187,17 @@ async def export_events_csv(
             filters.append(Event.timestamp <= dt_to)
 
     if search and search.strip():
-        needle = f"%{search.strip()}%"
-        filters.append(
-            or_(
-                Event.description.ilike(needle),
-                Event.object_name.ilike(needle),
-                Event.client_name.ilike(needle),
-                Event.location.ilike(needle),
-            )
-        )
+        filters.append(await event_search_condition(session, search))
 
     where = and_(*filters) if filters else None
 
-    stmt: Select[tuple[Event]] = select(Event).order_by(Event.timestamp.desc()).limit(limit)
+    stmt = select(*_EXPORT_COLUMNS).order_by(*EVENT_FEED_ORDER).limit(limit)
     if where is not None:
         stmt = stmt.where(where)
-    rows = (await session.execute(stmt)).scalars().all()
-
-    buf = io.StringIO()
-    writer = csv.writer(buf, delimiter=";")
-    writer.writerow(
-        [
-            "id",
-            "timestamp",
-            "type",
-            "object_id",
-            "object_name",
-            "client_name",
-            "code",
-            "code_text",
-            "state_name",
-            "severity",
-            "status",
-            "location",
-            "description",
-        ]
-    )
-    for e in rows:
-        writer.writerow(
-            [
-                e.id,
-                e.timestamp.isoformat(),
-                e.type,
-                e.object_id or "",
-                e.object_name,
-                e.client_name,
-                getattr(e, "code", "") or "",
-                getattr(e, "code_text", "") or "",
-                getattr(e, "state_name", "") or "",
-                e.severity,
-                e.status,
-                e.location or "",
-                (e.description or "").replace("\r\n", "\n"),
-            ]
-        )
-
-    content = buf.getvalue()
+
     filename = f"events-export-{datetime.utcnow().date().isoformat()}.csv"
-    return Response(
-        content=content,
+    return StreamingResponse(
+        stream_csv(stmt, _EXPORT_HEADER, _export_row),
         media_type="text/csv; charset=utf-8",
         headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
@@ -215,5 +210,5 @@ async def get_event(
 ) -> dict[str, Any]:
     e = await session.get(Event, event_id)
     if e:
-        return _event_to_out(e)
+        return event_to_out(e)
     raise HTTPException(status_code=404, detail={"code": "NOT_FOUND", "message": "Event not found"})
@@ -11,6 +11,7 @@ from app.api.v1.deps import get_current_user
 from app.db.session import get_session
 from app.models.event import Event
 from app.models.notification import NotificationClear, NotificationRead
+from app.services.event_text import render_description
 
 router = APIRouter(prefix="/notifications")
 
@@ -56,7 +57,8 @@ async def list_notifications(
     out: list[dict[str, Any]] = []
     for e in events:
         title = "Критическое событие" if e.severity == "critical" else "Предупреждение"
-        msg = (e.description.splitlines()[0] if e.description else e.object_name) if e else ""
+        text = render_description(e) if e else ""
+        msg = (text.splitlines()[0] if text else e.object_name) if e else ""
         out.append(
             {
                 "id": e.id,
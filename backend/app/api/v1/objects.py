@@ -5,12 +5,16 @@ from datetime import datetime
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import Select, and_, func, not_, or_, select
+from sqlalchemy import Select, and_, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import get_session
 from app.models.event import Event
 from app.models.object import Object
+from app.services.event_counts import COUNT_MODE_PATTERN, count_events, page_meta
+from app.services.event_pages import EVENT_FEED_ORDER, keyset_page, split_keyset_page
+from app.services.event_text import event_to_out
+from app.services.object_search import object_visibility_filters, pg_object_search, search_object_ids
 
 router = APIRouter(prefix="/objects")
 
@@ -67,43 +71,39 @@ async def list_objects(
     ),
     session: AsyncSession = Depends(get_session),
 ) -> dict[str, Any]:
-    filters: list[Any] = []
-
-    # By default, hide terminated/disabled objects.
-    if not includeDisabled:
-        filters.append(Object.disabled.is_(False))
-
-    # In some deployments, terminated objects are stored with Panel_id like 'IDxxxxx'.
-    if not includeIdPrefix:
-        filters.append(not_(Object.id.ilike("ID%")))
-
-    # In some deployments, terminated objects are stored with leading '*'.
-    if not includeStarPrefix:
-        filters.append(not_(Object.id.like("*%")))
-    if search and search.strip():
-        needle = f"%{search.strip()}%"
-        filters.append(
-            or_(
-                Object.id.ilike(needle),
-                Object.name.ilike(needle),
-                Object.address.ilike(needle),
-                Object.client_name.ilike(needle),
-            )
+    filters: list[Any] = object_visibility_filters(
+        include_disabled=includeDisabled,
+        include_id_prefix=includeIdPrefix,
+        include_star_prefix=includeStarPrefix,
+    )
+    needle = search.strip() if search else ""
+
+    stmt: Select[tuple[Object]] = select(Object)
+    if filters:
+        stmt = stmt.where(and_(*filters))
+    ranked = await pg_object_search(session, stmt, needle) if needle else None
+
+    if needle and ranked is None:
+        # Не Postgres: триграммный индекс в памяти, ранжированный список panel_id.
+        ids = await search_object_ids(
+            session,
+            needle,
+            include_disabled=includeDisabled,
+            include_id_prefix=includeIdPrefix,
+            include_star_prefix=includeStarPrefix,
         )
-
-    where = and_(*filters) if filters else None
-
-    count_stmt = select(func.count()).select_from(Object)
-    if where is not None:
-        count_stmt = count_stmt.where(where)
-    total = (await session.execute(count_stmt)).scalar_one()
-
-    stmt: Select[tuple[Object]] = select(Object).order_by(Object.id.asc())
-    if where is not None:
-        stmt = stmt.where(where)
-    stmt = stmt.offset((page - 1) * pageSize).limit(pageSize)
-
-    rows = (await session.execute(stmt)).scalars().all()
+        total = len(ids)
+        page_ids = ids[(page - 1) * pageSize : page * pageSize]
+        by_id = {
+            o.id: o for o in (await session.execute(select(Object).where(Object.id.in_(page_ids)))).scalars().all()
+        }
+        rows = [by_id[i] for i in page_ids if i in by_id]
+    else:
+        stmt = ranked if ranked is not None else stmt.order_by(Object.id.asc())
+        count_stmt = select(func.count()).select_from(stmt.order_by(None).subquery())
+        total = (await session.execute(count_stmt)).scalar_one()
+        stmt = stmt.offset((page - 1) * pageSize).limit(pageSize)
+        rows = (await session.execute(stmt)).scalars().all()
 
     # Добавим лёгкую статистику: последние событие и кол-во за сегодня.
     today = date_type.today()
@@ -193,43 +193,37 @@ async def list_object_events(
     object_id: str,
     page: int = Query(1, ge=1),
     pageSize: int = Query(50, ge=1, le=500),
+    cursor: str | None = Query(None, description="Курсор nextCursor предыдущей страницы (пустой — первая страница)"),
+    count: str = Query("exact", pattern=COUNT_MODE_PATTERN, description="total: exact (кэш до синка) | estimate | none"),
     session: AsyncSession = Depends(get_session),
 ) -> dict[str, Any]:
-    # reuse events pagination format
-    total = (
-        await session.execute(select(func.count()).select_from(Event).where(Event.object_id == object_id))
-    ).scalar_one()
+    # reuse events pagination format (page/pageSize с count или keyset по cursor, см. /events)
+    if cursor is not None:
+        try:
+            stmt = keyset_page(select(Event).where(Event.object_id == object_id), cursor, pageSize)
+        except ValueError:
+            raise HTTPException(status_code=400, detail={"code": "VALIDATION", "message": "Invalid cursor"})
+        rows, next_cursor = split_keyset_page((await session.execute(stmt)).scalars().all(), pageSize)
+        return {
+            "data": [event_to_out(e) for e in rows],
+            "pageSize": int(pageSize),
+            "nextCursor": next_cursor,
+            "hasMore": next_cursor is not None,
+        }
+
+    total, count_mode = await count_events(session, Event.object_id == object_id, count)
 
     stmt = (
         select(Event)
         .where(Event.object_id == object_id)
-        .order_by(Event.timestamp.desc())
+        .order_by(*EVENT_FEED_ORDER)
         .offset((page - 1) * pageSize)
-        .limit(pageSize)
+        .limit(pageSize + 1)
     )
-    rows = (await session.execute(stmt)).scalars().all()
-
-    items = [
-        {
-            "id": e.id,
-            "timestamp": e.timestamp.isoformat(),
-            "type": e.type,
-            "objectId": e.object_id,
-            "objectName": e.object_name,
-            "clientName": e.client_name,
-            "severity": e.severity,
-            "status": e.status,
-            "description": e.description,
-            "location": e.location,
-            "operatorId": e.operator_id,
-        }
-        for e in rows
-    ]
-    total_pages = (total + pageSize - 1) // pageSize if pageSize else 1
+    rows, next_cursor = split_keyset_page((await session.execute(stmt)).scalars().all(), pageSize)
+
     return {
-        "data": items,
-        "total": int(total),
-        "page": int(page),
-        "pageSize": int(pageSize),
-        "totalPages": int(total_pages),
+        "data": [event_to_out(e) for e in rows],
+        **page_meta(total, count_mode, int(page), int(pageSize), next_cursor is not None),
+        "nextCursor": next_cursor,
     }
@@ -2,15 +2,19 @@ from __future__ import annotations
 
 from datetime import datetime
 from datetime import date as date_type
+from typing import Any
 
-from fastapi import APIRouter, Depends, Query, Response
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import and_, case, func, or_, select
 
 from app.db.session import get_session
+from app.services.csv_export import stream_csv
 from app.services.report_service import export_daily_report_csv, today_str
 from app.models.event import Event
 from app.models.object import Object
+from app.services.event_text import event_text_match
 
 router = APIRouter(prefix="/reports")
 
@@ -62,12 +66,11 @@ async def list_reports(session: AsyncSession = Depends(get_session)) -> list[dic
 @router.get("/export/daily")
 async def export_daily(
     date: str = Query(default_factory=today_str, description="YYYY-MM-DD"),
-    session: AsyncSession = Depends(get_session),
-) -> Response:
-    content = await export_daily_report_csv(session=session, date=date)
+) -> StreamingResponse:
+    content = export_daily_report_csv(date=date)
     filename = f"daily-report-{date}.csv"
-    return Response(
-        content=content,
+    return StreamingResponse(
+        content,
         media_type="text/csv; charset=utf-8",
         headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
@@ -85,8 +88,7 @@ async def export_phrase_counts(
     phraseB: str = Query(default="Объект не поставлен под охрану по расписанию", min_length=1),
     # Output
     limit: int = Query(default=50000, ge=1, le=200000),
-    session: AsyncSession = Depends(get_session),
-) -> Response:
+) -> StreamingResponse:
     """Экспорт агрегированного отчёта (по объектам) по двум ключевым фразам.
 
     Нужен для периодических запросов вида:
@@ -129,8 +131,8 @@ async def export_phrase_counts(
     obj_name = func.coalesce(Object.name, Event.object_name)
     obj_addr = func.coalesce(Object.address, Event.location)
 
-    a_count = func.sum(case((or_(Event.description.ilike(p_a), Event.code_text.ilike(p_a)), 1), else_=0))
-    b_count = func.sum(case((or_(Event.description.ilike(p_b), Event.code_text.ilike(p_b)), 1), else_=0))
+    a_count = func.sum(case((event_text_match(p_a), 1), else_=0))
+    b_count = func.sum(case((event_text_match(p_b), 1), else_=0))
 
     stmt = (
         select(
@@ -150,43 +152,32 @@ async def export_phrase_counts(
     if where is not None:
         stmt = stmt.where(where)
 
-    rows = (await session.execute(stmt)).all()
-
-    import csv
-    import io
-
-    buf = io.StringIO()
-    writer = csv.writer(buf, delimiter=";")
-    writer.writerow(
-        [
-            "object_id",
-            "object_name",
-            "address",
-            phraseA,
-            phraseB,
-            "примечание",
+    header = [
+        "object_id",
+        "object_name",
+        "address",
+        phraseA,
+        phraseB,
+        "примечание",
+    ]
+
+    def to_row(r: Any) -> list[Any]:
+        return [
+            r.object_id or "",
+            r.object_name or "",
+            r.address or "",
+            int(r.phrase_a_count or 0),
+            int(r.phrase_b_count or 0),
+            "",
         ]
-    )
-
-    for object_id, object_name, address, c_a, c_b in rows:
-        writer.writerow(
-            [
-                object_id or "",
-                object_name or "",
-                address or "",
-                int(c_a or 0),
-                int(c_b or 0),
-                "",
-            ]
-        )
 
     # Use UTF-8 with BOM for Excel compatibility
-    content = buf.getvalue().encode("utf-8-sig")
+    content = stream_csv(stmt, header, to_row, bom=True)
     y = str(year) if year is not None else "custom"
     safe_client = client.replace('"', "").replace("'", "").strip() or "all"
     filename = f"phrase-counts-{y}-{safe_client}.csv"
-    return Response(
-        content=content,
+    return StreamingResponse(
+        content,
         media_type="text/csv; charset=utf-8",
         headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
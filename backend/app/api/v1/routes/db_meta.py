@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import asyncio
 from typing import Any
 
 from fastapi import APIRouter, HTTPException, Query
@@ -8,15 +7,28 @@ from sqlalchemy import func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
+from app.db.bulk_upsert import bulk_upsert
 from app.services.sync_service import (
+    format_states_watermark,
     get_mssql_event_cursor,
+    get_mssql_objects_watermark,
+    get_mssql_states_watermark,
+    refresh_event_states_from_agency_mssql,
+    refresh_recent_alarms_from_agency_mysql,
     set_mssql_event_cursor,
     sync_events_from_agency_mssql_archives,
     sync_events_from_agency_mysql,
     sync_objects_from_agency_mssql,
 )
+from app.integrations.agency_pool import agency_pools_stats
 from app.services.auto_sync import auto_sync_status
+from app.services.backfill_service import run_archive_backfill
 from app.services.job_service import create_job, get_job, start_job
+from app.services.event_counts import invalidate_event_counts
+from app.services.object_cache import remember_objects
+from app.services.object_search import invalidate_object_search
+from app.services.sync_leader import SYNC_BUSY, exclusive_sync
+from app.services.sync_metrics import reset_sync_metrics, sync_metrics_snapshot
 from app.prototype_data import mock_events
 from app.models.event import Event
 from app.models.object import Object
@@ -25,10 +37,6 @@ from app.db.session import get_session
 
 router = APIRouter()
 
-# SQLite allows only one writer at a time. If users click buttons quickly or
-# multiple clients run sync concurrently, the DB can get locked.
-_SYNC_LOCK = asyncio.Lock()
-
 
 @router.post("/sync/events")
 async def sync_events_once(limit: int = Query(500, ge=1, le=5000)) -> dict[str, Any]:
@@ -42,7 +50,9 @@ async def sync_events_once(limit: int = Query(500, ge=1, le=5000)) -> dict[str,
     url = settings.agency_database_url
     scheme = (url.split(":", 1)[0] or "").lower()
 
-    async with _SYNC_LOCK:
+    async with exclusive_sync("api") as acquired:
+        if not acquired:
+            return dict(SYNC_BUSY)
         async for session in get_session():
             session = session  # type: ignore[no-redef]
             if scheme.startswith("mysql"):
@@ -80,7 +90,9 @@ async def reset_mssql_events_cursor(
     if not scheme.startswith("mssql"):
         return {"status": "error", "reason": "AGENCY_DATABASE_URL must be MSSQL for reset-cursor"}
 
-    async with _SYNC_LOCK:
+    async with exclusive_sync("api") as acquired:
+        if not acquired:
+            return dict(SYNC_BUSY)
         async for session in get_session():
             session = session  # type: ignore[no-redef]
             await set_mssql_event_cursor(session, date_key, event_id)
@@ -89,8 +101,87 @@ async def reset_mssql_events_cursor(
     return {"status": "error", "reason": "No DB session"}
 
 
+@router.post("/sync/events/backfill/start")
+async def backfill_events_start(
+    date_from: int = Query(..., ge=20000101, le=21000101),
+    date_to: int | None = Query(None, ge=20000101, le=21000101),
+    concurrency: int | None = Query(None, ge=1, le=16),
+    batch_limit: int | None = Query(None, ge=100, le=500000),
+    restart: bool = Query(False, description="Сбросить сохранённые курсоры месяцев диапазона"),
+) -> dict[str, Any]:
+    """Запускает в фоне загрузку истории из MSSQL-архивов за диапазон Date_Key.
+
+    Месяцы грузятся параллельно, у каждого свой курсор в sync_state, поэтому повторный
+    запуск продолжает с места остановки. Живой курсор /sync/events не меняется.
+    Прогресс по месяцам — в GET /jobs/{jobId} (поле progress).
+    """
+    if not settings.agency_database_url:
+        return {"status": "skipped", "reason": "AGENCY_DATABASE_URL not set"}
+
+    url = settings.agency_database_url
+    scheme = (url.split(":", 1)[0] or "").lower()
+    if not scheme.startswith("mssql"):
+        return {"status": "error", "reason": "AGENCY_DATABASE_URL must be MSSQL for backfill"}
+    if date_to is not None and date_from > date_to:
+        raise HTTPException(status_code=400, detail={"code": "BAD_RANGE", "message": "date_from > date_to"})
+
+    job = await create_job("backfill_events")
+
+    def _factory():
+        return run_archive_backfill(
+            url,
+            archives_db_name=settings.agency_archives_db_name,
+            from_date_key=date_from,
+            to_date_key=date_to,
+            concurrency=concurrency,
+            batch_limit=batch_limit,
+            restart=restart,
+            job_id=job["id"],
+        )
+
+    start_job(job, _factory)
+    return {"status": "accepted", "jobId": job["id"]}
+
+
+@router.post("/sync/states")
+async def sync_states_once(limit: int = Query(2000, ge=1, le=50000)) -> dict[str, Any]:
+    """Подтягивает изменения состояния уже загруженных событий.
+
+    MSSQL — обработка оператором из eventservice; MySQL — перечитывание недавних тревог
+    (окно AGENCY_MYSQL_REFRESH_WINDOW или колонка времени изменения).
+    """
+    if not settings.agency_database_url:
+        return {"status": "skipped", "reason": "AGENCY_DATABASE_URL not set"}
+
+    url = settings.agency_database_url
+    scheme = (url.split(":", 1)[0] or "").lower()
+    if not (scheme.startswith("mysql") or scheme.startswith("mssql")):
+        return {"status": "error", "reason": f"Unsupported AGENCY_DATABASE_URL scheme: {scheme}"}
+
+    async with exclusive_sync("api") as acquired:
+        if not acquired:
+            return dict(SYNC_BUSY)
+        async for session in get_session():
+            session = session  # type: ignore[no-redef]
+            if scheme.startswith("mysql"):
+                return await refresh_recent_alarms_from_agency_mysql(
+                    session=session,
+                    agency_mysql_url=url,
+                    batch_limit=limit,
+                )
+            return await refresh_event_states_from_agency_mssql(
+                session=session,
+                agency_mssql_url=url,
+                archives_db_name=settings.agency_archives_db_name,
+                batch_limit=limit,
+            )
+    return {"status": "error", "reason": "No DB session"}
+
+
 @router.post("/sync/objects")
-async def sync_objects_once() -> dict[str, Any]:
+async def sync_objects_once(
+    mode: str = Query("full", pattern="^(full|delta)$", description="full — полный снапшот, delta — по DateLastChange"),
+) -> dict[str, Any]:
     """Синхронизирует справочник объектов (Panel/Groups/Responsibles) из MSSQL агентства."""
 
     if not settings.agency_database_url:
@@ -101,15 +192,23 @@ async def sync_objects_once() -> dict[str, Any]:
     if not scheme.startswith("mssql"):
         return {"status": "error", "reason": "AGENCY_DATABASE_URL must be MSSQL for /sync/objects"}
 
-    async with _SYNC_LOCK:
+    async with exclusive_sync("api") as acquired:
+        if not acquired:
+            return dict(SYNC_BUSY)
         async for session in get_session():
             session = session  # type: ignore[no-redef]
-            return await sync_objects_from_agency_mssql(session=session, agency_mssql_url=url)
+            return await sync_objects_from_agency_mssql(
+                session=session,
+                agency_mssql_url=url,
+                full=mode == "full",
+            )
     return {"status": "error", "reason": "No DB session"}
 
 
 @router.post("/sync/objects/start")
-async def sync_objects_start() -> dict[str, Any]:
+async def sync_objects_start(
+    mode: str = Query("full", pattern="^(full|delta)$", description="full — полный снапшот, delta — по DateLastChange"),
+) -> dict[str, Any]:
     """Запускает синхронизацию объектов в фоне (не блокирует HTTP-запрос).
 
     Полезно, когда объектов десятки тысяч и синк может идти минуты.
@@ -127,11 +226,17 @@ async def sync_objects_start() -> dict[str, Any]:
     def _factory():
         async def _run():
             # Serialize writers for SQLite.
-            async with _SYNC_LOCK:
+            async with exclusive_sync("api") as acquired:
+                if not acquired:
+                    return dict(SYNC_BUSY)
                 from app.db.session import SessionLocal
 
                 async with SessionLocal() as session:
-                    return await sync_objects_from_agency_mssql(session=session, agency_mssql_url=url)
+                    return await sync_objects_from_agency_mssql(
+                        session=session,
+                        agency_mssql_url=url,
+                        full=mode == "full",
+                    )
 
         return _run()
 
@@ -160,117 +265,87 @@ async def seed_demo_events(count: int = Query(300, ge=1, le=5000)) -> dict[str,
     if not settings.enable_demo_seed:
         raise HTTPException(status_code=404, detail="Demo seed disabled")
 
-    async for session in get_session():
-        today = date_type.today()
-        rows: list[dict[str, Any]] = []
-        if not mock_events:
-            return {"status": "skipped", "reason": "no demo templates"}
-
-        # Создаём демо-объекты на основе шаблонов, чтобы можно было
-        # показывать карточку объекта и события по объекту.
-        by_name: dict[str, str] = {}
-        object_rows: list[dict[str, Any]] = []
-        for tpl in mock_events:
-            name = str(tpl.get("objectName") or "")
-            if not name or name in by_name:
-                continue
-            obj_id = f"demo-obj-{len(by_name) + 1}"
-            by_name[name] = obj_id
-            object_rows.append(
-                {
-                    "id": obj_id,
-                    "name": name,
-                    "address": tpl.get("location"),
-                    "client_name": tpl.get("clientName"),
-                    "disabled": False,
-                    "remarks": None,
-                    "additional_info": None,
-                    "latitude": None,
-                    "longitude": None,
-                    "created_at": datetime.combine(today, datetime.min.time()),
-                    "updated_at": datetime.combine(today, datetime.min.time()),
-                }
-            )
-
-        # Генерируем достаточно событий для демонстрации UI (графики/таблицы/поиск).
-        # Времена распределяем по текущим суткам.
-        for i in range(count):
-            tpl = random.choice(mock_events)
-
-            hour = random.randint(0, 23)
-            minute = random.randint(0, 59)
-            second = random.randint(0, 59)
-            ts = datetime.combine(today, datetime.min.time()).replace(hour=hour, minute=minute, second=second)
-
-            rows.append(
-                {
-                    "id": f"demo-{i+1}",
-                    "timestamp": ts,
-                    "type": str(tpl.get("type")),
-                    "object_id": by_name.get(str(tpl.get("objectName") or "")),
-                    "object_name": str(tpl.get("objectName")),
-                    "client_name": str(tpl.get("clientName")),
-                    "severity": str(tpl.get("severity")),
-                    "status": str(tpl.get("status")),
-                    "description": str(tpl.get("description")),
-                    "location": tpl.get("location"),
-                    "operator_id": tpl.get("operatorId"),
-                }
-            )
-
-        if not rows:
-            return {"status": "skipped", "reason": "no demo rows"}
-
-        # Идемпотентность: удаляем предыдущий демо-сид.
-        from sqlalchemy import delete
-
-        await session.execute(delete(Event).where(Event.id.like("demo-%")))
-        await session.execute(delete(Object).where(Object.id.like("demo-obj-%")))
-
-        # Сначала объекты
-        if object_rows:
-            try:
-                bind = session.get_bind()
-                dialect = getattr(bind, "dialect", None)
-            except Exception:
-                dialect = None
-
-            if dialect is not None and getattr(dialect, "name", None) == "postgresql":
-                from sqlalchemy.dialects.postgresql import insert as pg_insert
-
-                await session.execute(pg_insert(Object).values(object_rows))
-            elif dialect is not None and getattr(dialect, "name", None) == "sqlite":
-                from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    # Сид пишет events/objects — как и синк, только в процессе-лидере и под SYNC_LOCK.
+    async with exclusive_sync("api") as acquired:
+        if not acquired:
+            return dict(SYNC_BUSY)
+        async for session in get_session():
+            today = date_type.today()
+            rows: list[dict[str, Any]] = []
+            if not mock_events:
+                return {"status": "skipped", "reason": "no demo templates"}
+
+            # Создаём демо-объекты на основе шаблонов, чтобы можно было
+            # показывать карточку объекта и события по объекту.
+            by_name: dict[str, str] = {}
+            object_rows: list[dict[str, Any]] = []
+            for tpl in mock_events:
+                name = str(tpl.get("objectName") or "")
+                if not name or name in by_name:
+                    continue
+                obj_id = f"demo-obj-{len(by_name) + 1}"
+                by_name[name] = obj_id
+                object_rows.append(
+                    {
+                        "id": obj_id,
+                        "name": name,
+                        "address": tpl.get("location"),
+                        "client_name": tpl.get("clientName"),
+                        "disabled": False,
+                        "remarks": None,
+                        "additional_info": None,
+                        "latitude": None,
+                        "longitude": None,
+                        "created_at": datetime.combine(today, datetime.min.time()),
+                        "updated_at": datetime.combine(today, datetime.min.time()),
+                    }
+                )
 
-                # Use executemany to avoid SQLite variable limit for large batches.
-                await session.execute(sqlite_insert(Object), object_rows)
-            else:
-                for r in object_rows:
-                    session.add(Object(**r))
+            # Генерируем достаточно событий для демонстрации UI (графики/таблицы/поиск).
+            # Времена распределяем по текущим суткам.
+            for i in range(count):
+                tpl = random.choice(mock_events)
+
+                hour = random.randint(0, 23)
+                minute = random.randint(0, 59)
+                second = random.randint(0, 59)
+                ts = datetime.combine(today, datetime.min.time()).replace(hour=hour, minute=minute, second=second)
+
+                rows.append(
+                    {
+                        "id": f"demo-{i+1}",
+                        "timestamp": ts,
+                        "type": str(tpl.get("type")),
+                        "object_id": by_name.get(str(tpl.get("objectName") or "")),
+                        "object_name": str(tpl.get("objectName")),
+                        "client_name": str(tpl.get("clientName")),
+                        "severity": str(tpl.get("severity")),
+                        "status": str(tpl.get("status")),
+                        "description": str(tpl.get("description")),
+                        "location": tpl.get("location"),
+                        "operator_id": tpl.get("operatorId"),
+                    }
+                )
 
-        try:
-            bind = session.get_bind()
-            dialect = getattr(bind, "dialect", None)
-        except Exception:
-            dialect = None
+            if not rows:
+                return {"status": "skipped", "reason": "no demo rows"}
 
-        if dialect is not None and getattr(dialect, "name", None) == "postgresql":
-            from sqlalchemy.dialects.postgresql import insert as pg_insert
+            # Идемпотентность: удаляем предыдущий демо-сид.
+            from sqlalchemy import delete
 
-            stmt = pg_insert(Event).values(rows)
-            await session.execute(stmt)
-        elif dialect is not None and getattr(dialect, "name", None) == "sqlite":
-            from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+            await session.execute(delete(Event).where(Event.id.like("demo-%")))
+            await session.execute(delete(Object).where(Object.id.like("demo-obj-%")))
 
-            # Use executemany to avoid SQLite variable limit for large batches.
-            await session.execute(sqlite_insert(Event), rows)
-        else:
-            for r in rows:
-                session.add(Event(**r))
-        await session.commit()
-        return {"status": "ok", "objects": int(len(object_rows)), "events": int(len(rows))}
+            # Сначала объекты, затем события (предыдущий сид уже удалён — конфликтов не ждём).
+            objects_written = await bulk_upsert(session, Object, object_rows)
+            events_written = await bulk_upsert(session, Event, rows)
+            await session.commit()
+            remember_objects(object_rows)
+            invalidate_event_counts()
+            invalidate_object_search()
+            return {"status": "ok", "objects": objects_written.written, "events": events_written.written}
 
-    return {"status": "error", "reason": "No DB session"}
+        return {"status": "error", "reason": "No DB session"}
 
 
 @router.get("/sync/status")
@@ -299,6 +374,17 @@ async def get_sync_status() -> dict[str, Any]:
         except Exception:
             cursor = None
 
+        try:
+            objects_watermark = await get_mssql_objects_watermark(session)
+        except Exception:
+            objects_watermark = None
+
+        try:
+            watermark = await get_mssql_states_watermark(session)
+            states_watermark = format_states_watermark(watermark) if watermark else None
+        except Exception:
+            states_watermark = None
+
         return {
             "autoSync": status,
             "db": {
@@ -306,10 +392,37 @@ async def get_sync_status() -> dict[str, Any]:
                 "objects": objects_count,
                 "latestEventTimestamp": latest_ts,
             },
-            "mssql": {"cursor": cursor},
+            "mssql": {
+                "cursor": cursor,
+                "objectsWatermark": objects_watermark,
+                "statesWatermark": states_watermark,
+            },
+            "agencyPools": agency_pools_stats(),
+            "metrics": sync_metrics_snapshot(),
         }
 
-    return {"autoSync": status, "db": None, "mssql": {"cursor": None}}
+    return {
+        "autoSync": status,
+        "db": None,
+        "mssql": {"cursor": None, "objectsWatermark": None, "statesWatermark": None},
+        "metrics": sync_metrics_snapshot(),
+    }
+
+
+@router.get("/sync/metrics")
+async def get_sync_metrics() -> dict[str, Any]:
+    """Метрики итераций синка по пайплайнам (mysql.events, mssql.events, mssql.objects, mssql.backfill).
+
+    Для каждого этапа (fetch/transform/write/commit) — секунды за итерацию по скользящему
+    окну (min/p50/p90/p99/max), плюс строки за итерацию, строки/сек, размеры пачек и ошибки.
+    """
+    return {"pipelines": sync_metrics_snapshot(), "agencyPools": agency_pools_stats()}
+
+
+@router.post("/sync/metrics/reset")
+async def reset_sync_metrics_endpoint() -> dict[str, Any]:
+    reset_sync_metrics()
+    return {"status": "ok"}
 
 
 @router.get("/tables")
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy import or_, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import get_session
 from app.models.event import Event
+from app.services.event_search import order_by_relevance
+from app.services.event_text import render_description
 
 router = APIRouter(prefix="/search")
 
@@ -18,20 +20,8 @@ async def search_events(
     if not q.strip():
         return []
 
-    needle = f"%{q.strip()}%"
-    stmt = (
-        select(Event)
-        .where(
-            or_(
-                Event.description.ilike(needle),
-                Event.object_name.ilike(needle),
-                Event.client_name.ilike(needle),
-                Event.location.ilike(needle),
-            )
-        )
-        .order_by(Event.timestamp.desc())
-        .limit(50)
-    )
+    # Полнотекстовый индекс (см. app.services.event_search): сначала релевантные, затем свежие.
+    stmt = (await order_by_relevance(session, select(Event), q)).limit(50)
     rows = (await session.execute(stmt)).scalars().all()
     return [
         {
@@ -43,7 +33,7 @@ async def search_events(
             "clientName": e.client_name,
             "severity": e.severity,
             "status": e.status,
-            "description": e.description,
+            "description": render_description(e),
             "location": e.location,
             "operatorId": e.operator_id,
         }
@@ -33,6 +33,83 @@ class Settings(BaseSettings):
     # Если не задано, используется первое число текущего месяца.
     agency_mssql_archive_start_date_key: int | None = None
 
+    # Каталог существующих месячных таблиц (sys.tables в pult4db_archives) кэшируется
+    # на столько секунд; запрашиваются только месяцы, которые реально есть.
+    agency_archive_catalog_ttl_seconds: int = 600
+
+    # Справочники Code_T/States кэшируются в памяти процесса (сек); неизвестный код
+    # или статус вызывает досрочное перечитывание.
+    agency_dictionaries_ttl_seconds: int = 3600
+
+    # Обновление состояния уже загруженных событий по eventservice.OperationTime:
+    # сколько предыдущих месяцев просматривать (обработка пишется в месяц события)
+    # и с какой глубины (часы) начинать, если водяного знака ещё нет.
+    agency_state_refresh_lookback_months: int = 1
+    agency_state_refresh_initial_hours: int = 24
+
+    # MySQL: флаги тревоги (IS_DONE, IS_ZAYAVKA, IS_PROPAZHA…) меняются после загрузки.
+    # Регулярно перечитывается окно из стольких последних ID_ALARMS; если в alarms есть
+    # колонка времени изменения — задайте её имя, тогда читаются только изменённые тревоги
+    # (с водяного знака; первый запуск — на agency_state_refresh_initial_hours назад).
+    agency_mysql_refresh_window: int = 5000
+    agency_mysql_alarms_modified_column: str = ""
+
+    # Размер пачки при чтении из агентских БД (fetchmany). Пачки пишутся в локальную БД
+    # по мере поступления, поэтому пиковая память не зависит от объёма выборки.
+    agency_fetch_batch_size: int = 1000
+
+    # Конвейер синка: пока пачка пишется в локальную БД, следующие читаются из агентской
+    # и преобразуются. Сколько готовых пачек держать в очереди перед записью (и читать
+    # вперёд); медленная запись притормаживает чтение. 0 — последовательная обработка.
+    sync_pipeline_depth: int = 2
+
+    # Блокирующие запросы к агентским БД выполняются в отдельном пуле потоков,
+    # чтобы не останавливать event loop API. Таймаут — ожидание очередной пачки/ответа (сек).
+    agency_pool_workers: int = 4
+    agency_query_timeout_seconds: float = 300
+
+    # Пул соединений к агентским БД: сколько простаивающих соединений держать
+    # и через сколько секунд пересоздавать соединение.
+    agency_pool_size: int = 4
+    agency_pool_recycle_seconds: int = 1800
+
+    # Backfill истории из архивов MSSQL: сколько месяцев грузить параллельно
+    # (не больше agency_pool_workers - 1) и сколько строк читать за один запрос.
+    agency_backfill_concurrency: int = 2
+    agency_backfill_batch_limit: int = 20000
+
+    # Экспериментально, только по явному включению. Postgres: пачки событий от стольких строк
+    # пишутся через COPY во временную таблицу и один INSERT ... SELECT ... ON CONFLICT (без
+    # лимита bind-параметров). 0 — выключено (по умолчанию): INSERT ... VALUES кусками.
+    # Порог по умолчанию не подобран, в CI путь COPY не гоняется: его проверяет только
+    # tests/test_pg_copy.py при заданном TEST_POSTGRES_URL.
+    pg_copy_min_rows: int = 0
+
+    # Кэш panel_id -> (name, address, client_name) для обогащения событий при загрузке:
+    # максимум записей и сколько секунд помнить, что объекта локально нет.
+    object_cache_size: int = 50000
+    object_cache_miss_ttl_seconds: int = 300
+
+    # Точные total лент событий (count=exact) кэшируются по набору фильтров до следующей
+    # записи синка (sync_state.updated_at), но не дольше TTL (сек) — на случай записей в обход синка.
+    event_count_cache_size: int = 1000
+    event_count_cache_ttl_seconds: int = 300
+
+    # Поиск объектов вне Postgres (SQLite): n-граммный индекс в памяти процесса. Перестраивается
+    # после синка объектов, но не реже чем раз в TTL (сек) — на случай записей в обход синка.
+    object_search_index_ttl_seconds: int = 600
+
+    # CSV-выгрузки (события, суточный отчёт, фразы) отдаются потоком: столько строк
+    # читается из серверного курсора и пишется клиенту за раз.
+    csv_export_batch_size: int = 2000
+
+    # Лидер синка: во всех процессах (воркеры uvicorn, Celery) синк ведёт только один.
+    # Postgres — advisory lock с этим ключом, SQLite — lock-файл (по умолчанию <файл БД>.sync.lock).
+    # Остальные процессы пробуют перехватить лидерство раз в sync_leader_retry_seconds.
+    sync_leader_lock_key: int = 1398165316
+    sync_leader_lock_file: str = ""
+    sync_leader_retry_seconds: int = 15
+
     # Демо-эндпоинты для заполнения мок-данными (по умолчанию выключены)
     enable_demo_seed: bool = False
 
@@ -55,7 +132,21 @@ class Settings(BaseSettings):
     auto_sync_enabled: bool = True
     auto_sync_interval_seconds: int = 15
     auto_sync_events_limit: int = 500
+    # Если пачка пришла полной (после простоя или сброса курсора), цикл догоняет без паузы,
+    # удваивая размер пачки до этого потолка; обычный интервал — когда догнали.
+    auto_sync_events_max_limit: int = 20000
     auto_sync_objects_interval_seconds: int = 600
+    # Как часто подтягивать изменения состояния событий (MSSQL — обработка оператором
+    # по eventservice, MySQL — перечитывание недавних тревог), сек.
+    auto_sync_states_interval_seconds: int = 60
+    auto_sync_states_limit: int = 2000
+    # Регулярная синхронизация объектов идёт в дельта-режиме (по Panel.DateLastChange).
+    # Полный снапшот — раз в сутки начиная с этого часа (локальное время); < 0 отключает.
+    auto_sync_objects_full_hour: int = 3
+
+    # Метрики синка (/db/sync/status, /db/sync/metrics): сколько последних итераций
+    # каждого пайплайна держать в скользящем окне.
+    sync_metrics_window: int = 200
 
     def cors_origins_list(self) -> list[str]:
         if not self.cors_origins.strip():
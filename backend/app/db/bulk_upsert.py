@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+from sqlalchemy import Table, bindparam, insert, literal_column, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.dialect import session_dialect_name
+from app.db.pg_copy import copy_upsert
+
+# Лимит bind-параметров на один запрос по диалектам. Postgres — лимит протокола,
+# SQLite — SQLITE_MAX_VARIABLE_NUMBER (999 до 3.32).
+_MAX_PARAMS = {
+    "postgresql": 65535,
+    "sqlite": 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999,
+}
+_DEFAULT_MAX_PARAMS = 2000
+# Потолок строк в одном INSERT ... VALUES: дальше выигрыша почти нет, а запрос растёт.
+_MAX_CHUNK_ROWS = 2000
+
+
+@dataclass
+class UpsertResult:
+    inserted: int = 0
+    updated: int = 0
+    # Дубликаты ключа внутри пачки и конфликты при политике DO NOTHING.
+    skipped: int = 0
+
+    @property
+    def written(self) -> int:
+        return self.inserted + self.updated
+
+    def __iadd__(self, other: UpsertResult) -> UpsertResult:
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.skipped += other.skipped
+        return self
+
+    def as_dict(self) -> dict[str, int]:
+        return {"inserted": self.inserted, "updated": self.updated, "skipped": self.skipped}
+
+
+def _table(target: Any) -> Table:
+    return getattr(target, "__table__", target)
+
+
+def chunk_size(dialect_name: str | None, columns: int) -> int:
+    """Сколько строк помещается в один запрос при данном числе колонок."""
+    max_params = _MAX_PARAMS.get(dialect_name or "", _DEFAULT_MAX_PARAMS)
+    return max(1, min(_MAX_CHUNK_ROWS, max_params // max(1, columns)))
+
+
+def _dedupe(rows: Sequence[dict[str, Any]], keys: Sequence[str]) -> list[dict[str, Any]]:
+    # Последняя строка с тем же ключом побеждает (ON CONFLICT DO UPDATE не может
+    # затронуть одну строку дважды в одном запросе).
+    by_key: dict[tuple[Any, ...], dict[str, Any]] = {}
+    for r in rows:
+        by_key[tuple(r.get(k) for k in keys)] = r
+    return list(by_key.values())
+
+
+async def _existing_keys(
+    session: AsyncSession,
+    table: Table,
+    keys: Sequence[str],
+    rows: Sequence[dict[str, Any]],
+    dialect_name: str | None,
+) -> set[tuple[Any, ...]]:
+    cols = [table.c[k] for k in keys]
+    found: set[tuple[Any, ...]] = set()
+    step = chunk_size(dialect_name, len(keys))
+    for i in range(0, len(rows), step):
+        values = [tuple(r.get(k) for k in keys) for r in rows[i : i + step]]
+        if len(cols) == 1:
+            cond = cols[0].in_([v[0] for v in values])
+        else:
+            cond = tuple_(*cols).in_(values)
+        found.update(tuple(r) for r in (await session.execute(select(*cols).where(cond))).all())
+    return found
+
+
+async def bulk_upsert(
+    session: AsyncSession,
+    target: Any,
+    rows: Sequence[dict[str, Any]],
+    *,
+    conflict_columns: Sequence[str] = ("id",),
+    update_columns: Sequence[str] | None = None,
+    copy_min_rows: int | None = None,
+) -> UpsertResult:
+    """Вставляет пачку строк в таблицу (модель или Table) с единой семантикой для всех диалектов.
+
+    update_columns=None — ON CONFLICT DO NOTHING, иначе DO UPDATE этих колонок.
+    Пачка режется на куски по лимиту bind-параметров диалекта; запрос компилируется
+    один раз на пачку. Postgres: INSERT ... VALUES ... RETURNING (xmax = 0), а большие
+    пачки (от copy_min_rows, по умолчанию PG_COPY_MIN_ROWS; 0 — никогда) — через
+    COPY + staging. SQLite и прочие: существующие ключи выбираются заранее, затем
+    executemany. Без commit.
+    """
+    result = UpsertResult()
+    if not rows:
+        return result
+
+    table = _table(target)
+    unique = _dedupe(rows, conflict_columns)
+    result.skipped += len(rows) - len(unique)
+    columns = list(unique[0].keys())
+    update_columns = [c for c in (update_columns or []) if c not in conflict_columns]
+    dialect_name = session_dialect_name(session)
+
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        threshold = int(settings.pg_copy_min_rows if copy_min_rows is None else copy_min_rows)
+        if threshold > 0 and len(unique) >= threshold:
+            inserted, updated = await copy_upsert(
+                session,
+                table,
+                unique,
+                conflict_columns=conflict_columns,
+                update_columns=update_columns or None,
+            )
+            result.inserted += inserted
+            result.updated += updated
+            result.skipped += len(unique) - inserted - updated
+            return result
+
+        # Один запрос на всю пачку: executemany с RETURNING SQLAlchemy разворачивает в
+        # INSERT ... VALUES (...), (...) страницами по step строк ("insertmanyvalues").
+        # Запрос компилируется один раз (и берётся из кэша компиляции), страницы лишь
+        # размножают готовую группу VALUES — полные куски идут одной и той же строкой SQL.
+        stmt = pg_insert(table).values({c: bindparam(c) for c in columns})
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(conflict_columns),
+                set_={c: stmt.excluded[c] for c in update_columns},
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
+        # xmax = 0 — строка вставлена, иначе — обновлена существующая.
+        step = chunk_size(dialect_name, len(columns))
+        flags = (
+            (
+                await session.execute(
+                    stmt.returning(literal_column("(xmax = 0)")),
+                    unique,
+                    execution_options={"insertmanyvalues_page_size": step},
+                )
+            )
+            .scalars()
+            .all()
+        )
+        inserted = sum(1 for f in flags if f)
+        result.inserted += inserted
+        result.updated += len(flags) - inserted
+        result.skipped += len(unique) - len(flags)
+        return result
+
+    existing = await _existing_keys(session, table, conflict_columns, unique, dialect_name)
+    new_rows = [r for r in unique if tuple(r.get(k) for k in conflict_columns) not in existing]
+    old_rows = [r for r in unique if tuple(r.get(k) for k in conflict_columns) in existing]
+
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        # executemany одного скомпилированного запроса: лимит переменных SQLite не достигается.
+        stmt = sqlite_insert(table).values({c: bindparam(c) for c in columns})
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(conflict_columns),
+                set_={c: stmt.excluded[c] for c in update_columns},
+            )
+            payload = unique
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
+            payload = new_rows
+        if payload:
+            await session.execute(stmt, payload)
+    else:
+        if new_rows:
+            await session.execute(insert(table), new_rows)
+        if update_columns and old_rows:
+            pk = {f"b_{k}": bindparam(f"b_{k}") for k in conflict_columns}
+            stmt = (
+                update(table)
+                .where(*(table.c[k] == pk[f"b_{k}"] for k in conflict_columns))
+                .values({c: bindparam(f"b_{c}") for c in update_columns})
+            )
+            await session.execute(
+                stmt,
+                [{f"b_{c}": r.get(c) for c in (*conflict_columns, *update_columns)} for r in old_rows],
+            )
+
+    result.inserted += len(new_rows)
+    if update_columns:
+        result.updated += len(old_rows)
+    else:
+        result.skipped += len(old_rows)
+    return result
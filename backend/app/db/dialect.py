@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def session_dialect_name(session: AsyncSession) -> str | None:
+    """Имя диалекта ("postgresql", "sqlite", ...) движка сессии; None, если движок не определить."""
+    try:
+        return getattr(getattr(session.get_bind(), "dialect", None), "name", None)
+    except Exception:
+        return None
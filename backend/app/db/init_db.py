@@ -5,6 +5,26 @@ from sqlalchemy.ext.asyncio import AsyncEngine
 from app.db.base import Base
 
 
+# Структурированные детали события архива MSSQL (раньше склеивались в description).
+# (колонка, тип, нужен ли индекс)
+_EVENT_DETAIL_COLUMNS = (
+    ("state_event", "INTEGER", False),
+    ("zone", "INTEGER", True),
+    ("line", "VARCHAR(16)", True),
+    ("group_no", "INTEGER", False),
+    ("person", "VARCHAR(200)", True),
+    ("gbr", "VARCHAR(100)", True),
+    ("result_text", "TEXT", False),
+)
+
+# Составные индексы лент событий (keyset-пагинация по (timestamp, id)); create_all
+# не добавляет индексы в уже существующую таблицу.
+_EVENT_FEED_INDEXES = (
+    ("ix_events_timestamp_id", "timestamp, id"),
+    ("ix_events_object_id_timestamp_id", "object_id, timestamp, id"),
+)
+
+
 async def _ensure_schema(engine: AsyncEngine) -> None:
     # Для прототипа у нас нет миграций. Этот хелпер аккуратно добавляет
     # новые колонки в уже существующие таблицы (SQLite/Postgres).
@@ -36,6 +56,11 @@ async def _ensure_schema(engine: AsyncEngine) -> None:
                 await conn.execute(text("ALTER TABLE events ADD COLUMN state_name VARCHAR(60)"))
             if "state_is_over_process" not in col_names:
                 await conn.execute(text("ALTER TABLE events ADD COLUMN state_is_over_process BOOLEAN"))
+            for col_name, col_type, indexed in _EVENT_DETAIL_COLUMNS:
+                if col_name not in col_names:
+                    await conn.execute(text(f"ALTER TABLE events ADD COLUMN {col_name} {col_type}"))
+                if indexed:
+                    await conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_events_{col_name} ON events ({col_name})"))
 
             user_cols = (await conn.execute(text("PRAGMA table_info(users)"))).all()
             user_col_names = {c[1] for c in user_cols}
@@ -119,6 +144,11 @@ async def _ensure_schema(engine: AsyncEngine) -> None:
                 if not col_exists:
                     await conn.execute(text(f"ALTER TABLE events ADD COLUMN {col_name} {col_type}"))
 
+            for col_name, col_type, indexed in _EVENT_DETAIL_COLUMNS:
+                await conn.execute(text(f"ALTER TABLE events ADD COLUMN IF NOT EXISTS {col_name} {col_type}"))
+                if indexed:
+                    await conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_events_{col_name} ON events ({col_name})"))
+
             user_hash_exists = (
                 await conn.execute(
                     text(
@@ -147,6 +177,20 @@ async def _ensure_schema(engine: AsyncEngine) -> None:
             if email_nullable and str(email_nullable[0]).upper() == "NO":
                 await conn.execute(text("ALTER TABLE users ALTER COLUMN email DROP NOT NULL"))
 
+        if dialect_name in ("sqlite", "postgresql"):
+            for index_name, index_cols in _EVENT_FEED_INDEXES:
+                await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON events ({index_cols})"))
+
+        # Полнотекстовый поиск событий (tsvector + GIN / FTS5), см. app.services.event_search.
+        from app.services.event_search import ensure_event_search_index
+
+        await ensure_event_search_index(conn, dialect_name)
+
+        # Поиск объектов по подстроке: pg_trgm + GIN (Postgres), см. app.services.object_search.
+        from app.services.object_search import ensure_object_search_index
+
+        await ensure_object_search_index(conn, dialect_name)
+
 
 async def init_db(engine: AsyncEngine) -> None:
     # Ensure models are imported so SQLAlchemy registers tables
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from typing import Any, Sequence
+
+from sqlalchemy import Table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+async def copy_upsert(
+    session: AsyncSession,
+    table: Table,
+    rows: Sequence[dict[str, Any]],
+    *,
+    conflict_columns: Sequence[str],
+    update_columns: Sequence[str] | None = None,
+) -> tuple[int, int]:
+    """Postgres: загружает пачку через COPY во временную staging-таблицу и сливает её
+    в целевую одним INSERT ... SELECT ... ON CONFLICT.
+
+    В отличие от INSERT ... VALUES, число строк не упирается в лимит bind-параметров
+    протокола (65535), а сливающий запрос один и тот же для любой пачки.
+
+    Экспериментальный путь: вызывается из bulk_upsert только при PG_COPY_MIN_ROWS > 0.
+
+    update_columns=None — ON CONFLICT DO NOTHING, иначе DO UPDATE этих колонок.
+    Работает на соединении сессии, т.е. в её транзакции (без commit).
+    Возвращает (вставлено, обновлено).
+    """
+    if not rows:
+        return 0, 0
+
+    columns = list(rows[0].keys())
+    target = _quote(table.name) if not table.schema else f"{_quote(table.schema)}.{_quote(table.name)}"
+    stage = _quote(f"_stage_{table.name}")
+    cols_sql = ", ".join(_quote(c) for c in columns)
+    conflict_sql = ", ".join(_quote(c) for c in conflict_columns)
+
+    if update_columns:
+        on_conflict = "DO UPDATE SET " + ", ".join(f"{_quote(c)} = EXCLUDED.{_quote(c)}" for c in update_columns)
+    else:
+        on_conflict = "DO NOTHING"
+
+    conn = await session.connection()
+    raw = await conn.get_raw_connection()
+    driver_conn = raw.driver_connection  # psycopg.AsyncConnection
+
+    async with driver_conn.cursor() as cur:
+        # Временная таблица живёт на соединении (и переиспользуется из пула),
+        # строки очищаются на commit и явно — после каждой пачки.
+        await cur.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE {target} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        async with cur.copy(f"COPY {stage} ({cols_sql}) FROM STDIN") as copy:
+            for row in rows:
+                await copy.write_row(tuple(row.get(c) for c in columns))
+
+        # DISTINCT ON: дубликаты ключа внутри пачки ломают ON CONFLICT DO UPDATE.
+        # xmax = 0 — строка вставлена, иначе — обновлена существующая.
+        await cur.execute(
+            f"""
+            WITH merged AS (
+              INSERT INTO {target} ({cols_sql})
+              SELECT DISTINCT ON ({conflict_sql}) {cols_sql}
+              FROM {stage}
+              ORDER BY {conflict_sql}
+              ON CONFLICT ({conflict_sql}) {on_conflict}
+              RETURNING (xmax = 0) AS inserted
+            )
+            SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+            FROM merged
+            """
+        )
+        inserted, updated = await cur.fetchone()
+        await cur.execute(f"TRUNCATE {stage}")
+
+    return int(inserted or 0), int(updated or 0)
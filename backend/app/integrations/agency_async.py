@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# pyodbc/PyMySQL — блокирующие драйверы. Все обращения к агентским БД идут через
+# отдельный ограниченный пул потоков, чтобы не останавливать event loop API
+# и не занимать дефолтный executor.
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_LOCK = threading.Lock()
+
+_DONE = object()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=max(1, int(settings.agency_pool_workers)),
+                thread_name_prefix="agency-db",
+            )
+        return _EXECUTOR
+
+
+def shutdown_agency_executor() -> None:
+    """Останавливает пул (на shutdown приложения). Уже запущенные запросы дорабатывают в фоне."""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        executor, _EXECUTOR = _EXECUTOR, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_agency_call(
+    fn: Callable[..., T],
+    *args: Any,
+    timeout: float | None = None,
+    **kwargs: Any,
+) -> T:
+    """Выполняет блокирующий вызов агентской БД в пуле потоков, с таймаутом."""
+    loop = asyncio.get_running_loop()
+    fut = loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+    if timeout is None:
+        timeout = settings.agency_query_timeout_seconds
+    try:
+        return await asyncio.wait_for(fut, timeout=timeout if timeout and timeout > 0 else None)
+    except TimeoutError as e:
+        raise TimeoutError(f"Agency DB call timed out after {timeout}s") from e
+
+
+async def iterate_agency_batches(
+    factory: Callable[[], Iterator[T]],
+    *,
+    timeout: float | None = None,
+    prefetch: int = 1,
+) -> AsyncIterator[T]:
+    """Асинхронно итерирует блокирующий генератор пачек (iter_* из agency_mssql/agency_mysql).
+
+    Генератор целиком выполняется в одном потоке пула (соединения pyodbc/PyMySQL нельзя
+    передавать между потоками), пачки передаются в event loop через очередь. Поток читает
+    не больше `prefetch` пачек вперёд, поэтому медленный потребитель притормаживает чтение.
+
+    timeout — сколько ждать очередную пачку. При таймауте, исключении или отмене у
+    потребителя генератор закрывается (а с ним и соединение) перед следующей пачкой.
+    """
+    if timeout is None:
+        timeout = settings.agency_query_timeout_seconds
+    wait_timeout = timeout if timeout and timeout > 0 else None
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    slots = threading.Semaphore(max(1, prefetch))
+    stop = threading.Event()
+
+    def _push(item: Any) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def _produce() -> None:
+        gen = None
+        try:
+            gen = factory()
+            for batch in gen:
+                # Ждём свободный слот, периодически проверяя, не ушёл ли потребитель.
+                while not slots.acquire(timeout=0.5):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                _push(batch)
+            _push(_DONE)
+        except BaseException as e:  # noqa: BLE001
+            if not stop.is_set():
+                _push(e)
+        finally:
+            if gen is not None:
+                gen.close()
+
+    producer = loop.run_in_executor(_get_executor(), _produce)
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=wait_timeout)
+            except TimeoutError as e:
+                raise TimeoutError(f"Agency DB read timed out after {timeout}s") from e
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            slots.release()
+            yield item
+    finally:
+        stop.set()
+        # Разблокируем поток, если он ждёт слот.
+        slots.release()
+        # Не оставляем "exception was never retrieved" у фоновой задачи.
+        producer.add_done_callback(lambda f: f.cancelled() or f.exception())
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import threading
+import time
 from dataclasses import dataclass
 from datetime import date, datetime
-from typing import Any, Iterable
+from typing import Any, Iterable, Iterator
 from urllib.parse import parse_qs, unquote, urlparse
 
+from app.integrations.agency_pool import get_pool
+
 
 @dataclass(frozen=True)
 class MSSQLConnInfo:
@@ -103,17 +107,162 @@ def _require_pyodbc():
         ) from e
 
 
-def _rows_to_dicts(cursor) -> list[dict[str, Any]]:
+def _connect(info: MSSQLConnInfo):
+    pyodbc = _require_pyodbc()
+    # autocommit: соединение живёт в пуле, не держим на нём открытую транзакцию между опросами.
+    conn = pyodbc.connect(_build_odbc_conn_str(info), timeout=10, autocommit=True)
+    conn.setdecoding(pyodbc.SQL_CHAR, encoding="cp1251")
+    conn.setdecoding(pyodbc.SQL_WCHAR, encoding="utf-8")
+    conn.setencoding(encoding="utf-8")
+    return conn
+
+
+def _ping(conn) -> None:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT 1")
+        cur.fetchall()
+    finally:
+        cur.close()
+
+
+def _connection(info: MSSQLConnInfo):
+    """Соединение из пула (см. agency_pool): TLS/логин и setdecoding — один раз на соединение."""
+    return get_pool(info, lambda: _connect(info), _ping).connection()
+
+
+# Сколько строк за раз забираем из курсора pyodbc (fetchmany).
+DEFAULT_FETCH_BATCH_SIZE = 1000
+
+
+def _iter_row_batches(cursor, batch_size: int = DEFAULT_FETCH_BATCH_SIZE) -> Iterator[list[dict[str, Any]]]:
+    """Читает результат курсора пачками fetchmany, не материализуя всю выборку."""
     cols = [c[0] for c in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield [{cols[i]: row[i] for i in range(len(cols))} for row in rows]
+
+
+def _rows_to_dicts(cursor) -> list[dict[str, Any]]:
     out: list[dict[str, Any]] = []
-    for row in cursor.fetchall():
-        d = {cols[i]: row[i] for i in range(len(cols))}
-        out.append(d)
+    for batch in _iter_row_batches(cursor):
+        out.extend(batch)
     return out
 
 
-def fetch_objects_snapshot(mssql_url: str) -> dict[str, Any]:
-    """Снимает снапшот объектов/групп/ответственных из Pult4DB.
+def iter_objects_snapshot(
+    mssql_url: str,
+    *,
+    changed_since: datetime | None = None,
+    batch_size: int = DEFAULT_FETCH_BATCH_SIZE,
+) -> Iterator[tuple[str, list[dict[str, Any]]]]:
+    """Потоково читает снапшот объектов/групп/ответственных из Pult4DB.
+
+    Отдаёт пары (kind, batch) строго в порядке: "objects", "groups", "responsibles", "phones".
+    Каждая пачка не больше batch_size строк.
+
+    Если задан changed_since, читаются только панели с Panel.DateLastChange >= changed_since
+    (и их группы/ответственные/телефоны) — дельта-режим для регулярной синхронизации.
+    """
+
+    info = parse_mssql_url(mssql_url)
+
+    # В дельта-режиме все дочерние выборки ограничиваются изменёнными панелями.
+    if changed_since is not None:
+        changed_panels = "SELECT Panel_id FROM dbo.Panel WHERE DateLastChange >= ?"
+        objects_where = "WHERE p.DateLastChange >= ?"
+        groups_where = f"WHERE Panel_id IN ({changed_panels})"
+        responsibles_where = f"WHERE r.panel_id IN ({changed_panels})"
+        phones_where = (
+            "WHERE ResponsiblesList_id IN ("
+            f"SELECT ResponsiblesList_id FROM dbo.Responsibles WHERE panel_id IN ({changed_panels}))"
+        )
+        params: list[Any] = [changed_since]
+    else:
+        objects_where = groups_where = responsibles_where = phones_where = ""
+        params = []
+
+    queries = (
+        (
+            "objects",
+            f"""
+            SELECT
+              p.Panel_id,
+              p.Disabled,
+              p.Remarks,
+              p.AdditionalTechnicalInformation,
+              p.Latitude,
+              p.Longtitude,
+              p.CreateDate,
+              p.DateLastChange,
+              c.CompanyName,
+              c.[address] AS CompanyAddress,
+              c.Memo AS CompanyMemo
+            FROM dbo.Panel p
+            LEFT JOIN (
+              SELECT Panel_id, MAX(CompanyID) AS CompanyID
+              FROM dbo.Groups
+              GROUP BY Panel_id
+            ) g ON g.Panel_id = p.Panel_id
+            LEFT JOIN dbo.Company c ON c.ID = g.CompanyID
+            {objects_where}
+            """,
+        ),
+        (
+            "groups",
+            f"""
+            SELECT
+              Panel_id,
+              Group_ AS GroupNo,
+              Message AS GroupName,
+              IsOpen,
+              TimeEvent
+            FROM dbo.Groups
+            {groups_where}
+            """,
+        ),
+        (
+            "responsibles",
+            f"""
+            SELECT
+              r.panel_id AS Panel_id,
+              r.Group_ AS GroupNo,
+              r.Responsible_Number AS OrderNo,
+              rl.ResponsiblesList_id AS ListId,
+              rl.Responsible_Name AS ResponsibleName,
+              rl.Responsible_Address AS ResponsibleAddress
+            FROM dbo.Responsibles r
+            INNER JOIN dbo.ResponsiblesList rl
+              ON rl.ResponsiblesList_id = r.ResponsiblesList_id
+            {responsibles_where}
+            """,
+        ),
+        (
+            "phones",
+            f"""
+            SELECT
+              ResponsiblesList_id AS ListId,
+              PhoneNo,
+              TypeTel_id AS TypeId
+            FROM dbo.ResponsibleTel
+            {phones_where}
+            """,
+        ),
+    )
+
+    with _connection(info) as conn:
+
+        for kind, sql in queries:
+            with conn.cursor() as cur:
+                cur.execute(sql, *params)
+                for batch in _iter_row_batches(cur, batch_size):
+                    yield kind, batch
+
+
+def fetch_objects_snapshot(mssql_url: str, *, changed_since: datetime | None = None) -> dict[str, Any]:
+    """Снимает снапшот объектов/групп/ответственных из Pult4DB целиком (см. iter_objects_snapshot).
 
     Возвращает структуру:
     {
@@ -123,94 +272,238 @@ def fetch_objects_snapshot(mssql_url: str) -> dict[str, Any]:
       "phones": [ {list_id, phone, type_id} ],
     }
     """
+    out: dict[str, Any] = {"objects": [], "groups": [], "responsibles": [], "phones": []}
+    for kind, batch in iter_objects_snapshot(mssql_url, changed_since=changed_since):
+        out[kind].extend(batch)
+    return out
 
-    pyodbc = _require_pyodbc()
+
+# Кэш каталога месячных таблиц архива: (conn info, archives db) -> (время чтения, {"YYYYMM01", ...}).
+# Месяц считается доступным, только если есть и archiveYYYYMM01, и eventserviceYYYYMM01.
+ARCHIVE_CATALOG_TTL_SECONDS = 600.0
+# Если запрошенного месяца нет в кэше (например, агентство только что создало таблицу
+# нового месяца), каталог перечитывается досрочно, но не чаще чем раз в столько секунд.
+_ARCHIVE_CATALOG_MIN_REFRESH_SECONDS = 60.0
+
+_ARCHIVE_CATALOG: dict[tuple[MSSQLConnInfo, str], tuple[float, frozenset[str]]] = {}
+_ARCHIVE_CATALOG_LOCK = threading.Lock()
+
+
+def _read_archive_catalog(conn, archives_db_name: str) -> frozenset[str]:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"""
+            SELECT name
+            FROM {archives_db_name}.sys.tables
+            WHERE name LIKE 'archive%' OR name LIKE 'eventservice%'
+            """
+        )
+        names = {str(r[0]).lower() for r in cur.fetchall()}
+    finally:
+        cur.close()
+
+    archives = {n[len("archive") :] for n in names if n.startswith("archive")}
+    services = {n[len("eventservice") :] for n in names if n.startswith("eventservice")}
+    return frozenset(sfx for sfx in archives & services if len(sfx) == 8 and sfx.isdigit())
+
+
+def _archive_catalog(
+    conn,
+    info: MSSQLConnInfo,
+    archives_db_name: str,
+    *,
+    ttl: float,
+    wanted: Iterable[str] = (),
+) -> frozenset[str]:
+    key = (info, archives_db_name)
+    now = time.monotonic()
+    with _ARCHIVE_CATALOG_LOCK:
+        cached = _ARCHIVE_CATALOG.get(key)
+    if cached is not None:
+        loaded_at, suffixes = cached
+        age = now - loaded_at
+        fresh = age < ttl
+        missing = any(w not in suffixes for w in wanted)
+        if fresh and not (missing and age >= _ARCHIVE_CATALOG_MIN_REFRESH_SECONDS):
+            return suffixes
+
+    suffixes = _read_archive_catalog(conn, archives_db_name)
+    with _ARCHIVE_CATALOG_LOCK:
+        _ARCHIVE_CATALOG[key] = (now, suffixes)
+    return suffixes
+
+
+def invalidate_archive_catalog() -> None:
+    with _ARCHIVE_CATALOG_LOCK:
+        _ARCHIVE_CATALOG.clear()
+
+
+def list_archive_months(
+    mssql_url: str,
+    *,
+    archives_db_name: str,
+    ttl: float = ARCHIVE_CATALOG_TTL_SECONDS,
+) -> list[date]:
+    """Месяцы, для которых в pult4db_archives есть пара таблиц archive/eventservice (по возрастанию)."""
     info = parse_mssql_url(mssql_url)
-    conn_str = _build_odbc_conn_str(info)
-
-    with pyodbc.connect(conn_str, timeout=10) as conn:
-        conn.setdecoding(pyodbc.SQL_CHAR, encoding="cp1251")
-        conn.setdecoding(pyodbc.SQL_WCHAR, encoding="utf-8")
-        conn.setencoding(encoding="utf-8")
-
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                  p.Panel_id,
-                  p.Disabled,
-                  p.Remarks,
-                  p.AdditionalTechnicalInformation,
-                  p.Latitude,
-                  p.Longtitude,
-                  p.CreateDate,
-                  p.DateLastChange,
-                  c.CompanyName,
-                  c.[address] AS CompanyAddress,
-                  c.Memo AS CompanyMemo
-                FROM dbo.Panel p
-                LEFT JOIN (
-                  SELECT Panel_id, MAX(CompanyID) AS CompanyID
-                  FROM dbo.Groups
-                  GROUP BY Panel_id
-                ) g ON g.Panel_id = p.Panel_id
-                LEFT JOIN dbo.Company c ON c.ID = g.CompanyID
-                """
-            )
-            objects = _rows_to_dicts(cur)
-
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                  Panel_id,
-                  Group_ AS GroupNo,
-                  Message AS GroupName,
-                  IsOpen,
-                  TimeEvent
-                FROM dbo.Groups
-                """
-            )
-            groups = _rows_to_dicts(cur)
-
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                  r.panel_id AS Panel_id,
-                  r.Group_ AS GroupNo,
-                  r.Responsible_Number AS OrderNo,
-                  rl.ResponsiblesList_id AS ListId,
-                  rl.Responsible_Name AS ResponsibleName,
-                  rl.Responsible_Address AS ResponsibleAddress
-                FROM dbo.Responsibles r
-                INNER JOIN dbo.ResponsiblesList rl
-                  ON rl.ResponsiblesList_id = r.ResponsiblesList_id
-                """
-            )
-            responsibles = _rows_to_dicts(cur)
-
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                  ResponsiblesList_id AS ListId,
-                  PhoneNo,
-                  TypeTel_id AS TypeId
-                FROM dbo.ResponsibleTel
-                """
-            )
-            phones = _rows_to_dicts(cur)
+    with _connection(info) as conn:
+        suffixes = _archive_catalog(conn, info, archives_db_name, ttl=ttl)
+    return sorted(datetime.strptime(sfx, "%Y%m%d").date() for sfx in suffixes)
 
-    return {
-        "objects": objects,
-        "groups": groups,
-        "responsibles": responsibles,
-        "phones": phones,
-    }
 
+# Справочники основной БД (Code_T, States) маленькие и меняются редко: держим их в памяти
+# процесса и разрешаем коды событий локально, без cross-database JOIN в запросе архива.
+DICTIONARIES_TTL_SECONDS = 3600.0
+# Если встретился неизвестный код/статус, справочники перечитываются досрочно,
+# но не чаще чем раз в столько секунд.
+_DICTIONARIES_MIN_REFRESH_SECONDS = 60.0
 
-def fetch_archive_events_since(
+
+@dataclass(frozen=True)
+class AgencyDictionaries:
+    # (Code, CodeGroup) -> текст кода (CodeMes_RU, иначе Message)
+    codes: dict[tuple[str, int], str | None]
+    # State_id -> (StateName, isOverProcess)
+    states: dict[int, tuple[str | None, bool]]
+
+    @staticmethod
+    def _code_key(code: Any, code_group: Any) -> tuple[str, int] | None:
+        if code is None or code_group is None:
+            return None
+        try:
+            return str(code).strip(), int(code_group)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _state_key(state_id: Any) -> int | None:
+        if state_id is None:
+            return None
+        try:
+            return int(state_id)
+        except (TypeError, ValueError):
+            return None
+
+    def has_code(self, code: Any, code_group: Any) -> bool:
+        key = self._code_key(code, code_group)
+        return key is None or key in self.codes
+
+    def has_state(self, state_id: Any) -> bool:
+        key = self._state_key(state_id)
+        return key is None or key in self.states
+
+    def code_text(self, code: Any, code_group: Any) -> str | None:
+        key = self._code_key(code, code_group)
+        return self.codes.get(key) if key is not None else None
+
+    def state(self, state_id: Any) -> tuple[str | None, bool] | None:
+        key = self._state_key(state_id)
+        return self.states.get(key) if key is not None else None
+
+
+_DICTIONARIES: dict[MSSQLConnInfo, tuple[float, AgencyDictionaries]] = {}
+_DICTIONARIES_LOCK = threading.Lock()
+
+
+def _read_dictionaries(conn) -> AgencyDictionaries:
+    codes: dict[tuple[str, int], str | None] = {}
+    states: dict[int, tuple[str | None, bool]] = {}
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT Code, CodeGroup, COALESCE(CodeMes_RU, Message) FROM dbo.Code_T")
+        for code, code_group, text in cur.fetchall():
+            if code is None or code_group is None:
+                continue
+            codes[(str(code).strip(), int(code_group))] = str(text).strip() if text is not None else None
+
+        cur.execute("SELECT State_id, StateName, isOverProcess FROM dbo.States")
+        for state_id, name, is_over in cur.fetchall():
+            if state_id is None:
+                continue
+            states[int(state_id)] = (str(name).strip() if name is not None else None, bool(is_over))
+    finally:
+        cur.close()
+    return AgencyDictionaries(codes=codes, states=states)
+
+
+def get_dictionaries(
+    mssql_url: str,
+    *,
+    ttl: float = DICTIONARIES_TTL_SECONDS,
+    refresh_if_missing: bool = False,
+) -> AgencyDictionaries:
+    """Справочники Code_T/States из кэша; перечитываются из MSSQL по истечении ttl.
+
+    refresh_if_missing=True — вызывающая сторона встретила неизвестный код или статус:
+    перечитать досрочно (не чаще _DICTIONARIES_MIN_REFRESH_SECONDS).
+    """
+    info = parse_mssql_url(mssql_url)
+    now = time.monotonic()
+    with _DICTIONARIES_LOCK:
+        cached = _DICTIONARIES.get(info)
+    if cached is not None:
+        loaded_at, dictionaries = cached
+        age = now - loaded_at
+        if age < ttl and not (refresh_if_missing and age >= _DICTIONARIES_MIN_REFRESH_SECONDS):
+            return dictionaries
+
+    with _connection(info) as conn:
+        dictionaries = _read_dictionaries(conn)
+    with _DICTIONARIES_LOCK:
+        _DICTIONARIES[info] = (now, dictionaries)
+    return dictionaries
+
+
+def cached_dictionaries(mssql_url: str, *, ttl: float = DICTIONARIES_TTL_SECONDS) -> AgencyDictionaries | None:
+    """Справочники из кэша без обращения к MSSQL (None, если их нет или они устарели)."""
+    info = parse_mssql_url(mssql_url)
+    with _DICTIONARIES_LOCK:
+        cached = _DICTIONARIES.get(info)
+    if cached is None or time.monotonic() - cached[0] >= ttl:
+        return None
+    return cached[1]
+
+
+def invalidate_dictionaries() -> None:
+    with _DICTIONARIES_LOCK:
+        _DICTIONARIES.clear()
+
+
+# Колонки события архива + последняя запись eventservice (алиасы a / es).
+_ARCHIVE_EVENT_COLUMNS = """
+              a.Event_id,
+              a.Date_Key,
+              a.Panel_id,
+              a.Group_ AS GroupNo,
+              a.Line,
+              a.Zone,
+              a.Code,
+              a.CodeGroup,
+              a.TimeEvent,
+              a.Result_Text,
+              a.StateEvent,
+              es.NameState,
+              es.PersonName,
+              es.GrResponseName,
+              es.OperationTime"""
+
+
+def _latest_service_apply(service_table: str) -> str:
+    return f"""
+            OUTER APPLY (
+              SELECT TOP (1)
+                s.NameState,
+                s.PersonName,
+                s.GrResponseName,
+                s.OperationTime
+              FROM {service_table} s
+              WHERE s.Event_id = a.Event_id AND s.Date_Key = a.Date_Key
+              ORDER BY s.OperationTime DESC
+            ) es"""
+
+
+def iter_archive_events_since(
     mssql_url: str,
     *,
     archives_db_name: str,
@@ -218,18 +511,20 @@ def fetch_archive_events_since(
     cursor_event_id: int,
     limit: int,
     until_date_key: int | None = None,
-) -> list[dict[str, Any]]:
-    """Читает события из pult4db_archives.archiveYYYYMM01 начиная с курсора.
-
-    Возвращает события в порядке возрастания (Date_Key, Event_id).
+    batch_size: int = DEFAULT_FETCH_BATCH_SIZE,
+    catalog_ttl: float = ARCHIVE_CATALOG_TTL_SECONDS,
+) -> Iterator[list[dict[str, Any]]]:
+    """Потоково читает события из pult4db_archives.archiveYYYYMM01 начиная с курсора.
+
+    Отдаёт пачки (не больше batch_size строк) в порядке возрастания (Date_Key, Event_id),
+    всего не больше limit строк. Запрашиваются только месяцы, таблицы которых есть
+    в кэшированном каталоге sys.tables (см. _archive_catalog).
     """
 
     if limit <= 0:
-        return []
+        return
 
-    pyodbc = _require_pyodbc()
     info = parse_mssql_url(mssql_url)
-    conn_str = _build_odbc_conn_str(info)
 
     if until_date_key is None:
         until_date_key = _date_key(date.today())
@@ -248,63 +543,37 @@ def fetch_archive_events_since(
         else:
             d = date(d.year, d.month + 1, 1)
 
-    out: list[dict[str, Any]] = []
+    fetched = 0
 
-    with pyodbc.connect(conn_str, timeout=10) as conn:
-        conn.setdecoding(pyodbc.SQL_CHAR, encoding="cp1251")
-        conn.setdecoding(pyodbc.SQL_WCHAR, encoding="utf-8")
-        conn.setencoding(encoding="utf-8")
+    with _connection(info) as conn:
+        # Последний месяц диапазона просим явно: если его таблиц ещё нет в кэше,
+        # каталог перечитается досрочно.
+        catalog = _archive_catalog(
+            conn,
+            info,
+            archives_db_name,
+            ttl=catalog_ttl,
+            wanted=[_month_table_suffix(months[-1])] if months else [],
+        )
+        months = [m for m in months if _month_table_suffix(m) in catalog]
 
         for m in months:
-            if len(out) >= limit:
+            if fetched >= limit:
                 break
 
             suffix = _month_table_suffix(m)
             archive_table = f"{archives_db_name}.dbo.archive{suffix}"
             service_table = f"{archives_db_name}.dbo.eventservice{suffix}"
 
-            # Reference dictionary tables from the main DB (the one in the URL).
-            # We keep them fully-qualified to support cross-database joins.
-            code_table = f"{info.database}.dbo.Code_T"
-            states_table = f"{info.database}.dbo.States"
-
-            remaining = limit - len(out)
+            remaining = limit - fetched
 
+            # Только сырые коды (Code/CodeGroup/StateEvent): тексты из Code_T/States
+            # разрешаются на стороне сервиса по кэшу справочников (см. get_dictionaries).
             sql = f"""
             SELECT TOP ({int(remaining)})
-              a.Event_id,
-              a.Date_Key,
-              a.Panel_id,
-              a.Group_ AS GroupNo,
-              a.Line,
-              a.Zone,
-              a.Code,
-              a.CodeGroup,
-              a.TimeEvent,
-              a.Result_Text,
-              a.StateEvent,
-              es.NameState,
-              es.PersonName,
-              es.GrResponseName,
-              es.OperationTime
+              {_ARCHIVE_EVENT_COLUMNS}
             FROM {archive_table} a
-            OUTER APPLY (
-              SELECT TOP (1)
-                s.NameState,
-                s.PersonName,
-                            st.StateName AS StateName,
-                            st.isOverProcess AS StateIsOverProcess,
-                            COALESCE(ct.CodeMes_RU, ct.Message) AS CodeText,
-                s.GrResponseName,
-                s.OperationTime
-              FROM {service_table} s
-              WHERE s.Event_id = a.Event_id AND s.Date_Key = a.Date_Key
-              ORDER BY s.OperationTime DESC
-            ) es
-                        LEFT JOIN {states_table} st
-                            ON st.State_id = a.StateEvent
-                        LEFT JOIN {code_table} ct
-                            ON ct.Code = a.Code AND ct.CodeGroup = a.CodeGroup
+            {_latest_service_apply(service_table)}
             WHERE a.Date_Key BETWEEN ? AND ?
               AND (
                 a.Date_Key > ?
@@ -315,13 +584,179 @@ def fetch_archive_events_since(
 
             params = [cursor_date_key, until_date_key, cursor_date_key, cursor_date_key, cursor_event_id]
 
+            cur = conn.cursor()
             try:
-                with conn.cursor() as cur:
-                    cur.execute(sql, params)
-                    rows = _rows_to_dicts(cur)
-                    out.extend(rows)
+                cur.execute(sql, params)
             except Exception:
-                # Если конкретной месячной таблицы нет — просто пропускаем
+                # Таблица пропала или недоступна — пропускаем месяц и перечитаем каталог при следующем опросе.
+                cur.close()
+                invalidate_archive_catalog()
                 continue
 
+            with cur:
+                for batch in _iter_row_batches(cur, batch_size):
+                    fetched += len(batch)
+                    yield batch
+
+
+def fetch_archive_head(
+    mssql_url: str,
+    *,
+    archives_db_name: str,
+    catalog_ttl: float = ARCHIVE_CATALOG_TTL_SECONDS,
+) -> dict[str, Any] | None:
+    """Последнее событие архива (Date_Key, Event_id, TimeEvent) — для оценки отставания синка.
+
+    Смотрит только самую свежую месячную таблицу из каталога; None, если архивов нет.
+    """
+    info = parse_mssql_url(mssql_url)
+    with _connection(info) as conn:
+        today = date.today()
+        catalog = _archive_catalog(
+            conn,
+            info,
+            archives_db_name,
+            ttl=catalog_ttl,
+            wanted=[_month_table_suffix(date(today.year, today.month, 1))],
+        )
+        for suffix in sorted(catalog, reverse=True):
+            cur = conn.cursor()
+            with cur:
+                cur.execute(
+                    f"""
+                    SELECT TOP (1) a.Date_Key, a.Event_id, a.TimeEvent
+                    FROM {archives_db_name}.dbo.archive{suffix} a
+                    ORDER BY a.Date_Key DESC, a.Event_id DESC
+                    """
+                )
+                row = cur.fetchone()
+            if row is not None:
+                return {"dateKey": int(row[0]), "eventId": int(row[1]), "timeEvent": row[2]}
+    return None
+
+
+def iter_event_state_changes_since(
+    mssql_url: str,
+    *,
+    archives_db_name: str,
+    since: datetime,
+    after_date_key: int = 0,
+    after_event_id: int = 0,
+    limit: int,
+    lookback_months: int = 1,
+    batch_size: int = DEFAULT_FETCH_BATCH_SIZE,
+    catalog_ttl: float = ARCHIVE_CATALOG_TTL_SECONDS,
+) -> Iterator[list[dict[str, Any]]]:
+    """Потоково читает события, изменённые в eventservice после водяного знака.
+
+    Водяной знак составной — (ChangedAt, Date_Key, Event_id) последней обработанной строки:
+    отдаются строки строго больше него, поэтому сколько угодно событий с одним ChangedAt
+    читаются по limit за вызов, а не застревают на границе. Строки — те же, что у
+    iter_archive_events_since (текущее состояние события из архива и последняя запись
+    eventservice), плюс ChangedAt — последний OperationTime по событию. Отдаются в порядке
+    возрастания (ChangedAt, Date_Key, Event_id), всего не больше limit строк.
+    Просматриваются таблицы месяцев от (месяц since − lookback_months) до текущего:
+    обработка события пишется в eventservice месяца самого события.
+    """
+    if limit <= 0:
+        return
+
+    info = parse_mssql_url(mssql_url)
+
+    first = date(since.year, since.month, 1)
+    for _ in range(max(0, int(lookback_months))):
+        first = date(first.year - 1, 12, 1) if first.month == 1 else date(first.year, first.month - 1, 1)
+    today = date.today()
+    last = date(today.year, today.month, 1)
+
+    months: list[date] = []
+    d = first
+    while d <= last:
+        months.append(d)
+        d = date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+    with _connection(info) as conn:
+        catalog = _archive_catalog(
+            conn,
+            info,
+            archives_db_name,
+            ttl=catalog_ttl,
+            wanted=[_month_table_suffix(last)],
+        )
+        suffixes = [_month_table_suffix(m) for m in months if _month_table_suffix(m) in catalog]
+        if not suffixes:
+            return
+
+        # Один запрос UNION ALL по месяцам с общей сортировкой по ChangedAt: тогда
+        # последняя строка пачки — корректный водяной знак для следующего опроса.
+        arms: list[str] = []
+        for suffix in suffixes:
+            archive_table = f"{archives_db_name}.dbo.archive{suffix}"
+            service_table = f"{archives_db_name}.dbo.eventservice{suffix}"
+            arms.append(
+                f"""
+            SELECT
+              {_ARCHIVE_EVENT_COLUMNS},
+              chg.ChangedAt
+            FROM (
+              SELECT s.Event_id, s.Date_Key, MAX(s.OperationTime) AS ChangedAt
+              FROM {service_table} s
+              WHERE s.OperationTime >= CAST(? AS datetime)
+              GROUP BY s.Event_id, s.Date_Key
+            ) chg
+            JOIN {archive_table} a
+              ON a.Event_id = chg.Event_id AND a.Date_Key = chg.Date_Key
+            {_latest_service_apply(service_table)}
+            WHERE chg.ChangedAt > CAST(? AS datetime)
+              OR (
+                chg.ChangedAt = CAST(? AS datetime)
+                AND (chg.Date_Key > ? OR (chg.Date_Key = ? AND chg.Event_id > ?))
+              )
+            """
+            )
+
+        sql = f"""
+        SELECT TOP ({int(limit)}) u.*
+        FROM ({" UNION ALL ".join(arms)}) u
+        ORDER BY u.ChangedAt ASC, u.Date_Key ASC, u.Event_id ASC
+        """
+
+        # OperationTime — datetime (шаг 1/300 с): водяной знак приводится к тому же типу,
+        # иначе граничное значение, прочитанное в Python, не совпадёт с колонкой при сравнении.
+        params = [since, since, since, after_date_key, after_date_key, after_event_id]
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params * len(suffixes))
+        except Exception:
+            cur.close()
+            invalidate_archive_catalog()
+            raise
+
+        with cur:
+            yield from _iter_row_batches(cur, batch_size)
+
+
+def fetch_archive_events_since(
+    mssql_url: str,
+    *,
+    archives_db_name: str,
+    cursor_date_key: int,
+    cursor_event_id: int,
+    limit: int,
+    until_date_key: int | None = None,
+) -> list[dict[str, Any]]:
+    """Читает события из pult4db_archives.archiveYYYYMM01 начиная с курсора (см. iter_archive_events_since).
+
+    Возвращает события в порядке возрастания (Date_Key, Event_id).
+    """
+    out: list[dict[str, Any]] = []
+    for batch in iter_archive_events_since(
+        mssql_url,
+        archives_db_name=archives_db_name,
+        cursor_date_key=cursor_date_key,
+        cursor_event_id=cursor_event_id,
+        limit=limit,
+        until_date_key=until_date_key,
+    ):
+        out.extend(batch)
     return out
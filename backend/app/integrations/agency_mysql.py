@@ -3,11 +3,15 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import date as date_type
 from datetime import datetime, time as time_type
-from typing import Any
+from typing import Any, Iterator
 from urllib.parse import parse_qs, urlparse
 
+import re
+
 import pymysql
 
+from app.integrations.agency_pool import get_pool
+
 
 @dataclass(frozen=True)
 class MySQLConnInfo:
@@ -51,56 +55,98 @@ def _combine_dt(dt: datetime | None, t: time_type | None) -> datetime | None:
     return datetime.combine(dt.date(), t)
 
 
-def fetch_alarms_since(
-    mysql_url: str,
-    last_id: int,
-    limit: int = 500,
-) -> list[dict[str, Any]]:
-    """Fetch alarms joined with objects after a given ID.
-
-    Returns rows with MySQL-native field names.
-    """
-    info = parse_mysql_url(mysql_url)
-    conn = pymysql.connect(
+def _connect(info: MySQLConnInfo) -> pymysql.connections.Connection:
+    # autocommit: pooled connections must not pin a REPEATABLE READ snapshot between polls.
+    return pymysql.connect(
         host=info.host,
         port=info.port,
         user=info.user,
         password=info.password,
         database=info.database,
         charset=info.charset,
-        cursorclass=pymysql.cursors.DictCursor,
+        autocommit=True,
     )
-    try:
-        with conn.cursor() as cur:
+
+
+def _ping(conn: pymysql.connections.Connection) -> None:
+    conn.ping(reconnect=False)
+
+
+def _connection(info: MySQLConnInfo):
+    """Pooled connection (see agency_pool), reused across poll ticks."""
+    return get_pool(info, lambda: _connect(info), _ping).connection()
+
+
+# Сколько строк за раз забираем из небуферизованного курсора (fetchmany).
+DEFAULT_FETCH_BATCH_SIZE = 1000
+
+
+def _normalize_alarm_row(r: dict[str, Any]) -> dict[str, Any]:
+    # DATE_ALARM is datetime in schema; TIME_ALARM is time. Keep both but also expose TS
+    dt = r.get("DATE_ALARM")
+    t = r.get("TIME_ALARM")
+    if isinstance(dt, datetime) or dt is None:
+        pass
+    else:
+        # Sometimes drivers return date; handle gracefully
+        if isinstance(dt, date_type):
+            dt = datetime.combine(dt, datetime.min.time())
+    if isinstance(t, time_type) or t is None:
+        pass
+    r["_TS"] = _combine_dt(dt, t) or (dt if isinstance(dt, datetime) else None)
+    return r
+
+
+# Alarm + object columns read by the sync (shared by all alarm queries).
+_ALARM_COLUMNS = """
+  a.ID_ALARMS,
+  a.ID_OBJECTS,
+  a.NUMBER_CAR,
+  a.FIO_OPERATORS,
+  a.FIO_ENGINEERS,
+  a.NUMBER_SHLEIF,
+  a.OSMOTR,
+  a.DATE_ALARM,
+  a.TIME_ALARM,
+  a.TIME_COMING,
+  a.RESULT_OSMOTR,
+  a.ZAMETKI,
+  a.IS_ZAYAVKA,
+  a.IS_DONE,
+  a.RESULT_ZAYAVKA,
+  a.IS_SHTRAF,
+  a.NUM_SHTRAF,
+  a.IS_PROPAZHA,
+  a.IS_PROP_FIXED,
+  a.IS_DOGOVOR_OTDEL,
+  a.IS_SRABOTKA_FALSE,
+  o.OBJ_NUMBER,
+  o.OBJ_ADRESS,
+  o.OBJ_FIO,
+  o.OBJ_SYSTEM,
+  o.OBJ_STATUS
+"""
+
+
+def iter_alarms_since(
+    mysql_url: str,
+    last_id: int,
+    limit: int = 500,
+    batch_size: int = DEFAULT_FETCH_BATCH_SIZE,
+) -> Iterator[list[dict[str, Any]]]:
+    """Stream alarms joined with objects after a given ID in bounded batches.
+
+    Uses an unbuffered server-side cursor (SSDictCursor), so rows are pulled
+    from MySQL as batches are consumed instead of being buffered client-side.
+    Returns rows with MySQL-native field names, ordered by ID_ALARMS.
+    """
+    info = parse_mysql_url(mysql_url)
+    with _connection(info) as conn:
+        with conn.cursor(pymysql.cursors.SSDictCursor) as cur:
             cur.execute(
-                """
+                f"""
                 SELECT
-                  a.ID_ALARMS,
-                  a.ID_OBJECTS,
-                  a.NUMBER_CAR,
-                  a.FIO_OPERATORS,
-                  a.FIO_ENGINEERS,
-                  a.NUMBER_SHLEIF,
-                  a.OSMOTR,
-                  a.DATE_ALARM,
-                  a.TIME_ALARM,
-                  a.TIME_COMING,
-                  a.RESULT_OSMOTR,
-                  a.ZAMETKI,
-                  a.IS_ZAYAVKA,
-                  a.IS_DONE,
-                  a.RESULT_ZAYAVKA,
-                  a.IS_SHTRAF,
-                  a.NUM_SHTRAF,
-                  a.IS_PROPAZHA,
-                  a.IS_PROP_FIXED,
-                  a.IS_DOGOVOR_OTDEL,
-                  a.IS_SRABOTKA_FALSE,
-                  o.OBJ_NUMBER,
-                  o.OBJ_ADRESS,
-                  o.OBJ_FIO,
-                  o.OBJ_SYSTEM,
-                  o.OBJ_STATUS
+                {_ALARM_COLUMNS}
                 FROM alarms a
                 LEFT JOIN objects o ON o.ID_OBJECTS = a.ID_OBJECTS
                 WHERE a.ID_ALARMS > %s
@@ -109,23 +155,102 @@ def fetch_alarms_since(
                 """,
                 (last_id, limit),
             )
-            rows = cur.fetchall()
-
-        # Normalize timestamps where possible
-        for r in rows:
-            # DATE_ALARM is datetime in schema; TIME_ALARM is time. Keep both but also expose TS
-            dt = r.get("DATE_ALARM")
-            t = r.get("TIME_ALARM")
-            if isinstance(dt, datetime) or dt is None:
-                pass
-            else:
-                # Sometimes drivers return date; handle gracefully
-                if isinstance(dt, date_type):
-                    dt = datetime.combine(dt, datetime.min.time())
-            if isinstance(t, time_type) or t is None:
-                pass
-            r["_TS"] = _combine_dt(dt, t) or (dt if isinstance(dt, datetime) else None)
-
-        return rows
-    finally:
-        conn.close()
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [_normalize_alarm_row(r) for r in rows]
+
+
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def iter_alarms_window(
+    mysql_url: str,
+    *,
+    min_id: int,
+    max_id: int,
+    modified_column: str | None = None,
+    modified_since: datetime | None = None,
+    modified_after_id: int = 0,
+    limit: int | None = None,
+    batch_size: int = DEFAULT_FETCH_BATCH_SIZE,
+) -> Iterator[list[dict[str, Any]]]:
+    """Re-read already synced alarms (min_id < ID_ALARMS <= max_id) in bounded batches.
+
+    Without modified_column this is a plain trailing window ordered by ID_ALARMS.
+    With modified_column (a modification timestamp of alarms, if the source has one)
+    only rows strictly after the compound watermark (modified_since, modified_after_id)
+    are returned, ordered by (column, ID_ALARMS): alarms touched by one bulk UPDATE
+    share a timestamp and are paged by ID instead of being re-read forever. The value
+    is exposed as _MODIFIED_AT so the caller can advance its watermark.
+    """
+    params: list[Any] = [min_id, max_id]
+    modified_select = ""
+    modified_where = ""
+    order_by = "a.ID_ALARMS ASC"
+    if modified_column:
+        if not _IDENTIFIER_RE.match(modified_column):
+            raise ValueError(f"Invalid alarms column name: {modified_column!r}")
+        modified_select = f", a.`{modified_column}` AS _MODIFIED_AT"
+        if modified_since is not None:
+            modified_where = (
+                f"AND (a.`{modified_column}` > %s OR (a.`{modified_column}` = %s AND a.ID_ALARMS > %s))"
+            )
+            params.extend([modified_since, modified_since, int(modified_after_id)])
+        order_by = f"a.`{modified_column}` ASC, a.ID_ALARMS ASC"
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT %s"
+        params.append(int(limit))
+
+    info = parse_mysql_url(mysql_url)
+    with _connection(info) as conn:
+        with conn.cursor(pymysql.cursors.SSDictCursor) as cur:
+            cur.execute(
+                f"""
+                SELECT
+                {_ALARM_COLUMNS}
+                {modified_select}
+                FROM alarms a
+                LEFT JOIN objects o ON o.ID_OBJECTS = a.ID_OBJECTS
+                WHERE a.ID_ALARMS > %s AND a.ID_ALARMS <= %s
+                {modified_where}
+                ORDER BY {order_by}
+                {limit_sql}
+                """,
+                tuple(params),
+            )
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [_normalize_alarm_row(r) for r in rows]
+
+
+def fetch_alarms_since(
+    mysql_url: str,
+    last_id: int,
+    limit: int = 500,
+) -> list[dict[str, Any]]:
+    """Fetch alarms joined with objects after a given ID (see iter_alarms_since).
+
+    Returns rows with MySQL-native field names.
+    """
+    rows: list[dict[str, Any]] = []
+    for batch in iter_alarms_since(mysql_url, last_id=last_id, limit=limit):
+        rows.extend(batch)
+    return rows
+
+
+def fetch_alarms_head(mysql_url: str) -> int | None:
+    """Return the newest ID_ALARMS in the source (None for an empty table).
+
+    Used to report sync lag (head vs local last_id).
+    """
+    info = parse_mysql_url(mysql_url)
+    with _connection(info) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT MAX(ID_ALARMS) FROM alarms")
+            row = cur.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Iterator
+
+from app.core.config import settings
+
+
+@dataclass
+class _PooledConnection:
+    conn: Any
+    created_at: float = field(default_factory=time.monotonic)
+    last_used_at: float = field(default_factory=time.monotonic)
+
+
+class AgencyConnectionPool:
+    """Небольшой потокобезопасный пул соединений к одной агентской БД.
+
+    - connect(): открывает и настраивает новое соединение (setdecoding и т.п. — один раз);
+    - ping(conn): проверка живости при выдаче из пула (аналог pool_pre_ping);
+    - соединения старше max_age секунд пересоздаются;
+    - соединение, на котором случилась ошибка (или чтение прервано), в пул не возвращается.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        ping: Callable[[Any], None],
+        *,
+        max_idle: int,
+        max_age: float,
+    ) -> None:
+        self._connect = connect
+        self._ping = ping
+        self._max_idle = max(0, int(max_idle))
+        self._max_age = float(max_age)
+        self._idle: list[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def _expired(self, pc: _PooledConnection) -> bool:
+        return self._max_age > 0 and (time.monotonic() - pc.created_at) >= self._max_age
+
+    @staticmethod
+    def _close(pc: _PooledConnection) -> None:
+        try:
+            pc.conn.close()
+        except Exception:
+            pass
+
+    def _acquire(self) -> _PooledConnection:
+        while True:
+            with self._lock:
+                pc = self._idle.pop() if self._idle else None
+            if pc is None:
+                break
+            if self._expired(pc):
+                self._close(pc)
+                continue
+            try:
+                self._ping(pc.conn)
+            except Exception:
+                self._close(pc)
+                continue
+            with self._lock:
+                self.reused += 1
+            return pc
+
+        pc = _PooledConnection(conn=self._connect())
+        with self._lock:
+            self.opened += 1
+        return pc
+
+    def _release(self, pc: _PooledConnection) -> None:
+        pc.last_used_at = time.monotonic()
+        if not self._expired(pc):
+            with self._lock:
+                if len(self._idle) < self._max_idle:
+                    self._idle.append(pc)
+                    return
+        self._close(pc)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        pc = self._acquire()
+        try:
+            yield pc.conn
+        except BaseException:
+            # Состояние соединения неизвестно (ошибка, недочитанный курсор) — не переиспользуем.
+            self._close(pc)
+            raise
+        self._release(pc)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pc in idle:
+            self._close(pc)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"idle": len(self._idle), "opened": self.opened, "reused": self.reused}
+
+
+_POOLS: dict[Hashable, AgencyConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(
+    key: Hashable,
+    connect: Callable[[], Any],
+    ping: Callable[[Any], None],
+) -> AgencyConnectionPool:
+    """Возвращает пул для ключа (MSSQLConnInfo / MySQLConnInfo), создавая его при первом обращении."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = AgencyConnectionPool(
+                connect,
+                ping,
+                max_idle=settings.agency_pool_size,
+                max_age=settings.agency_pool_recycle_seconds,
+            )
+            _POOLS[key] = pool
+        return pool
+
+
+def close_agency_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+def agency_pools_stats() -> list[dict[str, Any]]:
+    with _POOLS_LOCK:
+        items = list(_POOLS.items())
+    out: list[dict[str, Any]] = []
+    for key, pool in items:
+        host = getattr(key, "host", None)
+        database = getattr(key, "database", None)
+        out.append({"kind": type(key).__name__, "host": host, "database": database, **pool.stats()})
+    return out
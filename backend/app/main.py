@@ -10,6 +10,8 @@ from app.api.v1.api import api_router
 from app.core.config import settings
 from app.db.init_db import init_db
 from app.db.session import engine
+from app.integrations.agency_async import shutdown_agency_executor
+from app.integrations.agency_pool import close_agency_pools
 from app.services.auto_sync import start_auto_sync, stop_auto_sync
 
 
@@ -38,6 +40,8 @@ def create_app() -> FastAPI:
     @app.on_event("shutdown")
     async def _shutdown() -> None:
         await stop_auto_sync(app)
+        shutdown_agency_executor()
+        close_agency_pools()
 
     origins = settings.cors_origins_list()
     origin_regex = settings.cors_origin_regex.strip()
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import String, Text
+from sqlalchemy import Index, String, Text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.base import Base
@@ -10,6 +10,11 @@ from app.db.base import Base
 
 class Event(Base):
     __tablename__ = "events"
+    # Ленты событий (новые сверху, id — стабильный tiebreak) и keyset-пагинация по (timestamp, id).
+    __table_args__ = (
+        Index("ix_events_timestamp_id", "timestamp", "id"),
+        Index("ix_events_object_id_timestamp_id", "object_id", "timestamp", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String(64), primary_key=True)
     timestamp: Mapped[datetime] = mapped_column(index=True)
@@ -28,7 +33,18 @@ class Event(Base):
     code_text: Mapped[str | None] = mapped_column(String(500), index=True, nullable=True)
     state_name: Mapped[str | None] = mapped_column(String(60), index=True, nullable=True)
     state_is_over_process: Mapped[bool | None] = mapped_column(nullable=True)
-
+    state_event: Mapped[int | None] = mapped_column(nullable=True)
+
+    # Детали события архива MSSQL (раньше склеивались в description)
+    zone: Mapped[int | None] = mapped_column(index=True, nullable=True)
+    line: Mapped[str | None] = mapped_column(String(16), index=True, nullable=True)
+    group_no: Mapped[int | None] = mapped_column(nullable=True)
+    person: Mapped[str | None] = mapped_column(String(200), index=True, nullable=True)
+    gbr: Mapped[str | None] = mapped_column(String(100), index=True, nullable=True)
+    result_text: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    # Для событий MSSQL пустая строка: текст собирается при чтении из колонок выше
+    # (см. app.services.event_text.render_description).
     description: Mapped[str] = mapped_column(Text)
     location: Mapped[str | None] = mapped_column(String(255), nullable=True)
 
@@ -6,19 +6,48 @@ import time
 from typing import Any
 
 from fastapi import FastAPI
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.db.session import SessionLocal
+from app.integrations.agency_async import run_agency_call
+from app.integrations.agency_mssql import fetch_archive_head
+from app.integrations.agency_mysql import fetch_alarms_head
+from app.models.event import Event
 from app.services.sync_service import (
+    get_last_alarm_id,
+    get_mssql_event_cursor,
+    objects_full_sync_due,
+    refresh_event_states_from_agency_mssql,
+    refresh_recent_alarms_from_agency_mysql,
     sync_events_from_agency_mssql_archives,
     sync_events_from_agency_mysql,
     sync_objects_from_agency_mssql,
 )
+from app.services.sync_leader import (
+    SYNC_LOCK,
+    acquire_sync_leadership,
+    check_sync_leadership,
+    release_sync_leadership,
+    sync_leader_status,
+)
 
 logger = logging.getLogger(__name__)
 
-# SQLite allows only one writer at a time. Also prevents overlapping sync loops.
-_SYNC_LOCK = asyncio.Lock()
+# Отставание от источника проверяем не чаще, чем раз в столько секунд (это отдельный запрос к агентской БД).
+_LAG_CHECK_INTERVAL_SECONDS = 30.0
+
+# Состояние планировщика для auto_sync_status().
+_STATE: dict[str, Any] = {
+    "mode": "idle",  # idle|standby|normal|catch-up
+    "batchLimit": None,
+    "lastFetched": None,
+    "lastProcessed": None,
+    "lastTickAt": None,
+    "lag": None,
+    "lagCheckedAt": None,
+}
 
 
 def start_auto_sync(app: FastAPI) -> None:
@@ -71,45 +100,159 @@ async def _auto_sync_loop(stop_event: asyncio.Event) -> None:
         return
 
     last_objects_sync_ts = 0.0
+    last_states_sync_ts = 0.0
+    last_lag_check_ts = 0.0
+    base_limit = max(1, int(settings.auto_sync_events_limit))
+    max_limit = max(base_limit, int(settings.auto_sync_events_max_limit))
+    batch_limit = base_limit
+    leading = False
 
-    while not stop_event.is_set():
-        started_at = time.monotonic()
-        try:
-            async with _SYNC_LOCK:
-                async with SessionLocal() as session:
-                    if scheme.startswith("mysql"):
-                        await sync_events_from_agency_mysql(
-                            session=session,
-                            agency_mysql_url=url,
-                            batch_limit=settings.auto_sync_events_limit,
-                        )
-                    else:
-                        await sync_events_from_agency_mssql_archives(
-                            session=session,
-                            agency_mssql_url=url,
-                            archives_db_name=settings.agency_archives_db_name,
-                            batch_limit=settings.auto_sync_events_limit,
+    try:
+        while not stop_event.is_set():
+            if leading and not await check_sync_leadership():
+                leading = False
+            if not leading:
+                leading = await acquire_sync_leadership("auto-sync")
+                if leading:
+                    # Курсоры могли уйти вперёд в другом процессе: расписание начинаем заново.
+                    last_objects_sync_ts = last_states_sync_ts = last_lag_check_ts = 0.0
+                    batch_limit = base_limit
+            if not leading:
+                # Синк ведёт другой процесс: ждём, пока он освободит лидерство.
+                _STATE["mode"] = "standby"
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=float(settings.sync_leader_retry_seconds))
+                except TimeoutError:
+                    pass
+                continue
+
+            started_at = time.monotonic()
+            catching_up = False
+            try:
+                async with SYNC_LOCK:
+                    async with SessionLocal() as session:
+                        if scheme.startswith("mysql"):
+                            result = await sync_events_from_agency_mysql(
+                                session=session,
+                                agency_mysql_url=url,
+                                batch_limit=batch_limit,
+                            )
+                        else:
+                            result = await sync_events_from_agency_mssql_archives(
+                                session=session,
+                                agency_mssql_url=url,
+                                archives_db_name=settings.agency_archives_db_name,
+                                batch_limit=batch_limit,
+                            )
+
+                        # Полная пачка — в источнике, скорее всего, есть ещё: догоняем без паузы.
+                        fetched = int(result.get("fetched") or 0)
+                        catching_up = fetched >= batch_limit
+                        _STATE.update(
+                            mode="catch-up" if catching_up else "normal",
+                            batchLimit=batch_limit,
+                            lastFetched=fetched,
+                            lastProcessed=int(result.get("processed") or 0),
+                            lastTickAt=time.time(),
                         )
 
-                    now = time.monotonic()
-                    if scheme.startswith("mssql") and (
-                        now - last_objects_sync_ts
-                    ) >= settings.auto_sync_objects_interval_seconds:
-                        await sync_objects_from_agency_mssql(session=session, agency_mssql_url=url)
-                        last_objects_sync_ts = now
+                        now = time.monotonic()
+                        if scheme.startswith("mssql") and (
+                            now - last_objects_sync_ts
+                        ) >= settings.auto_sync_objects_interval_seconds:
+                            # Обычно — дельта по Panel.DateLastChange, полный снапшот — раз в сутки.
+                            full = await objects_full_sync_due(session)
+                            await sync_objects_from_agency_mssql(session=session, agency_mssql_url=url, full=full)
+                            last_objects_sync_ts = now
+
+                        if (now - last_states_sync_ts) >= settings.auto_sync_states_interval_seconds:
+                            if scheme.startswith("mysql"):
+                                # Смена IS_DONE/IS_ZAYAVKA/IS_PROPAZHA у уже загруженных тревог.
+                                await refresh_recent_alarms_from_agency_mysql(
+                                    session=session,
+                                    agency_mysql_url=url,
+                                    batch_limit=settings.auto_sync_states_limit,
+                                )
+                            else:
+                                # Обработка событий оператором — по eventservice.OperationTime.
+                                await refresh_event_states_from_agency_mssql(
+                                    session=session,
+                                    agency_mssql_url=url,
+                                    archives_db_name=settings.agency_archives_db_name,
+                                    batch_limit=settings.auto_sync_states_limit,
+                                )
+                            last_states_sync_ts = now
+
+                        if (time.monotonic() - last_lag_check_ts) >= _LAG_CHECK_INTERVAL_SECONDS:
+                            last_lag_check_ts = time.monotonic()
+                            try:
+                                _STATE["lag"] = await _measure_lag(session, scheme, url)
+                                _STATE["lagCheckedAt"] = time.time()
+                            except Exception:
+                                logger.warning("Auto-sync lag check failed", exc_info=True)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Auto-sync iteration failed")
+                catching_up = False
 
-        except asyncio.CancelledError:
-            raise
-        except Exception:
-            logger.exception("Auto-sync iteration failed")
+            if catching_up:
+                # Наращиваем пачку до потолка и сразу идём за следующей.
+                batch_limit = min(batch_limit * 2, max_limit)
+                await asyncio.sleep(0)
+                continue
 
-        elapsed = time.monotonic() - started_at
-        sleep_for = max(1.0, float(settings.auto_sync_interval_seconds) - elapsed)
+            batch_limit = base_limit
 
-        try:
-            await asyncio.wait_for(stop_event.wait(), timeout=sleep_for)
-        except TimeoutError:
-            continue
+            elapsed = time.monotonic() - started_at
+            sleep_for = max(1.0, float(settings.auto_sync_interval_seconds) - elapsed)
+
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=sleep_for)
+            except TimeoutError:
+                continue
+
+    finally:
+        if leading:
+            await release_sync_leadership()
+        _STATE["mode"] = "idle"
+
+
+async def _measure_lag(session: AsyncSession, scheme: str, url: str) -> dict[str, Any] | None:
+    """Отставание локального курсора от головы источника."""
+    if scheme.startswith("mysql"):
+        head = await run_agency_call(fetch_alarms_head, url)
+        local = await get_last_alarm_id(session)
+        return {
+            "sourceHead": head,
+            "localCursor": local,
+            "events": max(0, head - local) if head is not None else 0,
+        }
+
+    head = await run_agency_call(
+        fetch_archive_head,
+        url,
+        archives_db_name=settings.agency_archives_db_name,
+        catalog_ttl=settings.agency_archive_catalog_ttl_seconds,
+    )
+    cur_date_key, cur_event_id = await get_mssql_event_cursor(session)
+    out: dict[str, Any] = {"sourceHead": None, "localCursor": f"{cur_date_key}:{cur_event_id}", "seconds": 0}
+    if head is None:
+        return out
+    out["sourceHead"] = f"{head['dateKey']}:{head['eventId']}"
+    if (head["dateKey"], head["eventId"]) <= (cur_date_key, cur_event_id):
+        return out
+
+    # Отставание по времени: TimeEvent головы минус время последнего загруженного события.
+    local_ts = (
+        await session.execute(select(Event.timestamp).where(Event.id == f"mssql:{cur_date_key}:{cur_event_id}"))
+    ).scalar_one_or_none()
+    head_ts = head.get("timeEvent")
+    out["seconds"] = (
+        max(0, int((head_ts - local_ts).total_seconds())) if local_ts is not None and head_ts is not None else None
+    )
+    return out
 
 
 async def auto_sync_status() -> dict[str, Any]:
@@ -121,5 +264,16 @@ async def auto_sync_status() -> dict[str, Any]:
         "scheme": scheme,
         "intervalSeconds": int(settings.auto_sync_interval_seconds),
         "eventsLimit": int(settings.auto_sync_events_limit),
+        "eventsMaxLimit": int(settings.auto_sync_events_max_limit),
         "objectsIntervalSeconds": int(settings.auto_sync_objects_interval_seconds),
+        "objectsFullHour": int(settings.auto_sync_objects_full_hour),
+        "statesIntervalSeconds": int(settings.auto_sync_states_interval_seconds),
+        "mode": _STATE["mode"],
+        "batchLimit": _STATE["batchLimit"],
+        "lastFetched": _STATE["lastFetched"],
+        "lastProcessed": _STATE["lastProcessed"],
+        "lastTickAt": _STATE["lastTickAt"],
+        "lag": _STATE["lag"],
+        "lagCheckedAt": _STATE["lagCheckedAt"],
+        "leader": sync_leader_status(),
     }
@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import asyncio
+import calendar
+from contextlib import nullcontext
+from datetime import date, datetime
+from functools import partial
+from typing import Any
+
+from sqlalchemy import delete
+
+from app.core.config import settings
+from app.db.bulk_upsert import UpsertResult
+from app.db.session import SessionLocal, engine
+from app.integrations.agency_async import iterate_agency_batches, run_agency_call
+from app.integrations.agency_mssql import list_archive_months
+from app.models.sync_state import SyncState
+from app.services.job_service import update_job_progress
+from app.services.sync_leader import (
+    SYNC_BUSY,
+    SYNC_LOCK,
+    acquire_sync_leadership,
+    check_sync_leadership,
+    release_sync_leadership,
+)
+from app.services.sync_metrics import track_sync
+from app.services.sync_pipeline import pipeline_depth
+from app.services.sync_service import (
+    get_sync_value,
+    ingest_mssql_archive_stream,
+    iter_resolved_archive_events,
+    set_sync_value,
+)
+
+# Курсор backfill хранится отдельно для каждого месяца: agency_mssql.backfill.YYYYMM = "Date_Key:Event_id[:done]".
+# Живой курсор agency_mssql.archive.cursor backfill не трогает.
+SYNC_KEY_BACKFILL_PREFIX = "agency_mssql.backfill."
+_DONE_SUFFIX = ":done"
+
+# Одновременно может идти только один backfill.
+_BACKFILL_LOCK = asyncio.Lock()
+
+
+class SyncLeadershipLost(RuntimeError):
+    """Процесс потерял лидерство синка посреди backfill: писать дальше нельзя."""
+
+
+def _write_lock() -> asyncio.Lock | None:
+    """SQLite допускает одного писателя: записи backfill идут под SYNC_LOCK вперемежку с живым синком.
+
+    На Postgres транзакции backfill и живого синка идут параллельно (upsert разрешает
+    конфликты по id построчными блокировками).
+    """
+    return SYNC_LOCK if engine.dialect.name == "sqlite" else None
+
+
+def backfill_cursor_key(month: date) -> str:
+    return f"{SYNC_KEY_BACKFILL_PREFIX}{month.strftime('%Y%m')}"
+
+
+def _parse_month_state(value: str | None) -> tuple[tuple[int, int] | None, bool]:
+    if not value:
+        return None, False
+    done = value.endswith(_DONE_SUFFIX)
+    if done:
+        value = value[: -len(_DONE_SUFFIX)]
+    try:
+        parts = value.split(":", 1)
+        return (int(parts[0]), int(parts[1] if len(parts) > 1 else 0)), done
+    except Exception:
+        return None, False
+
+
+def _month_bounds(month: date, from_date_key: int, to_date_key: int) -> tuple[int, int]:
+    last_day = calendar.monthrange(month.year, month.month)[1]
+    month_start = int(month.strftime("%Y%m01"))
+    month_end = int(month.strftime("%Y%m")) * 100 + last_day
+    return max(from_date_key, month_start), min(to_date_key, month_end)
+
+
+def _months_in_range(months: list[date], from_date_key: int, to_date_key: int) -> list[date]:
+    out: list[date] = []
+    for m in months:
+        start, end = _month_bounds(m, from_date_key, to_date_key)
+        if start <= end:
+            out.append(m)
+    return out
+
+
+async def _backfill_month(
+    agency_mssql_url: str,
+    *,
+    archives_db_name: str,
+    month: date,
+    from_date_key: int,
+    to_date_key: int,
+    batch_limit: int,
+    state: dict[str, Any],
+    publish,
+) -> None:
+    key = backfill_cursor_key(month)
+    write_lock = _write_lock()
+    start_key, end_key = _month_bounds(month, from_date_key, to_date_key)
+
+    async with SessionLocal() as session:
+        cursor, done = _parse_month_state(await get_sync_value(session, key))
+        if done:
+            state["status"] = "done"
+            state["cursor"] = f"{cursor[0]}:{cursor[1]}" if cursor else None
+            return
+
+        cur_date_key, cur_event_id = cursor or (start_key, 0)
+        state["status"] = "running"
+        state["cursor"] = f"{cur_date_key}:{cur_event_id}"
+        await publish()
+
+        async def _save_cursor(date_key: int, event_id: int) -> None:
+            await set_sync_value(session, key, f"{date_key}:{event_id}")
+
+        async def _after_commit(written: UpsertResult, rows: int, date_key: int, event_id: int) -> None:
+            state["processed"] += written.written
+            state["fetched"] += rows
+            state["cursor"] = f"{date_key}:{event_id}"
+            await publish()
+
+        while True:
+            if not await check_sync_leadership():
+                raise SyncLeadershipLost("Sync leadership lost; backfill stopped")
+            with track_sync("mssql.backfill") as run:
+                _, fetched, cur_date_key, cur_event_id = await ingest_mssql_archive_stream(
+                    session,
+                    iterate_agency_batches(
+                        partial(
+                            iter_resolved_archive_events,
+                            agency_mssql_url,
+                            archives_db_name=archives_db_name,
+                            cursor_date_key=cur_date_key,
+                            cursor_event_id=cur_event_id,
+                            limit=batch_limit,
+                            until_date_key=end_key,
+                            batch_size=settings.agency_fetch_batch_size,
+                            catalog_ttl=settings.agency_archive_catalog_ttl_seconds,
+                        ),
+                        prefetch=max(1, pipeline_depth()),
+                    ),
+                    cur_date_key,
+                    cur_event_id,
+                    run,
+                    save_cursor=_save_cursor,
+                    after_commit=_after_commit,
+                    write_lock=write_lock,
+                )
+
+            if fetched < batch_limit:
+                break
+
+        async with write_lock if write_lock is not None else nullcontext():
+            await set_sync_value(session, key, f"{cur_date_key}:{cur_event_id}{_DONE_SUFFIX}")
+            await session.commit()
+        state["status"] = "done"
+
+
+async def run_archive_backfill(
+    agency_mssql_url: str,
+    *,
+    archives_db_name: str,
+    from_date_key: int,
+    to_date_key: int | None = None,
+    concurrency: int | None = None,
+    batch_limit: int | None = None,
+    restart: bool = False,
+    job_id: str | None = None,
+) -> dict[str, Any]:
+    """Загружает историю из архивов MSSQL за диапазон Date_Key, по нескольку месяцев параллельно.
+
+    Диапазон режется на месячные партиции (только месяцы, таблицы которых существуют).
+    У каждого месяца свой курсор в sync_state, поэтому прерванный backfill продолжается
+    с места остановки; restart=True сбрасывает курсоры месяцев диапазона. Прогресс
+    публикуется в job_service (если передан job_id).
+
+    Backfill пишет events и sync_state, поэтому идёт только в процессе-лидере синка
+    (лидерство берётся на весь прогон; если синк ведёт другой процесс — SYNC_BUSY).
+    На SQLite месяцы грузятся по одному, а каждая пачка пишется под SYNC_LOCK.
+    """
+    if to_date_key is None:
+        to_date_key = int(datetime.now().strftime("%Y%m%d"))
+    if from_date_key > to_date_key:
+        raise ValueError("from_date_key must be <= to_date_key")
+
+    # Оставляем хотя бы один поток пула агентской БД живому опросу.
+    max_concurrency = max(1, int(settings.agency_pool_workers) - 1)
+    concurrency = max(1, min(int(concurrency or settings.agency_backfill_concurrency), max_concurrency))
+    if engine.dialect.name == "sqlite":
+        # Параллельные месяцы всё равно встали бы в очередь за единственным писателем.
+        concurrency = 1
+    batch_limit = max(1, int(batch_limit or settings.agency_backfill_batch_limit))
+
+    if _BACKFILL_LOCK.locked():
+        return {"status": "busy", "reason": "Another backfill is running"}
+
+    async with _BACKFILL_LOCK:
+        if not await acquire_sync_leadership("backfill"):
+            return dict(SYNC_BUSY)
+        try:
+            return await _run_backfill(
+                agency_mssql_url,
+                archives_db_name=archives_db_name,
+                from_date_key=from_date_key,
+                to_date_key=to_date_key,
+                concurrency=concurrency,
+                batch_limit=batch_limit,
+                restart=restart,
+                job_id=job_id,
+            )
+        finally:
+            await release_sync_leadership()
+
+
+async def _run_backfill(
+    agency_mssql_url: str,
+    *,
+    archives_db_name: str,
+    from_date_key: int,
+    to_date_key: int,
+    concurrency: int,
+    batch_limit: int,
+    restart: bool,
+    job_id: str | None,
+) -> dict[str, Any]:
+    available = await run_agency_call(
+        list_archive_months,
+        agency_mssql_url,
+        archives_db_name=archives_db_name,
+        ttl=settings.agency_archive_catalog_ttl_seconds,
+    )
+    months = _months_in_range(available, from_date_key, to_date_key)
+
+    if restart and months:
+        write_lock = _write_lock()
+        async with SessionLocal() as session, write_lock if write_lock is not None else nullcontext():
+            await session.execute(
+                delete(SyncState).where(SyncState.key.in_([backfill_cursor_key(m) for m in months]))
+            )
+            await session.commit()
+
+    per_month: dict[str, dict[str, Any]] = {
+        m.strftime("%Y%m"): {"status": "queued", "cursor": None, "fetched": 0, "processed": 0} for m in months
+    }
+    progress: dict[str, Any] = {
+        "range": f"{from_date_key}..{to_date_key}",
+        "concurrency": concurrency,
+        "monthsTotal": len(months),
+        "monthsDone": 0,
+        "processed": 0,
+        "months": per_month,
+    }
+
+    async def _publish() -> None:
+        progress["monthsDone"] = sum(1 for st in per_month.values() if st["status"] == "done")
+        progress["processed"] = sum(int(st["processed"]) for st in per_month.values())
+        if job_id is not None:
+            await update_job_progress(
+                job_id,
+                {**progress, "months": {k: dict(v) for k, v in per_month.items()}},
+            )
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _run(m: date) -> None:
+        state = per_month[m.strftime("%Y%m")]
+        async with sem:
+            try:
+                await _backfill_month(
+                    agency_mssql_url,
+                    archives_db_name=archives_db_name,
+                    month=m,
+                    from_date_key=from_date_key,
+                    to_date_key=to_date_key,
+                    batch_limit=batch_limit,
+                    state=state,
+                    publish=_publish,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                state["status"] = "error"
+                state["error"] = str(e)
+            await _publish()
+
+    await _publish()
+    await asyncio.gather(*(_run(m) for m in months))
+
+    failed = [k for k, st in per_month.items() if st["status"] == "error"]
+    return {"status": "partial" if failed else "ok", **progress, "failedMonths": failed}
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import csv
+from collections.abc import AsyncIterator, Callable, Sequence
+from typing import Any
+
+from sqlalchemy import Select
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+
+
+class _Line:
+    """«Файл» для csv.writer: writerow возвращает готовую строку CSV вместо записи в буфер."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+async def stream_csv(
+    stmt: Select[Any],
+    header: Sequence[Any],
+    to_row: Callable[[Any], Sequence[Any]],
+    *,
+    bom: bool = False,
+) -> AsyncIterator[bytes]:
+    """Отдаёт CSV (разделитель ';') по частям, читая строки stmt серверным курсором.
+
+    В памяти одновременно только csv_export_batch_size строк, поэтому расход памяти
+    не зависит от размера выгрузки, а заголовок уходит клиенту сразу. Сессия своя:
+    сессия запроса (get_session) закрывается до того, как StreamingResponse начнёт отдачу.
+    bom — UTF-8 с BOM для Excel.
+    """
+    writer = csv.writer(_Line(), delimiter=";")
+    yield (("\ufeff" if bom else "") + writer.writerow(header)).encode("utf-8")
+
+    async with SessionLocal() as session:
+        result = await session.stream(stmt.execution_options(yield_per=max(1, int(settings.csv_export_batch_size))))
+        async for part in result.partitions():
+            yield "".join(writer.writerow(to_row(r)) for r in part).encode("utf-8")
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Hashable
+
+from sqlalchemy import ColumnElement, Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.core.config import settings
+from app.db.dialect import session_dialect_name
+from app.models.event import Event
+from app.models.sync_state import SyncState
+
+# Режимы подсчёта total для лент событий (параметр count):
+#   exact    — точный COUNT(*), кэшируется по набору фильтров до следующей записи синка;
+#   estimate — оценка планировщика Postgres (EXPLAIN), на SQLite — как exact;
+#   none     — без подсчёта, только признак hasMore.
+COUNT_MODES = ("exact", "estimate", "none")
+COUNT_MODE_PATTERN = f"^({'|'.join(COUNT_MODES)})$"
+
+# (SQL, параметры) -> (версия данных, время записи, total). LRU ограниченного размера.
+_CACHE: OrderedDict[Hashable, tuple[Any, float, int]] = OrderedDict()
+_LOCK = threading.Lock()
+
+
+async def _data_version(session: AsyncSession) -> datetime | None:
+    """Водяной знак синка: любой коммит синка/backfill двигает курсор в sync_state.
+
+    Таблица крошечная, поэтому запрос дешевле любого COUNT по events и виден
+    из всех процессов (API, Celery), в отличие от счётчика в памяти.
+    """
+    return (await session.execute(select(func.max(SyncState.updated_at)))).scalar_one_or_none()
+
+
+def _cache_key(session: AsyncSession, stmt: Any) -> Hashable:
+    compiled = stmt.compile(dialect=session.get_bind().dialect)
+    return str(compiled), tuple(sorted((k, repr(v)) for k, v in compiled.params.items()))
+
+
+async def _exact_count(session: AsyncSession, where: ColumnElement[bool] | None) -> int:
+    stmt = select(func.count()).select_from(Event)
+    if where is not None:
+        stmt = stmt.where(where)
+
+    key = _cache_key(session, stmt)
+    version = await _data_version(session)
+    now = time.monotonic()
+    ttl = float(settings.event_count_cache_ttl_seconds)
+    with _LOCK:
+        cached = _CACHE.get(key)
+        if cached is not None and cached[0] == version and now - cached[1] < ttl:
+            _CACHE.move_to_end(key)
+            return cached[2]
+
+    total = int((await session.execute(stmt)).scalar_one())
+    with _LOCK:
+        _CACHE[key] = (version, now, total)
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > max(1, int(settings.event_count_cache_size)):
+            _CACHE.popitem(last=False)
+    return total
+
+
+class _ExplainJson(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) над select как обычное выражение SQLAlchemy.
+
+    Запрос компилируется тем же компилятором, что и при выполнении, поэтому параметры
+    (в том числе раскрываемые IN — POSTCOMPILE) привязываются драйвером как обычно.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, stmt: Select[Any]) -> None:
+        self.stmt = stmt
+
+
+@compiles(_ExplainJson)
+def _compile_explain_json(element: _ExplainJson, compiler: Any, **kw: Any) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.stmt, **kw)
+
+
+async def _estimated_count(session: AsyncSession, where: ColumnElement[bool] | None) -> int:
+    """Оценка числа строк из плана Postgres (EXPLAIN без выполнения запроса)."""
+    stmt = select(Event.id)
+    if where is not None:
+        stmt = stmt.where(where)
+    plan = (await session.execute(_ExplainJson(stmt))).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def invalidate_event_counts() -> None:
+    """Сбрасывает кэш точных total (записи событий в обход синка: демо-сидинг и т.п.)."""
+    with _LOCK:
+        _CACHE.clear()
+
+
+async def count_events(
+    session: AsyncSession,
+    where: ColumnElement[bool] | None,
+    mode: str = "exact",
+) -> tuple[int | None, str]:
+    """(total, фактический режим) для ленты событий с фильтром where.
+
+    Для "none" total не считается (None). "estimate" вне Postgres считается как "exact".
+    """
+    if mode == "none":
+        return None, "none"
+    if mode == "estimate" and session_dialect_name(session) == "postgresql":
+        return await _estimated_count(session, where), "estimate"
+    return await _exact_count(session, where), "exact"
+
+
+def page_meta(total: int | None, mode: str, page: int, page_size: int, has_more: bool) -> dict[str, Any]:
+    """Поля пагинации ответа: total/totalPages (если считались), режим подсчёта и hasMore."""
+    total_pages = (total + page_size - 1) // page_size if total is not None and page_size else None
+    return {
+        "total": total,
+        "page": page,
+        "pageSize": page_size,
+        "totalPages": total_pages,
+        "countMode": mode,
+        "hasMore": has_more,
+    }
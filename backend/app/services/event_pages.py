@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Sequence
+
+from sqlalchemy import ColumnElement, Select, and_, or_
+
+from app.models.event import Event
+
+# Порядок лент событий: новые сверху, при равном времени — по id (стабильно между страницами).
+# Ему соответствуют составные индексы (timestamp, id) и (object_id, timestamp, id).
+EVENT_FEED_ORDER = (Event.timestamp.desc(), Event.id.desc())
+
+
+def encode_event_cursor(e: Any) -> str:
+    """Непрозрачный курсор на позицию после события e: base64url("<timestamp>|<id>")."""
+    raw = f"{e.timestamp.isoformat()}|{e.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_event_cursor(cursor: str) -> tuple[datetime, str]:
+    """(timestamp, id) из курсора; ValueError, если курсор испорчен."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        ts, event_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), event_id
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def events_after_cursor(cursor: str) -> ColumnElement[bool]:
+    """Условие «старше позиции курсора» в порядке EVENT_FEED_ORDER.
+
+    Ведущее timestamp <= ts даёт диапазонный проход по индексу (timestamp, id) в обоих
+    диалектах; стоимость страницы не зависит от её глубины, в отличие от OFFSET.
+    """
+    ts, event_id = decode_event_cursor(cursor)
+    return and_(Event.timestamp <= ts, or_(Event.timestamp < ts, Event.id < event_id))
+
+
+def keyset_page(stmt: Select[Any], cursor: str | None, page_size: int) -> Select[Any]:
+    """Страница ленты после cursor (None — первая): лишняя строка показывает, есть ли продолжение."""
+    if cursor:
+        stmt = stmt.where(events_after_cursor(cursor))
+    return stmt.order_by(*EVENT_FEED_ORDER).limit(page_size + 1)
+
+
+def split_keyset_page(rows: Sequence[Any], page_size: int) -> tuple[Sequence[Any], str | None]:
+    """(строки страницы, nextCursor) из результата keyset_page."""
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_event_cursor(rows[-1])
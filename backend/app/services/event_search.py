@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import logging
+import re
+import time
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import ColumnElement, Select, func, literal_column, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from app.db.dialect import session_dialect_name
+from app.models.event import Event
+from app.services.event_text import event_text_match
+
+logger = logging.getLogger(__name__)
+
+# Колонки события, которые попадают в полнотекстовый индекс (детали + объект/клиент/адрес).
+# У событий MSSQL description пуст: номер панели, код, зона и шлейф есть только в своих колонках.
+# После изменения списка: SQLite пересоздаёт триггеры и индекс при старте, на Postgres
+# нужно повторить scripts/migrate_event_search.py.
+EVENT_SEARCH_COLUMNS = (
+    "description",
+    "result_text",
+    "code_text",
+    "state_name",
+    "person",
+    "gbr",
+    "object_name",
+    "client_name",
+    "location",
+    "object_id",
+    "code",
+    "zone",
+    "line",
+)
+
+# Postgres: колонка tsvector (русская морфология) + GIN-индекс. Колонка не отображается
+# в модели Event: её заполняет BEFORE-триггер при каждой вставке/обновлении, в том числе
+# через COPY + INSERT ... SELECT в bulk_upsert. Создаются они не при старте приложения, а
+# разовой миграцией (scripts/migrate_event_search.py, см. migrate_pg_event_search): на большой
+# таблице это долго, а старт API/воркеров не должен держать блокировку events.
+PG_SEARCH_COLUMN = "search_tsv"
+PG_SEARCH_CONFIG = "russian"
+PG_SEARCH_INDEX = f"ix_events_{PG_SEARCH_COLUMN}"
+PG_SEARCH_FUNCTION = "events_search_tsv_refresh"
+PG_SEARCH_TRIGGER = "events_search_tsv_trg"
+
+# Пока миграция не завершена (нет валидного GIN-индекса), поиск на Postgres идёт прежним
+# ILIKE; готовность перепроверяется не чаще, чем раз в столько секунд.
+_PG_READY_RECHECK_SECONDS = 60.0
+_PG_READY: dict[str, Any] = {"ready": False, "checked_at": None}
+
+# SQLite: FTS5-таблица с rowid = events.rowid, поддерживается триггерами на events; при
+# старте сверяется с events и перестраивается, если rowid разошлись (см.
+# _sqlite_search_index_consistent). Стемминга нет (unicode61), поэтому слова запроса ищутся
+# как префиксы.
+SQLITE_SEARCH_TABLE = "events_fts"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _search_body_sql(prefix: str = "") -> str:
+    # CAST — для числовых колонок (zone): в Postgres text || integer без приведения не работает.
+    return " || ' ' || ".join(f"coalesce(CAST({prefix}{c} AS TEXT), '')" for c in EVENT_SEARCH_COLUMNS)
+
+
+def _pg_tsvector_sql(prefix: str = "") -> str:
+    # Знаки препинания — в пробелы, как при разборе запроса (search_tokens): иначе парсер
+    # Postgres читает "P-0042" как "p" и число "-0042", и запрос "p:* & 0042:*" не находит панель.
+    body = f"regexp_replace({_search_body_sql(prefix)}, '[^[:alnum:]]+', ' ', 'g')"
+    return f"to_tsvector('{PG_SEARCH_CONFIG}', {body})"
+
+
+async def _pg_search_index_valid(conn: Any) -> bool | None:
+    """True — GIN-индекс построен и валиден, False — индекс есть, но невалиден
+    (прерванный CREATE INDEX CONCURRENTLY), None — индекса нет."""
+    row = (
+        await conn.execute(
+            text(
+                "SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name"
+            ),
+            {"name": PG_SEARCH_INDEX},
+        )
+    ).first()
+    return None if row is None else bool(row[0])
+
+
+async def migrate_pg_event_search(
+    engine: AsyncEngine,
+    *,
+    batch_size: int = 10000,
+    missing_only: bool = False,
+    log: Callable[[str], None] = print,
+) -> dict[str, Any]:
+    """Разовая миграция полнотекстового поиска событий на Postgres (идемпотентна).
+
+    1. ADD COLUMN search_tsv tsvector без DEFAULT — только метаданные, таблица не переписывается.
+       Колонка прежней версии (GENERATED ... STORED) удаляется — это тоже только метаданные.
+    2. Функция + BEFORE INSERT/UPDATE OF <колонки поиска> триггер: новые и изменённые
+       строки получают tsvector сразу.
+    3. Заполнение старых строк пачками по id, каждая пачка — своя короткая транзакция
+       (блокируются только строки пачки). missing_only — только строки без tsvector.
+    4. CREATE INDEX CONCURRENTLY (без блокировки записи); невалидный остаток прерванной
+       попытки удаляется и строится заново.
+    """
+    watched = ", ".join(EVENT_SEARCH_COLUMNS)
+    async with engine.begin() as conn:
+        generated = (
+            await conn.execute(
+                text(
+                    "SELECT is_generated FROM information_schema.columns "
+                    "WHERE table_name = 'events' AND column_name = :col"
+                ),
+                {"col": PG_SEARCH_COLUMN},
+            )
+        ).scalar_one_or_none()
+        if generated == "ALWAYS":
+            log(f"dropping legacy generated column events.{PG_SEARCH_COLUMN}")
+            await conn.execute(text(f"ALTER TABLE events DROP COLUMN {PG_SEARCH_COLUMN}"))
+        await conn.execute(text(f"ALTER TABLE events ADD COLUMN IF NOT EXISTS {PG_SEARCH_COLUMN} tsvector"))
+        await conn.execute(
+            text(
+                f"""
+                CREATE OR REPLACE FUNCTION {PG_SEARCH_FUNCTION}() RETURNS trigger AS $$
+                BEGIN
+                  NEW.{PG_SEARCH_COLUMN} := {_pg_tsvector_sql("NEW.")};
+                  RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql
+                """
+            )
+        )
+        await conn.execute(text(f"DROP TRIGGER IF EXISTS {PG_SEARCH_TRIGGER} ON events"))
+        await conn.execute(
+            text(
+                f"CREATE TRIGGER {PG_SEARCH_TRIGGER} BEFORE INSERT OR UPDATE OF {watched} ON events "
+                f"FOR EACH ROW EXECUTE FUNCTION {PG_SEARCH_FUNCTION}()"
+            )
+        )
+    log("column and trigger are in place")
+
+    missing = f"AND {PG_SEARCH_COLUMN} IS NULL " if missing_only else ""
+    # Граница пачки (max id) считается в SQL — в той же сортировке, что и ORDER BY id.
+    backfill = text(
+        f"""
+        WITH batch AS (
+          SELECT id FROM events WHERE id > :after {missing}ORDER BY id LIMIT :limit
+        ), updated AS (
+          UPDATE events AS e SET {PG_SEARCH_COLUMN} = {_pg_tsvector_sql("e.")}
+          FROM batch WHERE e.id = batch.id
+          RETURNING e.id
+        )
+        SELECT (SELECT count(*) FROM updated), (SELECT max(id) FROM batch)
+        """
+    )
+    after = ""
+    updated = 0
+    while True:
+        async with engine.begin() as conn:
+            count, last_id = (await conn.execute(backfill, {"after": after, "limit": int(batch_size)})).one()
+        if last_id is None:
+            break
+        updated += int(count)
+        after = last_id
+        log(f"backfilled {updated} rows (up to id {after})")
+
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with autocommit.connect() as conn:
+        valid = await _pg_search_index_valid(conn)
+        if valid is False:
+            log(f"dropping invalid index {PG_SEARCH_INDEX}")
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {PG_SEARCH_INDEX}"))
+        if not valid:
+            log(f"building {PG_SEARCH_INDEX} concurrently")
+            await conn.execute(
+                text(f"CREATE INDEX CONCURRENTLY {PG_SEARCH_INDEX} ON events USING GIN ({PG_SEARCH_COLUMN})")
+            )
+    _PG_READY.update(ready=True, checked_at=time.monotonic())
+    log("done")
+    return {"status": "ok", "backfilled": updated}
+
+
+async def _pg_search_ready(session: AsyncSession) -> bool:
+    if _PG_READY["ready"]:
+        return True
+    checked_at = _PG_READY["checked_at"]
+    if checked_at is not None and time.monotonic() - checked_at < _PG_READY_RECHECK_SECONDS:
+        return False
+    ready = bool(await _pg_search_index_valid(session))
+    _PG_READY.update(ready=ready, checked_at=time.monotonic())
+    return ready
+
+
+async def ensure_event_search_index(conn: AsyncConnection, dialect_name: str) -> None:
+    """Создаёт полнотекстовый индекс событий SQLite (идемпотентно) и заполняет его для старых строк.
+
+    На Postgres ничего не меняет: только напоминает о разовой миграции, если её ещё не было.
+    """
+    if dialect_name == "postgresql":
+        if not await _pg_search_index_valid(conn):
+            logger.info(
+                "Event full-text index is not built; search uses ILIKE until "
+                "`python scripts/migrate_event_search.py` is run"
+            )
+        return
+
+    if dialect_name != "sqlite":
+        return
+
+    exists = (
+        await conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": SQLITE_SEARCH_TABLE}
+        )
+    ).first()
+    await conn.execute(
+        text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_SEARCH_TABLE} "
+            "USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    )
+    # Триггер пересоздаётся, если его текст устарел (сменился состав колонок); тогда
+    # индекс строится заново — в старых строках тела без новых колонок.
+    triggers_changed = False
+    for name, statement in _sqlite_triggers():
+        stored = (
+            await conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = :name"), {"name": name}
+            )
+        ).scalar_one_or_none()
+        if stored is not None and stored.strip() == statement:
+            continue
+        await conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        await conn.execute(text(statement))
+        triggers_changed = triggers_changed or stored is not None
+    if not exists or triggers_changed:
+        await rebuild_sqlite_search_index(conn)
+    elif not await _sqlite_search_index_consistent(conn):
+        logger.warning("%s is out of sync with events (rowids changed?); rebuilding", SQLITE_SEARCH_TABLE)
+        await rebuild_sqlite_search_index(conn)
+
+
+# Сколько строк events сверяется с FTS при старте (равномерно по диапазону rowid).
+_SQLITE_CONSISTENCY_SAMPLES = 16
+
+
+async def _sqlite_search_index_consistent(conn: AsyncConnection) -> bool:
+    """Быстрая сверка FTS5 с events при старте: число строк и тела выборки строк по rowid.
+
+    FTS связан с events через rowid, а у events ключ строковый: rowid может смениться
+    (VACUUM, выгрузка/загрузка таблицы, ручной ремонт базы) — тогда совпадения
+    указывают на чужие строки. Сверка ловит и расхождение числа строк, и сдвиг rowid.
+    """
+    t = SQLITE_SEARCH_TABLE
+    events_count, lo, hi = (await conn.execute(text("SELECT count(*), min(rowid), max(rowid) FROM events"))).one()
+    fts_count = (await conn.execute(text(f"SELECT count(*) FROM {t}"))).scalar_one()
+    if events_count != fts_count:
+        return False
+    if not events_count:
+        return True
+    sample = text(
+        f"SELECT e.rowid, {_search_body_sql('e.')} AS expected, f.body FROM events AS e "
+        f"LEFT JOIN {t} AS f ON f.rowid = e.rowid WHERE e.rowid >= :r ORDER BY e.rowid LIMIT 1"
+    )
+    step = max(1, (hi - lo) // (_SQLITE_CONSISTENCY_SAMPLES - 1))
+    for r in range(lo, hi + 1, step):
+        row = (await conn.execute(sample, {"r": r})).first()
+        if row is not None and row.expected != row.body:
+            return False
+    return True
+
+
+def _sqlite_triggers() -> list[tuple[str, str]]:
+    """(имя, CREATE TRIGGER) — в том виде, в каком SQLite хранит текст в sqlite_master."""
+    watched = ", ".join(EVENT_SEARCH_COLUMNS)
+    body = _search_body_sql("new.")
+    t = SQLITE_SEARCH_TABLE
+    return [
+        (
+            f"{t}_ai",
+            f"CREATE TRIGGER {t}_ai AFTER INSERT ON events BEGIN\n"
+            f"  INSERT INTO {t}(rowid, body) VALUES (new.rowid, {body});\n"
+            "END",
+        ),
+        (
+            f"{t}_ad",
+            f"CREATE TRIGGER {t}_ad AFTER DELETE ON events BEGIN\n"
+            f"  DELETE FROM {t} WHERE rowid = old.rowid;\n"
+            "END",
+        ),
+        (
+            f"{t}_au",
+            f"CREATE TRIGGER {t}_au AFTER UPDATE OF {watched} ON events BEGIN\n"
+            f"  DELETE FROM {t} WHERE rowid = old.rowid;\n"
+            f"  INSERT INTO {t}(rowid, body) VALUES (new.rowid, {body});\n"
+            "END",
+        ),
+    ]
+
+
+async def rebuild_sqlite_search_index(conn: AsyncConnection) -> None:
+    """Перестраивает FTS5-таблицу по events (первое создание, смена триггеров, расхождение с events)."""
+    await conn.execute(text(f"DELETE FROM {SQLITE_SEARCH_TABLE}"))
+    await conn.execute(
+        text(f"INSERT INTO {SQLITE_SEARCH_TABLE}(rowid, body) SELECT rowid, {_search_body_sql()} FROM events")
+    )
+
+
+def search_tokens(q: str) -> list[str]:
+    return [t.lower() for t in _TOKEN_RE.findall(q or "")]
+
+
+def _pg_query(tokens: list[str]) -> ColumnElement[Any]:
+    # Каждое слово — префикс со стеммингом ("трев" найдёт «тревога», «тревоги»), все слова обязательны.
+    return func.to_tsquery(literal_column(f"'{PG_SEARCH_CONFIG}'"), " & ".join(f"{t}:*" for t in tokens))
+
+
+def _fts5_query(tokens: list[str]) -> str:
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def _ilike_condition(q: str) -> ColumnElement[bool]:
+    needle = f"%{q.strip()}%"
+    return or_(
+        event_text_match(needle),
+        Event.object_name.ilike(needle),
+        Event.client_name.ilike(needle),
+        Event.location.ilike(needle),
+    )
+
+
+async def event_search_condition(session: AsyncSession, q: str) -> ColumnElement[bool]:
+    """Условие поиска событий по тексту q через полнотекстовый индекс.
+
+    Postgres — search_tsv @@ to_tsquery('russian', ...), SQLite — FTS5 MATCH. Для других
+    диалектов, запросов без слов (только знаки) и Postgres до миграции — прежний ILIKE по подстроке.
+    """
+    tokens = search_tokens(q)
+    dialect_name = session_dialect_name(session)
+    if tokens and dialect_name == "postgresql" and await _pg_search_ready(session):
+        return literal_column(f"events.{PG_SEARCH_COLUMN}").op("@@")(_pg_query(tokens))
+    if tokens and dialect_name == "sqlite":
+        matches = select(literal_column("rowid")).select_from(text(SQLITE_SEARCH_TABLE)).where(
+            literal_column(SQLITE_SEARCH_TABLE).op("MATCH")(_fts5_query(tokens))
+        )
+        return literal_column("events.rowid").in_(matches)
+    return _ilike_condition(q)
+
+
+async def order_by_relevance(session: AsyncSession, stmt: Select[Any], q: str) -> Select[Any]:
+    """Отбирает события по q и сортирует: сначала релевантные, затем свежие.
+
+    Postgres — ts_rank по search_tsv. SQLite — bm25() из FTS5: совпадения берутся
+    одним проходом по индексу и соединяются с events по rowid (коррелированный
+    подзапрос с MATCH на каждую строку events слишком дорог). Без индекса — ILIKE
+    и порядок ленты.
+    """
+    tokens = search_tokens(q)
+    dialect_name = session_dialect_name(session)
+    if tokens and dialect_name == "postgresql" and await _pg_search_ready(session):
+        tsv = literal_column(f"events.{PG_SEARCH_COLUMN}")
+        query = _pg_query(tokens)
+        stmt = stmt.where(tsv.op("@@")(query)).order_by(func.ts_rank(tsv, query).desc())
+    elif tokens and dialect_name == "sqlite":
+        fts = literal_column(SQLITE_SEARCH_TABLE)
+        matches = (
+            select(
+                literal_column("rowid").label("event_rowid"),
+                func.bm25(fts).label("rank"),
+            )
+            .select_from(text(SQLITE_SEARCH_TABLE))
+            .where(fts.op("MATCH")(_fts5_query(tokens)))
+            .subquery("fts_matches")
+        )
+        # bm25() меньше — лучше.
+        stmt = stmt.join(matches, matches.c.event_rowid == literal_column("events.rowid")).order_by(
+            matches.c.rank.asc()
+        )
+    else:
+        stmt = stmt.where(_ilike_condition(q))
+    return stmt.order_by(Event.timestamp.desc(), Event.id.desc())
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from typing import Any
+
+from sqlalchemy import ColumnElement, String, cast, or_
+
+from app.models.event import Event
+
+# Колонки деталей события, по которым ищут фразы (поиск, отчёты). У событий MSSQL
+# description пуст, а номер панели, код, зона и шлейф лежат в своих колонках
+# (render_description собирает из них текст только при выдаче) — ищем и по ним.
+EVENT_DETAIL_TEXT_COLUMNS = (
+    Event.description,
+    Event.result_text,
+    Event.code_text,
+    Event.state_name,
+    Event.person,
+    Event.gbr,
+    Event.object_id,
+    Event.code,
+    cast(Event.zone, String),
+    Event.line,
+)
+
+
+# Колонки, из которых render_description собирает текст: выгрузки выбирают только их,
+# без загрузки ORM-объектов Event целиком.
+EVENT_DESCRIPTION_COLUMNS = (
+    Event.id,
+    Event.object_id,
+    Event.description,
+    Event.code,
+    Event.code_text,
+    Event.zone,
+    Event.line,
+    Event.state_event,
+    Event.state_name,
+    Event.person,
+    Event.gbr,
+    Event.result_text,
+)
+
+
+def event_text_match(pattern: str) -> ColumnElement[bool]:
+    """ILIKE-условие по описанию и структурированным деталям события."""
+    return or_(*(col.ilike(pattern) for col in EVENT_DETAIL_TEXT_COLUMNS))
+
+
+def _mssql_source_ids(event_id: str | None) -> tuple[str, str] | None:
+    # id событий архива MSSQL: "mssql:{Date_Key}:{Event_id}"
+    if not event_id or not event_id.startswith("mssql:"):
+        return None
+    parts = event_id.split(":")
+    if len(parts) != 3:
+        return None
+    return parts[1], parts[2]
+
+
+def render_description(e: Any) -> str:
+    """Текст события для UI/экспорта.
+
+    Если description сохранён (MySQL, демо, события MSSQL до появления структурированных
+    колонок) — возвращается он. Иначе текст собирается из колонок в прежнем формате.
+    """
+    stored = getattr(e, "description", None)
+    if stored:
+        return stored
+
+    parts: list[str] = []
+    source = _mssql_source_ids(getattr(e, "id", None))
+    if source is not None:
+        date_key, event_id = source
+        parts.append(f"Event_id: {event_id}")
+        parts.append(f"Date_Key: {date_key}")
+        if getattr(e, "object_id", None):
+            parts.append(f"Panel_id: {e.object_id}")
+
+    code = getattr(e, "code", None)
+    code_text = getattr(e, "code_text", None)
+    if code:
+        parts.append(f"Код: {code} — {code_text}" if code_text else f"Код: {code}")
+
+    zone = getattr(e, "zone", None)
+    if zone is not None:
+        parts.append(f"Зона: {zone}")
+    line = getattr(e, "line", None)
+    if line:
+        parts.append(f"Шлейф: {line}")
+
+    state_event = getattr(e, "state_event", None)
+    state_name = getattr(e, "state_name", None)
+    if state_event is not None and state_name:
+        parts.append(f"Статус: {state_name} (StateEvent={state_event})")
+    elif state_name:
+        parts.append(f"Статус: {state_name}")
+    elif state_event is not None:
+        parts.append(f"StateEvent: {state_event}")
+
+    person = getattr(e, "person", None)
+    if person:
+        parts.append(f"Оператор: {person}")
+    gbr = getattr(e, "gbr", None)
+    if gbr:
+        parts.append(f"ГБР: {gbr}")
+    result_text = getattr(e, "result_text", None)
+    if result_text:
+        parts.append(result_text)
+
+    return "\n".join(parts)
+
+
+def event_to_out(e: Any) -> dict[str, Any]:
+    """Событие в формате API: лента /events, события объекта, карточка события."""
+    return {
+        "id": e.id,
+        "timestamp": e.timestamp.isoformat(),
+        "type": e.type,
+        "objectId": e.object_id,
+        "objectName": e.object_name,
+        "clientName": e.client_name,
+        "severity": e.severity,
+        "status": e.status,
+        "code": getattr(e, "code", None),
+        "codeText": getattr(e, "code_text", None),
+        "stateName": getattr(e, "state_name", None),
+        "zone": e.zone,
+        "line": e.line,
+        "groupNo": e.group_no,
+        "person": e.person,
+        "gbr": e.gbr,
+        "resultText": e.result_text,
+        "description": render_description(e),
+        "location": e.location,
+        "operatorId": e.operator_id,
+    }
@@ -15,6 +15,7 @@ class JobInfo(TypedDict, total=False):
     finishedAt: float
     result: Any
     error: str
+    progress: Any
 
 
 _JOBS: dict[str, JobInfo] = {}
@@ -51,6 +52,10 @@ async def _set_job(job_id: str, **patch: Any) -> None:
         _JOBS[job_id].update(patch)
 
 
+async def update_job_progress(job_id: str, progress: Any) -> None:
+    await _set_job(job_id, progress=progress)
+
+
 def start_job(
     job: JobInfo,
     coro_factory: Callable[[], Awaitable[Any]],
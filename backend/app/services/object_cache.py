@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Iterable, NamedTuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.object import Object
+from app.models.sync_state import SyncState
+
+# Ключи sync_state, которые переписывает синк объектов (см. sync_service): их max(updated_at) —
+# версия справочника объектов, общая для всех процессов (API, Celery).
+OBJECTS_SYNC_KEY_PREFIX = "agency_mssql.objects."
+
+
+class ObjectInfo(NamedTuple):
+    """Поля объекта, которыми обогащаются события при загрузке."""
+
+    name: str | None
+    address: str | None
+    client_name: str | None
+
+
+# panel_id -> ObjectInfo (объект есть локально) или время, до которого помним, что его нет.
+# LRU ограниченного размера; обновляется синком объектов на месте, а целиком сбрасывается,
+# когда версия справочника (objects_data_version) меняется — в том числе синком другого процесса.
+_CACHE: OrderedDict[str, ObjectInfo | float] = OrderedDict()
+_LOCK = threading.Lock()
+_STATE: dict[str, Any] = {"version": None}
+
+
+async def objects_data_version(session: AsyncSession) -> datetime | None:
+    """Время последней записи синка объектов (в любом процессе); None — синка ещё не было."""
+    return (
+        await session.execute(
+            select(func.max(SyncState.updated_at)).where(SyncState.key.like(f"{OBJECTS_SYNC_KEY_PREFIX}%"))
+        )
+    ).scalar_one_or_none()
+
+
+def _put(panel_id: str, value: ObjectInfo | float) -> None:
+    _CACHE[panel_id] = value
+    _CACHE.move_to_end(panel_id)
+    limit = max(1, int(settings.object_cache_size))
+    while len(_CACHE) > limit:
+        _CACHE.popitem(last=False)
+
+
+def remember_objects(rows: Iterable[dict[str, Any]]) -> None:
+    """Кладёт в кэш свежие карточки объектов (строки с id/name/address/client_name)."""
+    with _LOCK:
+        for r in rows:
+            panel_id = r.get("id")
+            if panel_id:
+                _put(panel_id, ObjectInfo(r.get("name"), r.get("address"), r.get("client_name")))
+
+
+def invalidate_object_cache(panel_ids: Iterable[str] | None = None) -> None:
+    """Сбрасывает кэш целиком или для указанных panel_id."""
+    with _LOCK:
+        if panel_ids is None:
+            _CACHE.clear()
+            _STATE["version"] = None
+            return
+        for panel_id in panel_ids:
+            _CACHE.pop(panel_id, None)
+
+
+async def get_object_infos(session: AsyncSession, panel_ids: Iterable[str]) -> dict[str, ObjectInfo]:
+    """Возвращает ObjectInfo для известных локально panel_id.
+
+    Промахи дочитываются одним запросом только нужных колонок (без ORM-объектов и
+    selectin-загрузки групп/ответственных). Отсутствующие объекты помнятся
+    object_cache_miss_ttl_seconds, чтобы не спрашивать о них в каждой пачке. Кэш
+    сбрасывается, если с прошлого вызова синк объектов (в любом процессе) записал новую версию.
+    """
+    version = await objects_data_version(session)
+    now = time.monotonic()
+    found: dict[str, ObjectInfo] = {}
+    missing: list[str] = []
+    with _LOCK:
+        if _STATE["version"] != version:
+            _CACHE.clear()
+            _STATE["version"] = version
+        for panel_id in set(panel_ids):
+            value = _CACHE.get(panel_id)
+            if isinstance(value, ObjectInfo):
+                _CACHE.move_to_end(panel_id)
+                found[panel_id] = value
+            elif value is None or value <= now:
+                missing.append(panel_id)
+
+    if not missing:
+        return found
+
+    rows = (
+        await session.execute(
+            select(Object.id, Object.name, Object.address, Object.client_name).where(Object.id.in_(missing))
+        )
+    ).all()
+    loaded = {r[0]: ObjectInfo(r[1], r[2], r[3]) for r in rows}
+    found.update(loaded)
+
+    miss_until = now + float(settings.object_cache_miss_ttl_seconds)
+    with _LOCK:
+        for panel_id in missing:
+            info = loaded.get(panel_id)
+            # Синк объектов мог положить карточку, пока шёл запрос: её не затираем.
+            if info is None and isinstance(_CACHE.get(panel_id), ObjectInfo):
+                continue
+            _put(panel_id, info if info is not None else miss_until)
+    return found
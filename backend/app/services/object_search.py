@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Any, NamedTuple
+
+from sqlalchemy import ColumnElement, Select, func, not_, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core.config import settings
+from app.db.dialect import session_dialect_name
+from app.models.object import Object
+from app.services.object_cache import objects_data_version
+
+logger = logging.getLogger(__name__)
+
+# Поля объекта, по которым ищется подстрока (номер панели, название, адрес, клиент).
+OBJECT_SEARCH_COLUMNS = ("id", "name", "address", "client_name")
+
+# Postgres: доступно ли расширение pg_trgm (None — ещё не проверяли в этом процессе).
+_PG_TRGM: bool | None = None
+
+
+class _ObjectIndex(NamedTuple):
+    """Триграммный индекс объектов в памяти процесса (SQLite и прочие диалекты, кроме Postgres)."""
+
+    version: datetime | None
+    built_at: float
+    ids: list[str]
+    disabled: list[bool]
+    # Поля объекта в нижнем регистре, склеенные через \x00: триграмма не перешагивает границу поля.
+    texts: list[str]
+    # триграмма -> возрастающие номера объектов (array('I') компактнее set[int] в разы).
+    postings: dict[str, array]
+
+
+_INDEX: _ObjectIndex | None = None
+_BUILD_BATCH = 2000
+_LOCK = threading.Lock()
+
+
+def _trigrams(s: str) -> set[str]:
+    return {s[i : i + 3] for i in range(len(s) - 2)}
+
+
+def object_visibility_filters(
+    *,
+    include_disabled: bool,
+    include_id_prefix: bool,
+    include_star_prefix: bool,
+) -> list[ColumnElement[bool]]:
+    """SQL-фильтры списка объектов: по умолчанию прячем расторгнутые/отключенные."""
+    filters: list[ColumnElement[bool]] = []
+    if not include_disabled:
+        filters.append(Object.disabled.is_(False))
+    # In some deployments, terminated objects are stored with Panel_id like 'IDxxxxx'.
+    if not include_id_prefix:
+        filters.append(not_(Object.id.ilike("ID%")))
+    # In some deployments, terminated objects are stored with leading '*'.
+    if not include_star_prefix:
+        filters.append(not_(Object.id.like("*%")))
+    return filters
+
+
+def _visible(
+    panel_id: str,
+    disabled: bool,
+    *,
+    include_disabled: bool,
+    include_id_prefix: bool,
+    include_star_prefix: bool,
+) -> bool:
+    """То же, что object_visibility_filters, для строки индекса в памяти."""
+    if disabled and not include_disabled:
+        return False
+    if not include_id_prefix and panel_id[:2].upper() == "ID":
+        return False
+    if not include_star_prefix and panel_id.startswith("*"):
+        return False
+    return True
+
+
+async def ensure_object_search_index(conn: AsyncConnection, dialect_name: str) -> None:
+    """Postgres: pg_trgm + GIN-индексы (gin_trgm_ops) по полям поиска объектов (идемпотентно).
+
+    ILIKE '%...%' по такой колонке идёт через индекс. Без прав на CREATE EXTENSION
+    pg_object_search остаётся обычным ILIKE по objects (последовательный проход, без
+    ранжирования); индекс в памяти процесса на Postgres не используется.
+    """
+    global _PG_TRGM
+    if dialect_name != "postgresql":
+        return
+    try:
+        async with conn.begin_nested():
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception:
+        logger.warning("pg_trgm is unavailable; object search uses plain ILIKE scans ordered by id", exc_info=True)
+        _PG_TRGM = False
+        return
+    for col in OBJECT_SEARCH_COLUMNS:
+        await conn.execute(
+            text(f"CREATE INDEX IF NOT EXISTS ix_objects_{col}_trgm ON objects USING GIN ({col} gin_trgm_ops)")
+        )
+    _PG_TRGM = True
+
+
+async def _pg_trgm_available(session: AsyncSession) -> bool:
+    global _PG_TRGM
+    if _PG_TRGM is None:
+        row = (await session.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))).first()
+        _PG_TRGM = row is not None
+    return _PG_TRGM
+
+
+def _ilike_condition(q: str) -> ColumnElement[bool]:
+    needle = f"%{q.strip()}%"
+    return or_(*(getattr(Object, col).ilike(needle) for col in OBJECT_SEARCH_COLUMNS))
+
+
+async def _build_index(session: AsyncSession, version: datetime | None) -> _ObjectIndex:
+    ids: list[str] = []
+    disabled: list[bool] = []
+    texts: list[str] = []
+    lists: dict[str, list[int]] = {}
+    result = await session.stream(
+        select(Object.id, Object.name, Object.address, Object.client_name, Object.disabled)
+        .order_by(Object.id)
+        .execution_options(yield_per=_BUILD_BATCH)
+    )
+    async for part in result.partitions():
+        for panel_id, name, address, client_name, is_disabled in part:
+            n = len(ids)
+            body = "\x00".join((v or "").lower() for v in (panel_id, name, address, client_name))
+            ids.append(panel_id)
+            disabled.append(bool(is_disabled))
+            texts.append(body)
+            for gram in {body[i : i + 3] for i in range(len(body) - 2)}:
+                posting = lists.get(gram)
+                if posting is None:
+                    lists[gram] = [n]
+                else:
+                    posting.append(n)
+    postings = {gram: array("I", posting) for gram, posting in lists.items()}
+    return _ObjectIndex(version, time.monotonic(), ids, disabled, texts, postings)
+
+
+async def _current_index(session: AsyncSession) -> _ObjectIndex:
+    """Индекс в памяти; перестраивается после синка объектов (в любом процессе) или по TTL."""
+    global _INDEX
+    # По версии справочника другие процессы узнают, что локальный индекс устарел.
+    version = await objects_data_version(session)
+    ttl = float(settings.object_search_index_ttl_seconds)
+    with _LOCK:
+        index = _INDEX
+    if index is not None and index.version == version and time.monotonic() - index.built_at < ttl:
+        return index
+    index = await _build_index(session, version)
+    with _LOCK:
+        _INDEX = index
+    return index
+
+
+def invalidate_object_search() -> None:
+    """Сбрасывает индекс в памяти (синк объектов, демо-сидинг и другие записи в objects)."""
+    global _INDEX
+    with _LOCK:
+        _INDEX = None
+
+
+def _rank(body: str, needle: str) -> tuple[int, float]:
+    """(точное поле / начало поля или слова / подстрока, доля поля под совпадением) — больше лучше.
+
+    Дешёвая замена similarity() из pg_trgm: короткое поле, почти целиком совпавшее
+    с запросом, идёт выше длинного адреса, где запрос — случайный фрагмент.
+    """
+    best = (-1, 0.0)
+    for field in body.split("\x00"):
+        pos = field.find(needle)
+        if pos < 0:
+            continue
+        if field == needle:
+            kind = 2
+        elif pos == 0 or not field[pos - 1].isalnum():
+            kind = 1
+        else:
+            kind = 0
+        best = max(best, (kind, len(needle) / len(field)))
+    return best
+
+
+def _match_in_index(
+    index: _ObjectIndex,
+    q: str,
+    *,
+    include_disabled: bool,
+    include_id_prefix: bool,
+    include_star_prefix: bool,
+) -> list[str]:
+    needle = q.strip().lower()
+    grams = _trigrams(needle)
+    if grams:
+        # Кандидаты — по самой редкой триграмме запроса, затем проверка подстроки.
+        postings = [index.postings.get(g) for g in grams]
+        if any(p is None for p in postings):
+            return []
+        candidates: Any = min(postings, key=len)
+    else:
+        # Запрос короче трёх символов: триграмм нет, проверяем все строки (только в памяти).
+        candidates = range(len(index.ids))
+
+    scored: list[tuple[int, float, str]] = []
+    for n in candidates:
+        body = index.texts[n]
+        if needle not in body:
+            continue
+        panel_id = index.ids[n]
+        if not _visible(
+            panel_id,
+            index.disabled[n],
+            include_disabled=include_disabled,
+            include_id_prefix=include_id_prefix,
+            include_star_prefix=include_star_prefix,
+        ):
+            continue
+        kind, sim = _rank(body, needle)
+        scored.append((kind, sim, panel_id))
+    scored.sort(key=lambda s: (-s[0], -s[1], s[2]))
+    return [panel_id for _, _, panel_id in scored]
+
+
+async def search_object_ids(
+    session: AsyncSession,
+    q: str,
+    *,
+    include_disabled: bool,
+    include_id_prefix: bool,
+    include_star_prefix: bool,
+) -> list[str]:
+    """Все видимые panel_id, содержащие подстроку q (без учёта регистра), лучшие сверху.
+
+    Для SQLite и прочих диалектов, кроме Postgres: n-граммный индекс в памяти процесса.
+    """
+    index = await _current_index(session)
+    return _match_in_index(
+        index,
+        q,
+        include_disabled=include_disabled,
+        include_id_prefix=include_id_prefix,
+        include_star_prefix=include_star_prefix,
+    )
+
+
+async def pg_object_search(session: AsyncSession, stmt: Select[Any], q: str) -> Select[Any] | None:
+    """Postgres: stmt с фильтром ILIKE по полям поиска объектов.
+
+    С pg_trgm ILIKE идёт по триграммным индексам, сортировка по similarity() (лучшие
+    сверху); без него — обычный ILIKE с сортировкой по id.
+    None — диалект не Postgres (используйте search_object_ids).
+    """
+    if session_dialect_name(session) != "postgresql":
+        return None
+    needle = q.strip()
+    if not await _pg_trgm_available(session):
+        return stmt.where(_ilike_condition(needle)).order_by(Object.id.asc())
+    rank = func.greatest(*(func.similarity(getattr(Object, col), needle) for col in OBJECT_SEARCH_COLUMNS))
+    return stmt.where(_ilike_condition(needle)).order_by(rank.desc(), Object.id.asc())
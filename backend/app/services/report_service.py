@@ -1,66 +1,71 @@
 from __future__ import annotations
 
-import csv
-import io
+from collections.abc import AsyncIterator
 from datetime import datetime
 from datetime import date as date_type
+from typing import Any
 
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.event import Event
+from app.services.csv_export import stream_csv
+from app.services.event_text import EVENT_DESCRIPTION_COLUMNS, render_description
 
 
-async def export_daily_report_csv(session: AsyncSession, date: str) -> bytes:
-    """Экспорт суточного отчёта в CSV.
+_DAILY_HEADER = (
+    "id",
+    "timestamp",
+    "type",
+    "objectName",
+    "clientName",
+    "severity",
+    "status",
+    "description",
+    "location",
+)
+
+
+def _daily_row(e: Any) -> list[Any]:
+    return [
+        e.id,
+        e.timestamp.isoformat(),
+        e.type,
+        e.object_name,
+        e.client_name,
+        e.severity,
+        e.status,
+        render_description(e),
+        e.location or "",
+    ]
+
+
+def export_daily_report_csv(date: str) -> AsyncIterator[bytes]:
+    """Экспорт суточного отчёта в CSV (UTF-8 с BOM), по частям для StreamingResponse.
 
     На этапе MVP это простой выгрузочный формат (быстро и без внешних библиотек).
     Позже можно заменить на Excel/PDF, не меняя контракт эндпоинта.
+    Дата разбирается сразу, чтобы ошибка формата случилась до начала ответа.
     """
     # date: YYYY-MM-DD
     day = date_type.fromisoformat(date)
     dt_from = datetime.combine(day, datetime.min.time())
     dt_to = datetime.combine(day, datetime.max.time())
 
-    out = io.StringIO()
-    writer = csv.writer(out, delimiter=';')
-    writer.writerow(
-        [
-            "id",
-            "timestamp",
-            "type",
-            "objectName",
-            "clientName",
-            "severity",
-            "status",
-            "description",
-            "location",
-        ]
-    )
-
     stmt = (
-        select(Event)
+        select(
+            Event.timestamp,
+            Event.type,
+            Event.object_name,
+            Event.client_name,
+            Event.severity,
+            Event.status,
+            Event.location,
+            *EVENT_DESCRIPTION_COLUMNS,
+        )
         .where(Event.timestamp >= dt_from, Event.timestamp <= dt_to)
         .order_by(Event.timestamp.asc())
     )
-    rows = (await session.execute(stmt)).scalars().all()
-
-    for e in rows:
-        writer.writerow(
-            [
-                e.id,
-                e.timestamp.isoformat(),
-                e.type,
-                e.object_name,
-                e.client_name,
-                e.severity,
-                e.status,
-                e.description,
-                e.location or "",
-            ]
-        )
-
-    return out.getvalue().encode("utf-8-sig")
+    return stream_csv(stmt, _DAILY_HEADER, _daily_row, bom=True)
 
 
 def today_str() -> str:
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.config import settings
+from app.db.session import engine
+
+logger = logging.getLogger(__name__)
+
+# Синк (авто-синк, ручные /sync/*, задачи Celery) в каждый момент ведёт только один процесс —
+# лидер. Лидерство — межпроцессная блокировка: advisory lock Postgres на отдельном
+# соединении или lock-файл рядом с SQLite. Блокировка снимается при выходе/падении
+# процесса (закрытие соединения/файла), после чего её забирает следующий претендент.
+#
+# Все, кто пишет events/objects/sync_state, идут через лидерство: авто-синк (держит его
+# постоянно), exclusive_sync — ручные /sync/*, /sync/events/reset-cursor, демо-сид и задачи
+# Celery, backfill (лидерство на весь прогон, записи пачек под SYNC_LOCK на SQLite).
+# Исключения, которым блокировка не нужна:
+# - init_db при старте: DDL и перестройка events_fts идут одной транзакцией до запуска
+#   авто-синка этого процесса; с писателями других процессов их сериализует сама БД
+#   (блокировка записи SQLite с timeout, транзакции Postgres), курсоры не меняются;
+# - scripts/migrate_event_search.py (только Postgres): заполняет search_tsv короткими
+#   пачками UPDATE, строки, которые в это время пишет синк, обновляет триггер;
+#   sync_state и курсоры не трогает;
+# - scripts/bench_sync.py синкает в отдельную базу замера (по умолчанию временный SQLite);
+# - триггеры events_fts/search_tsv выполняются внутри транзакции самого писателя.
+
+# Внутри процесса записи синка сериализуются этим замком (SQLite допускает одного писателя).
+SYNC_LOCK = asyncio.Lock()
+# Захват межпроцессной блокировки внутри процесса — по одному претенденту за раз.
+_ACQUIRE_LOCK = asyncio.Lock()
+
+SYNC_BUSY = {"status": "busy", "reason": "Sync is running in another process (sync leader)"}
+
+
+class _PgAdvisoryLock:
+    def __init__(self, key: int) -> None:
+        self.key = key
+        self.conn: AsyncConnection | None = None
+
+    async def acquire(self) -> bool:
+        conn = await engine.connect()
+        try:
+            ok = bool((await conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": self.key})).scalar())
+            await conn.commit()
+        except Exception:
+            await conn.close()
+            raise
+        if not ok:
+            await conn.close()
+            return False
+        self.conn = conn
+        return True
+
+    async def alive(self) -> bool:
+        # Блокировка сессионная: пока соединение живо, она наша.
+        if self.conn is None:
+            return False
+        try:
+            await self.conn.execute(text("SELECT 1"))
+            await self.conn.commit()
+            return True
+        except Exception:
+            await self._drop()
+            return False
+
+    async def release(self) -> None:
+        if self.conn is None:
+            return
+        try:
+            await self.conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": self.key})
+            await self.conn.commit()
+            await self.conn.close()
+            self.conn = None
+        except Exception:
+            await self._drop()
+
+    async def _drop(self) -> None:
+        # Соединение не должно вернуться в пул с висящей блокировкой.
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                await conn.invalidate()
+            except Exception:
+                pass
+
+
+class _FileLock:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.fd: int | None = None
+
+    async def acquire(self) -> bool:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.name == "nt":
+                import msvcrt
+
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{socket.gethostname()}:{os.getpid()}\n".encode())
+        self.fd = fd
+        return True
+
+    async def alive(self) -> bool:
+        return self.fd is not None
+
+    async def release(self) -> None:
+        fd, self.fd = self.fd, None
+        if fd is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+def _lock_file_path() -> str:
+    if settings.sync_leader_lock_file:
+        return settings.sync_leader_lock_file
+    database = make_url(settings.database_url).database
+    if database and database != ":memory:":
+        return f"{database}.sync.lock"
+    return os.path.join(tempfile.gettempdir(), "svod-sync.lock")
+
+
+def _make_lock() -> _PgAdvisoryLock | _FileLock:
+    if engine.dialect.name == "postgresql":
+        return _PgAdvisoryLock(int(settings.sync_leader_lock_key))
+    return _FileLock(_lock_file_path())
+
+
+# Лидерство процесса: блокировка + число держателей (авто-синк держит её постоянно,
+# ручные запуски и задачи — на время вызова).
+_LEADER: dict[str, Any] = {"lock": None, "holders": 0, "owner": None}
+
+
+def is_sync_leader() -> bool:
+    return _LEADER["lock"] is not None
+
+
+async def acquire_sync_leadership(owner: str) -> bool:
+    """Пытается стать лидером синка (не ждёт). True — процесс уже лидер или стал им."""
+    async with _ACQUIRE_LOCK:
+        if _LEADER["lock"] is not None:
+            _LEADER["holders"] += 1
+            return True
+        lock = _make_lock()
+        try:
+            ok = await lock.acquire()
+        except Exception:
+            logger.warning("Sync leader lock acquire failed", exc_info=True)
+            return False
+        if not ok:
+            return False
+        _LEADER.update(lock=lock, holders=1, owner=owner)
+        logger.info("Sync leadership acquired by %s (pid=%s)", owner, os.getpid())
+        return True
+
+
+async def release_sync_leadership() -> None:
+    lock = _LEADER["lock"]
+    if lock is None:
+        return
+    _LEADER["holders"] -= 1
+    if _LEADER["holders"] > 0:
+        return
+    _LEADER.update(lock=None, holders=0, owner=None)
+    await lock.release()
+    logger.info("Sync leadership released (pid=%s)", os.getpid())
+
+
+async def check_sync_leadership() -> bool:
+    """Проверяет, что блокировка всё ещё за нами (соединение Postgres живо).
+
+    При потере блокировки лидерство процесса сбрасывается целиком.
+    """
+    lock = _LEADER["lock"]
+    if lock is None:
+        return False
+    if await lock.alive():
+        return True
+    logger.warning("Sync leadership lost (pid=%s)", os.getpid())
+    _LEADER.update(lock=None, holders=0, owner=None)
+    return False
+
+
+@asynccontextmanager
+async def exclusive_sync(owner: str) -> AsyncIterator[bool]:
+    """Разовый запуск синка: лидерство на время вызова + внутрипроцессный SYNC_LOCK.
+
+    Отдаёт False (ничего не захвачено), если синк ведёт другой процесс.
+    """
+    if not await acquire_sync_leadership(owner):
+        yield False
+        return
+    try:
+        async with SYNC_LOCK:
+            yield True
+    finally:
+        await release_sync_leadership()
+
+
+def sync_leader_status() -> dict[str, Any]:
+    return {
+        "isLeader": is_sync_leader(),
+        "owner": _LEADER["owner"],
+        "pid": os.getpid(),
+        "backend": "pg_advisory_lock" if engine.dialect.name == "postgresql" else "lock_file",
+    }
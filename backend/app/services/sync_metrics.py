@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterator, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Этапы одной итерации синка:
+# fetch — ожидание пачки из агентской БД, transform — преобразование строк в события/объекты,
+# write — upsert в локальную БД, commit — фиксация транзакции.
+STAGES = ("fetch", "transform", "write", "commit")
+
+
+class _Series:
+    """Скользящее окно последних значений + сводка (min/p50/p90/p99/max/mean)."""
+
+    __slots__ = ("values", "count")
+
+    def __init__(self, window: int) -> None:
+        self.values: deque[float] = deque(maxlen=max(1, window))
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.values.append(float(value))
+        self.count += 1
+
+    def snapshot(self, digits: int = 4) -> dict[str, Any]:
+        if not self.values:
+            return {"count": self.count}
+        vals = sorted(self.values)
+        n = len(vals)
+
+        def q(p: float) -> float:
+            return round(vals[min(n - 1, int(p * (n - 1) + 0.5))], digits)
+
+        return {
+            "count": self.count,
+            "window": n,
+            "last": round(self.values[-1], digits),
+            "min": round(vals[0], digits),
+            "p50": q(0.5),
+            "p90": q(0.9),
+            "p99": q(0.99),
+            "max": round(vals[-1], digits),
+            "mean": round(sum(vals) / n, digits),
+        }
+
+
+class _PipelineMetrics:
+    def __init__(self, window: int) -> None:
+        self.stages = {s: _Series(window) for s in STAGES}
+        self.total = _Series(window)
+        self.rows = _Series(window)
+        self.rows_per_second = _Series(window)
+        self.batch_size = _Series(window)
+        self.iterations = 0
+        self.errors = 0
+        self.last_run_at: float | None = None
+        self.last_error: str | None = None
+        self.last_error_at: float | None = None
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "iterations": self.iterations,
+            "errors": self.errors,
+            "lastRunAt": self.last_run_at,
+            "lastError": self.last_error,
+            "lastErrorAt": self.last_error_at,
+            "stagesSeconds": {s: series.snapshot() for s, series in self.stages.items()},
+            "totalSeconds": self.total.snapshot(),
+            "rows": self.rows.snapshot(digits=0),
+            "rowsPerSecond": self.rows_per_second.snapshot(digits=1),
+            "batchSize": self.batch_size.snapshot(digits=0),
+        }
+
+
+_PIPELINES: dict[str, _PipelineMetrics] = {}
+_LOCK = threading.Lock()
+
+
+class SyncRun:
+    """Замеры одной итерации синка (заполняются через stage() и batches())."""
+
+    def __init__(self) -> None:
+        self.durations: dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.batch_sizes: list[int] = []
+        self.rows = 0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + (time.perf_counter() - started)
+
+    async def batches(
+        self,
+        source: AsyncIterable[T],
+        size: Callable[[T], int] = len,  # type: ignore[assignment]
+    ) -> AsyncIterator[T]:
+        """Проксирует поток пачек, относя ожидание каждой пачки к этапу fetch."""
+        it = source.__aiter__()
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    batch = await it.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    self.durations["fetch"] += time.perf_counter() - started
+                n = size(batch)
+                self.batch_sizes.append(n)
+                self.rows += n
+                yield batch
+        finally:
+            aclose = getattr(it, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+def _record(pipeline: str, run: SyncRun, elapsed: float, error: BaseException | None = None) -> None:
+    window = int(settings.sync_metrics_window)
+    with _LOCK:
+        m = _PIPELINES.get(pipeline)
+        if m is None:
+            m = _PipelineMetrics(window)
+            _PIPELINES[pipeline] = m
+        m.iterations += 1
+        m.last_run_at = time.time()
+        for name, seconds in run.durations.items():
+            series = m.stages.get(name)
+            if series is None:
+                series = m.stages[name] = _Series(window)
+            series.add(seconds)
+        m.total.add(elapsed)
+        m.rows.add(run.rows)
+        if elapsed > 0:
+            m.rows_per_second.add(run.rows / elapsed)
+        for size in run.batch_sizes:
+            m.batch_size.add(size)
+        if error is not None:
+            m.errors += 1
+            m.last_error = f"{type(error).__name__}: {error}"
+            m.last_error_at = m.last_run_at
+
+
+@contextmanager
+def track_sync(pipeline: str) -> Iterator[SyncRun]:
+    """Замеряет итерацию синка pipeline (например, "mssql.events"); ошибки тоже учитываются."""
+    run = SyncRun()
+    started = time.perf_counter()
+    try:
+        yield run
+    except Exception as e:
+        _record(pipeline, run, time.perf_counter() - started, error=e)
+        raise
+    _record(pipeline, run, time.perf_counter() - started)
+
+
+def sync_metrics_snapshot() -> dict[str, Any]:
+    with _LOCK:
+        return {name: m.snapshot() for name, m in sorted(_PIPELINES.items())}
+
+
+def reset_sync_metrics() -> None:
+    with _LOCK:
+        _PIPELINES.clear()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterable, Awaitable, Callable, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+_DONE = object()
+
+
+class _Failed:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def pipeline_depth(depth: int | None = None) -> int:
+    return max(0, int(settings.sync_pipeline_depth if depth is None else depth))
+
+
+async def run_pipeline(
+    source: AsyncIterable[T],
+    transform: Callable[[T], Awaitable[U]],
+    write: Callable[[U], Awaitable[None]],
+    *,
+    depth: int | None = None,
+) -> None:
+    """Прогоняет пачки через этапы fetch+transform → write с ограниченной очередью между ними.
+
+    Пока пачка пишется в локальную БД (write, включая commit), следующая уже читается из
+    агентской БД и преобразуется. Очередь на depth пачек: если запись медленнее, transform
+    ждёт свободного места, а с ним останавливается и чтение (backpressure). Пачки пишутся
+    строго по порядку, поэтому курсор, сохранённый в write, всегда монотонен.
+    depth=0 — без конвейера: пачки обрабатываются последовательно.
+
+    transform и write выполняются одновременно, поэтому им нельзя делить одну AsyncSession.
+    Ошибка любого этапа останавливает оба и пробрасывается вызывающему.
+    """
+    depth = pipeline_depth(depth)
+    if depth == 0:
+        async for batch in source:
+            await write(await transform(batch))
+        return
+
+    queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=depth)
+
+    async def _produce() -> None:
+        it = source.__aiter__()
+        try:
+            while True:
+                try:
+                    batch = await it.__anext__()
+                except StopAsyncIteration:
+                    break
+                await queue.put(await transform(batch))
+            await queue.put(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:  # noqa: BLE001
+            await queue.put(_Failed(e))
+        finally:
+            aclose = getattr(it, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    producer = asyncio.create_task(_produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failed):
+                raise item.error
+            await write(item)
+    finally:
+        if not producer.done():
+            producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
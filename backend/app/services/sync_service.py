@@ -1,21 +1,45 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Any
+import asyncio
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterator
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.integrations.agency_mysql import fetch_alarms_since
-from app.integrations.agency_mssql import fetch_archive_events_since, fetch_objects_snapshot
+from app.integrations.agency_async import iterate_agency_batches
+from app.integrations.agency_mysql import iter_alarms_since, iter_alarms_window
+from app.integrations.agency_mssql import (
+    cached_dictionaries,
+    get_dictionaries,
+    iter_archive_events_since,
+    iter_event_state_changes_since,
+    iter_objects_snapshot,
+)
 from app.core.config import settings
+from app.db.bulk_upsert import UpsertResult, bulk_upsert
+from app.db.dialect import session_dialect_name
+from app.db.session import SessionLocal
 from app.models.event import Event
 from app.models.object import Object, ObjectGroup, Responsible, ResponsiblePhone
 from app.models.sync_state import SyncState
+from app.services.object_cache import get_object_infos, remember_objects
+from app.services.object_search import invalidate_object_search
+from app.services.sync_metrics import SyncRun, track_sync
+from app.services.sync_pipeline import pipeline_depth, run_pipeline
 
 
 SYNC_KEY_LAST_ALARM_ID = "agency_mysql.last_alarm_id"
+SYNC_KEY_MYSQL_REFRESH_WATERMARK = "agency_mysql.refresh.watermark"
+# Время последнего перечитывания тревог, изменившего события (двигает версию данных для кэшей).
+SYNC_KEY_MYSQL_REFRESH_CHANGED_AT = "agency_mysql.refresh.changed_at"
 SYNC_KEY_MSSQL_EVENT_CURSOR = "agency_mssql.archive.cursor"
+SYNC_KEY_MSSQL_OBJECTS_WATERMARK = "agency_mssql.objects.watermark"
+SYNC_KEY_MSSQL_OBJECTS_LAST_FULL = "agency_mssql.objects.last_full"
+SYNC_KEY_MSSQL_STATES_WATERMARK = "agency_mssql.states.watermark"
 
 
 def _derive_severity(row: dict[str, Any]) -> str:
@@ -82,16 +106,7 @@ async def set_last_alarm_id(session: AsyncSession, value: int) -> None:
         row.updated_at = datetime.utcnow()
 
 
-async def sync_events_from_agency_mysql(
-    session: AsyncSession,
-    agency_mysql_url: str,
-    batch_limit: int = 500,
-) -> dict[str, Any]:
-    last_id = await get_last_alarm_id(session)
-    rows = fetch_alarms_since(mysql_url=agency_mysql_url, last_id=last_id, limit=batch_limit)
-    if not rows:
-        return {"status": "ok", "processed": 0, "lastId": last_id}
-
+def _alarm_rows_to_events(rows: list[dict[str, Any]], last_id: int) -> tuple[list[dict[str, Any]], int]:
     events_to_insert: list[dict[str, Any]] = []
     max_id = last_id
 
@@ -125,87 +140,228 @@ async def sync_events_from_agency_mysql(
             }
         )
 
-    if not events_to_insert:
-        return {"status": "ok", "processed": 0, "lastId": last_id}
+    return events_to_insert, max_id
+
+
+# Поля события, которые перезаписываются при повторном чтении той же записи источника.
+_EVENT_UPDATE_COLUMNS = (
+    "timestamp",
+    "type",
+    "object_id",
+    "object_name",
+    "client_name",
+    "severity",
+    "status",
+    "description",
+    "location",
+    "operator_id",
+    "code",
+    "code_group",
+    "code_text",
+    "state_name",
+    "state_is_over_process",
+    "state_event",
+    "zone",
+    "line",
+    "group_no",
+    "person",
+    "gbr",
+    "result_text",
+)
+
+
+async def _upsert_alarm_events(session: AsyncSession, events_to_insert: list[dict[str, Any]]) -> UpsertResult:
+    # Тревоги MySQL меняются (IS_DONE, результат осмотра) — перезаписываем.
+    return await bulk_upsert(
+        session,
+        Event,
+        events_to_insert,
+        update_columns=[c for c in _EVENT_UPDATE_COLUMNS if c in events_to_insert[0]],
+    )
+
+
+async def sync_events_from_agency_mysql(
+    session: AsyncSession,
+    agency_mysql_url: str,
+    batch_limit: int = 500,
+) -> dict[str, Any]:
+    last_id = await get_last_alarm_id(session)
+    written = UpsertResult()
+    fetched = 0
+
+    # Пачки пишем по мере поступления из небуферизованного курсора, конвейером:
+    # следующая читается и преобразуется, пока текущая пишется.
+    # Курсор last_id двигаем и коммитим после каждой пачки.
+    transform_id = last_id
+
+    async def _transform(rows: list[dict[str, Any]]) -> tuple[int, list[dict[str, Any]], int]:
+        nonlocal transform_id
+        with run.stage("transform"):
+            events_to_insert, transform_id = _alarm_rows_to_events(rows, transform_id)
+        return len(rows), events_to_insert, transform_id
+
+    async def _write(item: tuple[int, list[dict[str, Any]], int]) -> None:
+        nonlocal written, fetched, last_id
+        n, events_to_insert, max_id = item
+        fetched += n
+        with run.stage("write"):
+            if events_to_insert:
+                written += await _upsert_alarm_events(session, events_to_insert)
+            if max_id != last_id:
+                last_id = max_id
+                await set_last_alarm_id(session, last_id)
+        with run.stage("commit"):
+            await session.commit()
+
+    with track_sync("mysql.events") as run:
+        await run_pipeline(
+            run.batches(
+                iterate_agency_batches(
+                    partial(
+                        iter_alarms_since,
+                        mysql_url=agency_mysql_url,
+                        last_id=last_id,
+                        limit=batch_limit,
+                        batch_size=settings.agency_fetch_batch_size,
+                    ),
+                    prefetch=max(1, pipeline_depth()),
+                )
+            ),
+            _transform,
+            _write,
+        )
+
+    return {
+        "status": "ok",
+        "processed": written.written,
+        **written.as_dict(),
+        "fetched": fetched,
+        "lastId": last_id,
+    }
+
 
-    dialect = None
+async def _changed_alarm_events(session: AsyncSession, events: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Оставляет события, у которых локальная копия отличается (или её нет)."""
+    if not events:
+        return []
+    columns = [c for c in events[0] if c != "id"]
+    existing = {
+        row[0]: row[1:]
+        for row in (
+            await session.execute(
+                select(Event.id, *(getattr(Event, c) for c in columns)).where(Event.id.in_([e["id"] for e in events]))
+            )
+        ).all()
+    }
+    return [e for e in events if existing.get(e["id"]) != tuple(e[c] for c in columns)]
+
+
+def _parse_alarm_watermark(value: str | None) -> tuple[datetime, int] | None:
+    # "modified_at;ID_ALARMS"; прежний формат — только время (граница перечитывается целиком).
+    if not value:
+        return None
+    modified_at, _, alarm_id = value.partition(";")
     try:
-        bind = session.get_bind()
-        dialect = getattr(bind, "dialect", None)
+        return datetime.fromisoformat(modified_at), int(alarm_id or 0)
     except Exception:
-        dialect = None
+        return None
 
-    result = None
-    if dialect is not None and getattr(dialect, "name", None) == "postgresql":
-        from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-        insert_stmt = pg_insert(Event).values(events_to_insert)
-        stmt = insert_stmt.on_conflict_do_update(
-            index_elements=[Event.id],
-            set_={
-                "timestamp": insert_stmt.excluded.timestamp,
-                "type": insert_stmt.excluded.type,
-                "object_id": insert_stmt.excluded.object_id,
-                "object_name": insert_stmt.excluded.object_name,
-                "client_name": insert_stmt.excluded.client_name,
-                "severity": insert_stmt.excluded.severity,
-                "status": insert_stmt.excluded.status,
-                "description": insert_stmt.excluded.description,
-                "location": insert_stmt.excluded.location,
-                "operator_id": insert_stmt.excluded.operator_id,
-                "code": insert_stmt.excluded.code,
-                "code_group": insert_stmt.excluded.code_group,
-                "code_text": insert_stmt.excluded.code_text,
-                "state_name": insert_stmt.excluded.state_name,
-                "state_is_over_process": insert_stmt.excluded.state_is_over_process,
-            },
-        )
-        result = await session.execute(stmt)
-    elif dialect is not None and getattr(dialect, "name", None) == "sqlite":
-        from sqlalchemy import bindparam
-        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
-
-        # For SQLite, avoid generating a single massive VALUES (...) statement
-        # which can exceed SQLite's variable limit (~999) for large batches.
-        stmt = (
-            sqlite_insert(Event)
-            .values(
-                id=bindparam("id"),
-                timestamp=bindparam("timestamp"),
-                type=bindparam("type"),
-                object_id=bindparam("object_id"),
-                object_name=bindparam("object_name"),
-                client_name=bindparam("client_name"),
-                severity=bindparam("severity"),
-                status=bindparam("status"),
-                description=bindparam("description"),
-                location=bindparam("location"),
-                operator_id=bindparam("operator_id"),
-            )
-            .on_conflict_do_nothing(index_elements=[Event.id])
-        )
-        result = await session.execute(stmt, events_to_insert)
-    else:
-        # Fallback: insert one by one, ignoring duplicates
-        existing_ids = set(
-            (await session.execute(select(Event.id).where(Event.id.in_([r["id"] for r in events_to_insert])))).scalars().all()
-        )
-        for r in events_to_insert:
-            if r["id"] in existing_ids:
-                continue
-            session.add(Event(**r))
+def _format_alarm_watermark(watermark: tuple[datetime, int]) -> str:
+    return f"{watermark[0].isoformat()};{watermark[1]}"
 
-    await set_last_alarm_id(session, max_id)
-    await session.commit()
 
-    # rowcount can be None for some drivers; fall back to len
-    inserted = 0
-    if result is not None:
-        rc = getattr(result, "rowcount", None)
-        inserted = len(events_to_insert) if (rc is None or rc < 0) else int(rc)
-    else:
-        inserted = len(events_to_insert)
-    return {"status": "ok", "processed": int(inserted), "lastId": max_id}
+async def refresh_recent_alarms_from_agency_mysql(
+    session: AsyncSession,
+    agency_mysql_url: str,
+    *,
+    window: int | None = None,
+    batch_limit: int = 2000,
+) -> dict[str, Any]:
+    """Перечитывает недавние тревоги MySQL, чтобы подхватить изменения уже загруженных.
+
+    Основной синк читает только ID_ALARMS > last_id, а IS_DONE/IS_ZAYAVKA/IS_PROPAZHA и
+    результат осмотра агентство проставляет позже. Здесь перечитывается окно последних
+    window тревог (до last_id включительно) или — если задан AGENCY_MYSQL_ALARMS_MODIFIED_COLUMN —
+    тревоги, изменённые после сохранённого водяного знака (не больше batch_limit за вызов).
+    Водяной знак — (время изменения, ID_ALARMS) последней строки, поэтому тревоги одного
+    массового UPDATE с общим временем читаются по batch_limit, а не по кругу.
+    Записываются только события, у которых производные поля (status/severity/описание…)
+    действительно изменились; после такой записи обновляется SYNC_KEY_MYSQL_REFRESH_CHANGED_AT
+    (версия данных для кэшей total и т.п.).
+    """
+    last_id = await get_last_alarm_id(session)
+    if last_id <= 0:
+        return {"status": "ok", "fetched": 0, "updated": 0, "lastId": last_id}
+
+    modified_column = settings.agency_mysql_alarms_modified_column.strip() or None
+    window = max(1, int(window or settings.agency_mysql_refresh_window))
+    min_id = 0 if modified_column else max(0, last_id - window)
+
+    watermark: tuple[datetime, int] | None = None
+    if modified_column:
+        watermark = _parse_alarm_watermark(await get_sync_value(session, SYNC_KEY_MYSQL_REFRESH_WATERMARK))
+        if watermark is None:
+            watermark = (datetime.now() - timedelta(hours=settings.agency_state_refresh_initial_hours), 0)
+    new_watermark = watermark
+
+    fetched = 0
+    written = UpsertResult()
+
+    with track_sync("mysql.refresh") as run:
+        async for rows in run.batches(
+            iterate_agency_batches(
+                partial(
+                    iter_alarms_window,
+                    agency_mysql_url,
+                    min_id=min_id,
+                    max_id=last_id,
+                    modified_column=modified_column,
+                    modified_since=watermark[0] if watermark else None,
+                    modified_after_id=watermark[1] if watermark else 0,
+                    limit=batch_limit if modified_column else None,
+                    batch_size=settings.agency_fetch_batch_size,
+                )
+            )
+        ):
+            fetched += len(rows)
+            with run.stage("transform"):
+                events, _ = _alarm_rows_to_events(rows, last_id)
+                changed = await _changed_alarm_events(session, events)
+            with run.stage("write"):
+                if changed:
+                    batch_written = await _upsert_alarm_events(session, changed)
+                    written += batch_written
+                    if batch_written.written:
+                        await _set_datetime_state(session, SYNC_KEY_MYSQL_REFRESH_CHANGED_AT, datetime.now())
+
+            if modified_column:
+                for r in rows:
+                    modified_at = r.get("_MODIFIED_AT")
+                    if not isinstance(modified_at, datetime):
+                        continue
+                    try:
+                        key = (modified_at, int(r.get("ID_ALARMS")))
+                    except Exception:
+                        continue
+                    if new_watermark is None or key > new_watermark:
+                        new_watermark = key
+                if new_watermark is not None:
+                    await set_sync_value(
+                        session, SYNC_KEY_MYSQL_REFRESH_WATERMARK, _format_alarm_watermark(new_watermark)
+                    )
+            with run.stage("commit"):
+                await session.commit()
+
+    return {
+        "status": "ok",
+        "mode": "modified" if modified_column else "window",
+        "fetched": fetched,
+        "updated": written.written,
+        "lastId": last_id,
+        "fromId": min_id if not modified_column else None,
+        "watermark": _format_alarm_watermark(new_watermark) if new_watermark else None,
+    }
 
 
 def _safe_str(v: Any) -> str | None:
@@ -215,6 +371,15 @@ def _safe_str(v: Any) -> str | None:
     return s or None
 
 
+def _safe_int(v: Any) -> int | None:
+    if v is None:
+        return None
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
 async def get_mssql_event_cursor(session: AsyncSession) -> tuple[int, int]:
     """Возвращает (Date_Key, Event_id)."""
     row = await session.get(SyncState, SYNC_KEY_MSSQL_EVENT_CURSOR)
@@ -244,171 +409,414 @@ async def set_mssql_event_cursor(session: AsyncSession, date_key: int, event_id:
         row.updated_at = datetime.utcnow()
 
 
-async def sync_objects_from_agency_mssql(
-    session: AsyncSession,
-    agency_mssql_url: str,
-) -> dict[str, Any]:
-    """Синхронизирует объекты/группы/ответственных из MSSQL агентства в локальную БД SVOD."""
-
-    snap = fetch_objects_snapshot(agency_mssql_url)
-    objects = snap.get("objects") or []
-    groups = snap.get("groups") or []
-    responsibles = snap.get("responsibles") or []
-    phones = snap.get("phones") or []
-
-    # Индексы для быстрого связывания
-    groups_by_panel: dict[str, list[dict[str, Any]]] = {}
-    for g in groups:
-        pid = _safe_str(g.get("Panel_id"))
-        if not pid:
-            continue
-        groups_by_panel.setdefault(pid, []).append(g)
+async def get_sync_value(session: AsyncSession, key: str) -> str | None:
+    row = await session.get(SyncState, key)
+    if not row or not row.value:
+        return None
+    return row.value
 
-    resp_by_panel: dict[str, list[dict[str, Any]]] = {}
-    for r in responsibles:
-        pid = _safe_str(r.get("Panel_id"))
-        if not pid:
-            continue
-        resp_by_panel.setdefault(pid, []).append(r)
 
-    phones_by_list: dict[int, list[dict[str, Any]]] = {}
-    for p in phones:
-        try:
-            lid = int(p.get("ListId"))
-        except Exception:
-            continue
-        phones_by_list.setdefault(lid, []).append(p)
+async def set_sync_value(session: AsyncSession, key: str, value: str) -> None:
+    row = await session.get(SyncState, key)
+    if row is None:
+        row = SyncState(key=key, value=value, updated_at=datetime.utcnow())
+        session.add(row)
+    else:
+        row.value = value
+        row.updated_at = datetime.utcnow()
 
-    from sqlalchemy import delete
 
-    upserted = 0
-    for o in objects:
-        panel_id = _safe_str(o.get("Panel_id"))
-        if not panel_id:
-            continue
+async def _get_datetime_state(session: AsyncSession, key: str) -> datetime | None:
+    value = await get_sync_value(session, key)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except Exception:
+        return None
+
+
+async def _set_datetime_state(session: AsyncSession, key: str, value: datetime) -> None:
+    await set_sync_value(session, key, value.isoformat())
+
+
+async def get_mssql_objects_watermark(session: AsyncSession) -> datetime | None:
+    """Максимальный Panel.DateLastChange, уже загруженный в локальную БД."""
+    return await _get_datetime_state(session, SYNC_KEY_MSSQL_OBJECTS_WATERMARK)
+
+
+def _parse_states_watermark(value: str | None) -> tuple[datetime, int, int] | None:
+    # "ChangedAt;Date_Key:Event_id"; прежний формат — только ChangedAt (граница перечитывается целиком).
+    if not value:
+        return None
+    changed_at, _, key = value.partition(";")
+    try:
+        date_key, _, event_id = key.partition(":")
+        return datetime.fromisoformat(changed_at), int(date_key or 0), int(event_id or 0)
+    except Exception:
+        return None
+
+
+def format_states_watermark(watermark: tuple[datetime, int, int]) -> str:
+    changed_at, date_key, event_id = watermark
+    return f"{changed_at.isoformat()};{date_key}:{event_id}"
+
+
+async def get_mssql_states_watermark(session: AsyncSession) -> tuple[datetime, int, int] | None:
+    """Водяной знак обновления состояний событий: (eventservice.OperationTime, Date_Key, Event_id)."""
+    return _parse_states_watermark(await get_sync_value(session, SYNC_KEY_MSSQL_STATES_WATERMARK))
+
+
+async def objects_full_sync_due(session: AsyncSession, now: datetime | None = None) -> bool:
+    """Нужен ли ночной полный снапшот объектов.
+
+    Полный снапшот выполняется раз в сутки, начиная с часа AUTO_SYNC_OBJECTS_FULL_HOUR
+    (локальное время), а также если его ещё ни разу не было.
+    """
+    hour = settings.auto_sync_objects_full_hour
+    if hour < 0:
+        return False
+    now = now or datetime.now()
+    last_full = await _get_datetime_state(session, SYNC_KEY_MSSQL_OBJECTS_LAST_FULL)
+    if last_full is None:
+        return True
+    return last_full.date() < now.date() and now.hour >= hour
+
+
+# Сколько панелей пишем за один набор INSERT/DELETE. Держит IN (...) списки
+# и executemany-пакеты в пределах лимитов параметров SQLite/Postgres.
+OBJECTS_WRITE_CHUNK = 500
+
+
+def _object_row(o: dict[str, Any], now: datetime) -> dict[str, Any] | None:
+    panel_id = _safe_str(o.get("Panel_id"))
+    if not panel_id:
+        return None
+    company_name = _safe_str(o.get("CompanyName"))
+    return {
+        "id": panel_id,
+        "name": company_name or panel_id,
+        "address": _safe_str(o.get("CompanyAddress")),
+        "client_name": company_name,
+        "disabled": bool(o.get("Disabled") or False),
+        "remarks": _safe_str(o.get("Remarks")),
+        "additional_info": _safe_str(o.get("AdditionalTechnicalInformation")) or _safe_str(o.get("CompanyMemo")),
+        "latitude": _safe_str(o.get("Latitude")),
+        "longitude": _safe_str(o.get("Longtitude")),
+        "created_at": o.get("CreateDate") if isinstance(o.get("CreateDate"), datetime) else None,
+        "updated_at": now,
+    }
+
+
+async def _upsert_object_rows(session: AsyncSession, rows: list[dict[str, Any]]) -> None:
+    """INSERT ... ON CONFLICT DO UPDATE карточек объектов; дочерние строки панелей удаляются заранее."""
+    from sqlalchemy import delete, func
+
+    chunk_ids = [r["id"] for r in rows]
+
+    # Сначала чистим дочерние строки. Телефоны удаляем явно: в SQLite
+    # ON DELETE CASCADE не работает без PRAGMA foreign_keys.
+    resp_ids_subq = select(Responsible.id).where(Responsible.object_id.in_(chunk_ids))
+    await session.execute(delete(ResponsiblePhone).where(ResponsiblePhone.responsible_id.in_(resp_ids_subq)))
+    await session.execute(delete(Responsible).where(Responsible.object_id.in_(chunk_ids)))
+    await session.execute(delete(ObjectGroup).where(ObjectGroup.object_id.in_(chunk_ids)))
 
-        # Delete children first to avoid SQLAlchemy autoflush inserting/updating
-        # the parent object before the cleanup statements run.
-        await session.execute(delete(ObjectGroup).where(ObjectGroup.object_id == panel_id))
-        await session.execute(delete(Responsible).where(Responsible.object_id == panel_id))
-
-        # Upsert основной карточки
-        obj = await session.get(Object, panel_id)
-        if obj is None:
-            obj = Object(id=panel_id)
-            session.add(obj)
-
-        company_name = _safe_str(o.get("CompanyName"))
-        company_address = _safe_str(o.get("CompanyAddress"))
-        company_memo = _safe_str(o.get("CompanyMemo"))
-
-        obj.name = company_name or panel_id
-        obj.address = company_address
-        obj.client_name = company_name
-        obj.disabled = bool(o.get("Disabled") or False)
-        obj.remarks = _safe_str(o.get("Remarks"))
-        obj.additional_info = _safe_str(o.get("AdditionalTechnicalInformation")) or company_memo
-        obj.latitude = _safe_str(o.get("Latitude"))
-        obj.longitude = _safe_str(o.get("Longtitude"))
-        obj.created_at = o.get("CreateDate") if isinstance(o.get("CreateDate"), datetime) else obj.created_at
-        obj.updated_at = datetime.utcnow()
-
-        for g in groups_by_panel.get(panel_id, []):
-            try:
-                group_no = int(g.get("GroupNo"))
-            except Exception:
+    dialect_name = session_dialect_name(session)
+    if dialect_name in ("postgresql", "sqlite"):
+        if dialect_name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        insert_stmt = dialect_insert(Object)
+        stmt = insert_stmt.on_conflict_do_update(
+            index_elements=[Object.id],
+            set_={
+                "name": insert_stmt.excluded.name,
+                "address": insert_stmt.excluded.address,
+                "client_name": insert_stmt.excluded.client_name,
+                "disabled": insert_stmt.excluded.disabled,
+                "remarks": insert_stmt.excluded.remarks,
+                "additional_info": insert_stmt.excluded.additional_info,
+                "latitude": insert_stmt.excluded.latitude,
+                "longitude": insert_stmt.excluded.longitude,
+                "created_at": func.coalesce(insert_stmt.excluded.created_at, Object.created_at),
+                "updated_at": insert_stmt.excluded.updated_at,
+            },
+        )
+        await session.execute(stmt, rows)
+    else:
+        existing = {
+            o.id: o for o in (await session.execute(select(Object).where(Object.id.in_(chunk_ids)))).scalars().all()
+        }
+        for row in rows:
+            obj = existing.get(row["id"])
+            if obj is None:
+                session.add(Object(**row))
                 continue
-            session.add(
-                ObjectGroup(
-                    object_id=panel_id,
-                    group_no=group_no,
-                    name=str(g.get("GroupName") or ""),
-                    is_open=g.get("IsOpen"),
-                    time_event=g.get("TimeEvent") if isinstance(g.get("TimeEvent"), datetime) else None,
-                )
-            )
+            for k, v in row.items():
+                if k == "created_at" and v is None:
+                    continue
+                setattr(obj, k, v)
+        await session.flush()
 
-        # Ответственные + телефоны
-        for r in resp_by_panel.get(panel_id, []):
-            try:
-                group_no = int(r.get("GroupNo"))
-            except Exception:
-                group_no = None
-            try:
-                order_no = int(r.get("OrderNo"))
-            except Exception:
-                order_no = None
-
-            resp = Responsible(
-                object_id=panel_id,
-                group_no=group_no,
-                order_no=order_no,
-                name=str(r.get("ResponsibleName") or ""),
-                address=_safe_str(r.get("ResponsibleAddress")),
-            )
-            session.add(resp)
-            await session.flush()  # получить resp.id для телефонов
 
-            try:
-                list_id = int(r.get("ListId"))
-            except Exception:
-                list_id = None
+async def _write_objects_stream(
+    session: AsyncSession,
+    batches: AsyncIterable[tuple[str, list[dict[str, Any]]]],
+) -> dict[str, Any]:
+    """Пишет снапшот объектов set-based запросами по мере поступления пачек.
+
+    Ожидает пачки в порядке objects → groups → responsibles → phones (как отдаёт
+    iter_objects_snapshot). Карточки объектов — INSERT ... ON CONFLICT DO UPDATE,
+    дочерние строки (группы, ответственные, телефоны) заменяются целиком. Id ответственных
+    возвращаются пачкой через INSERT ... RETURNING, поэтому телефоны связываются без flush
+    на каждую строку. В памяти держатся только id панелей и ответственных, а не сами строки.
+    """
+    from sqlalchemy import insert
 
-            if list_id is not None:
-                for ph in phones_by_list.get(list_id, []):
+    now = datetime.utcnow()
+    panel_ids: set[str] = set()
+    resp_ids_by_list: dict[int, list[int]] = {}
+    max_changed_at: datetime | None = None
+    counts = {"objects": 0, "groups": 0, "responsibles": 0, "phones": 0}
+
+    async for kind, batch in batches:
+        counts[kind] += len(batch)
+        for i in range(0, len(batch), OBJECTS_WRITE_CHUNK):
+            chunk = batch[i : i + OBJECTS_WRITE_CHUNK]
+
+            if kind == "objects":
+                rows_by_id: dict[str, dict[str, Any]] = {}
+                for o in chunk:
+                    row = _object_row(o, now)
+                    if row is None:
+                        continue
+                    rows_by_id[row["id"]] = row
+                    changed_at = o.get("DateLastChange")
+                    if isinstance(changed_at, datetime) and (max_changed_at is None or changed_at > max_changed_at):
+                        max_changed_at = changed_at
+                if rows_by_id:
+                    await _upsert_object_rows(session, list(rows_by_id.values()))
+                    panel_ids.update(rows_by_id)
+                    remember_objects(rows_by_id.values())
+
+            elif kind == "groups":
+                group_rows: list[dict[str, Any]] = []
+                for g in chunk:
+                    panel_id = _safe_str(g.get("Panel_id"))
+                    if not panel_id or panel_id not in panel_ids:
+                        continue
+                    try:
+                        group_no = int(g.get("GroupNo"))
+                    except Exception:
+                        continue
+                    group_rows.append(
+                        {
+                            "object_id": panel_id,
+                            "group_no": group_no,
+                            "name": str(g.get("GroupName") or ""),
+                            "is_open": g.get("IsOpen"),
+                            "time_event": g.get("TimeEvent") if isinstance(g.get("TimeEvent"), datetime) else None,
+                        }
+                    )
+                if group_rows:
+                    await session.execute(insert(ObjectGroup), group_rows)
+
+            elif kind == "responsibles":
+                resp_rows: list[dict[str, Any]] = []
+                resp_list_ids: list[int | None] = []
+                for r in chunk:
+                    panel_id = _safe_str(r.get("Panel_id"))
+                    if not panel_id or panel_id not in panel_ids:
+                        continue
+                    try:
+                        group_no = int(r.get("GroupNo"))
+                    except Exception:
+                        group_no = None
+                    try:
+                        order_no = int(r.get("OrderNo"))
+                    except Exception:
+                        order_no = None
+                    try:
+                        list_id = int(r.get("ListId"))
+                    except Exception:
+                        list_id = None
+                    resp_rows.append(
+                        {
+                            "object_id": panel_id,
+                            "group_no": group_no,
+                            "order_no": order_no,
+                            "name": str(r.get("ResponsibleName") or ""),
+                            "address": _safe_str(r.get("ResponsibleAddress")),
+                        }
+                    )
+                    resp_list_ids.append(list_id)
+                if resp_rows:
+                    resp_ids = (
+                        await session.execute(
+                            insert(Responsible).returning(Responsible.id, sort_by_parameter_order=True),
+                            resp_rows,
+                        )
+                    ).scalars().all()
+                    for resp_id, list_id in zip(resp_ids, resp_list_ids):
+                        if list_id is not None:
+                            resp_ids_by_list.setdefault(list_id, []).append(resp_id)
+
+            elif kind == "phones":
+                phone_rows: list[dict[str, Any]] = []
+                for ph in chunk:
+                    try:
+                        list_id = int(ph.get("ListId"))
+                    except Exception:
+                        continue
                     phone = _safe_str(ph.get("PhoneNo"))
                     if not phone:
                         continue
                     type_id = ph.get("TypeId")
                     type_name = f"type:{type_id}" if type_id is not None else None
-                    session.add(ResponsiblePhone(responsible_id=resp.id, phone=phone, type_name=type_name))
-
-        upserted += 1
+                    for resp_id in resp_ids_by_list.get(list_id, []):
+                        phone_rows.append({"responsible_id": resp_id, "phone": phone, "type_name": type_name})
+                if phone_rows:
+                    await session.execute(insert(ResponsiblePhone), phone_rows)
 
-    await session.commit()
-    return {
-        "status": "ok",
-        "objects": int(upserted),
-        "sourceObjects": int(len(objects)),
-        "sourceGroups": int(len(groups)),
-        "sourceResponsibles": int(len(responsibles)),
-        "sourcePhones": int(len(phones)),
-    }
+    return {"upserted": len(panel_ids), "counts": counts, "maxChangedAt": max_changed_at}
 
 
-async def sync_events_from_agency_mssql_archives(
+async def sync_objects_from_agency_mssql(
     session: AsyncSession,
     agency_mssql_url: str,
     *,
-    archives_db_name: str,
-    batch_limit: int = 500,
+    full: bool = True,
 ) -> dict[str, Any]:
-    """Синхронизирует события из месячных архивных таблиц MSSQL (pult4db_archives)."""
+    """Синхронизирует объекты/группы/ответственных из MSSQL агентства в локальную БД SVOD.
+
+    full=True — полный снапшот; full=False — только панели, изменённые с момента
+    сохранённого watermark (Panel.DateLastChange). Без watermark дельта превращается в полный снапшот.
+    """
+
+    watermark = await get_mssql_objects_watermark(session)
+    if watermark is None:
+        full = True
+
+    with track_sync("mssql.objects") as run:
+        # Преобразование строк идёт вперемешку с записью, поэтому оно учитывается в этапе write
+        # (время ожидания пачек из MSSQL вычитается и попадает в fetch).
+        write_started = time.perf_counter()
+        written = await _write_objects_stream(
+            session,
+            run.batches(
+                iterate_agency_batches(
+                    partial(
+                        iter_objects_snapshot,
+                        agency_mssql_url,
+                        changed_since=None if full else watermark,
+                        batch_size=settings.agency_fetch_batch_size,
+                    )
+                ),
+                size=lambda kind_batch: len(kind_batch[1]),
+            ),
+        )
+        run.durations["write"] += time.perf_counter() - write_started - run.durations["fetch"]
+        counts = written["counts"]
+
+        new_watermark = watermark
+        max_changed_at = written["maxChangedAt"]
+        if max_changed_at is not None and (new_watermark is None or max_changed_at > new_watermark):
+            new_watermark = max_changed_at
+        if new_watermark is not None:
+            await _set_datetime_state(session, SYNC_KEY_MSSQL_OBJECTS_WATERMARK, new_watermark)
+        if full:
+            await _set_datetime_state(session, SYNC_KEY_MSSQL_OBJECTS_LAST_FULL, datetime.now())
+
+        with run.stage("commit"):
+            await session.commit()
+        invalidate_object_search()
+    return {
+        "status": "ok",
+        "mode": "full" if full else "delta",
+        "watermark": new_watermark.isoformat() if new_watermark else None,
+        "objects": int(written["upserted"]),
+        "sourceObjects": int(counts["objects"]),
+        "sourceGroups": int(counts["groups"]),
+        "sourceResponsibles": int(counts["responsibles"]),
+        "sourcePhones": int(counts["phones"]),
+    }
 
-    cur_date_key, cur_event_id = await get_mssql_event_cursor(session)
-    rows = fetch_archive_events_since(
-        agency_mssql_url,
-        archives_db_name=archives_db_name,
-        cursor_date_key=cur_date_key,
-        cursor_event_id=cur_event_id,
-        limit=batch_limit,
-    )
-    if not rows:
-        return {"status": "ok", "processed": 0, "cursor": f"{cur_date_key}:{cur_event_id}"}
 
-    # Try to enrich events with local object snapshot (names/addresses/clients).
+# Поля события MSSQL, которые меняет обработка оператором (eventservice), см. _update_event_states.
+_MSSQL_STATE_COLUMNS = (
+    "status",
+    "state_name",
+    "state_is_over_process",
+    "state_event",
+    "operator_id",
+    "person",
+    "gbr",
+)
+
+
+def _mssql_state_fields(r: dict[str, Any]) -> dict[str, Any]:
+    """Статус и состояние события по строке архива (StateEvent/States, последняя запись eventservice)."""
+    state_event = r.get("StateEvent")
+    state_name = _safe_str(r.get("StateName"))
+    state_is_over = r.get("StateIsOverProcess")
+
+    name_state = _safe_str(r.get("NameState"))
+    person = _safe_str(r.get("PersonName"))
+    gbr = _safe_str(r.get("GrResponseName"))
+
+    # Map MSSQL StateEvent to UI-friendly statuses.
+    # - isOverProcess=1 => resolved
+    # - any explicit state => pending
+    # - otherwise => active
+    is_over = bool(state_is_over) if state_is_over is not None else False
+    if is_over:
+        status = "resolved"
+    elif state_event is not None or state_name or name_state:
+        status = "pending"
+    else:
+        status = "active"
+
+    return {
+        "status": status,
+        "state_name": state_name,
+        "state_is_over_process": bool(state_is_over) if state_is_over is not None else None,
+        "state_event": _safe_int(state_event),
+        "operator_id": person,
+        "person": person,
+        "gbr": gbr,
+    }
+
+
+def _mssql_state_rows(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Строки для _update_event_states: id события и поля состояния (без обогащения объектами)."""
+    out: list[dict[str, Any]] = []
+    for r in rows:
+        try:
+            date_key = int(r.get("Date_Key"))
+            event_id = int(r.get("Event_id"))
+        except Exception:
+            continue
+        out.append({"id": f"mssql:{date_key}:{event_id}", **_mssql_state_fields(r)})
+    return out
+
+
+async def _mssql_rows_to_events(
+    session: AsyncSession,
+    rows: list[dict[str, Any]],
+    cur_date_key: int,
+    cur_event_id: int,
+) -> tuple[list[dict[str, Any]], int, int]:
+    """Преобразует пачку строк архива в события; возвращает (events, date_key, event_id) нового курсора."""
+    # Обогащаем события названием/адресом/клиентом объекта из кэша (промахи — один запрос колонок).
     panel_ids: set[str] = set()
     for r in rows:
         pid = _safe_str(r.get("Panel_id"))
         if pid:
             panel_ids.add(pid)
 
-    objects_by_id: dict[str, Object] = {}
-    if panel_ids:
-        objs = (
-            await session.execute(select(Object).where(Object.id.in_(list(panel_ids))))
-        ).scalars().all()
-        objects_by_id = {o.id: o for o in objs}
+    objects_by_id = await get_object_infos(session, panel_ids) if panel_ids else {}
 
     events_to_insert: list[dict[str, Any]] = []
     max_date_key = cur_date_key
@@ -436,60 +844,6 @@ async def sync_events_from_agency_mssql_archives(
         line = _safe_str(r.get("Line"))
         result_text = _safe_str(r.get("Result_Text"))
 
-        state_event = r.get("StateEvent")
-        state_name = _safe_str(r.get("StateName"))
-        state_is_over = r.get("StateIsOverProcess")
-
-        name_state = _safe_str(r.get("NameState"))
-        person = _safe_str(r.get("PersonName"))
-        gbr = _safe_str(r.get("GrResponseName"))
-
-        desc_parts: list[str] = []
-        # Preserve key archive identifiers for audit/debugging.
-        desc_parts.append(f"Event_id: {event_id}")
-        desc_parts.append(f"Date_Key: {date_key}")
-        if panel_id:
-            desc_parts.append(f"Panel_id: {panel_id}")
-
-        if code:
-            if code_text:
-                desc_parts.append(f"Код: {code} — {code_text}")
-            else:
-                desc_parts.append(f"Код: {code}")
-        if zone is not None:
-            desc_parts.append(f"Зона: {zone}")
-        if line:
-            desc_parts.append(f"Шлейф: {line}")
-
-        if state_event is not None or state_name:
-            st_id = str(state_event) if state_event is not None else ""
-            st_label = state_name or name_state or ""
-            if st_id and st_label:
-                desc_parts.append(f"Статус: {st_label} (StateEvent={st_id})")
-            elif st_label:
-                desc_parts.append(f"Статус: {st_label}")
-            elif st_id:
-                desc_parts.append(f"StateEvent: {st_id}")
-
-        if person:
-            desc_parts.append(f"Оператор: {person}")
-        if gbr:
-            desc_parts.append(f"ГБР: {gbr}")
-        if result_text:
-            desc_parts.append(result_text)
-
-        # Map MSSQL StateEvent to UI-friendly statuses.
-        # - isOverProcess=1 => resolved
-        # - any explicit state => pending
-        # - otherwise => active
-        is_over = bool(state_is_over) if state_is_over is not None else False
-        if is_over:
-            status = "resolved"
-        elif state_event is not None or state_name or name_state:
-            status = "pending"
-        else:
-            status = "active"
-
         events_to_insert.append(
             {
                 "id": f"mssql:{date_key}:{event_id}",
@@ -499,107 +853,269 @@ async def sync_events_from_agency_mssql_archives(
                 "object_name": (obj.name if obj and obj.name else None) or panel_id or "Объект",
                 "client_name": (obj.client_name if obj and obj.client_name else None) or panel_id or "Не указан",
                 "severity": "info",
-                "status": status,
                 "code": code,
                 "code_group": int(r.get("CodeGroup")) if r.get("CodeGroup") is not None else None,
                 "code_text": code_text,
-                "state_name": state_name,
-                "state_is_over_process": bool(state_is_over) if state_is_over is not None else None,
-                "description": "\n".join(desc_parts) if desc_parts else "",
+                "zone": _safe_int(zone),
+                "line": line,
+                "group_no": _safe_int(r.get("GroupNo")),
+                "result_text": result_text,
+                # Текст собирается при чтении из колонок (app.services.event_text.render_description).
+                "description": "",
                 "location": (obj.address if obj and obj.address else None),
-                "operator_id": person,
+                **_mssql_state_fields(r),
             }
         )
 
-    if not events_to_insert:
-        return {"status": "ok", "processed": 0, "cursor": f"{cur_date_key}:{cur_event_id}"}
+    return events_to_insert, max_date_key, max_event_id
 
-    dialect = None
-    try:
-        bind = session.get_bind()
-        dialect = getattr(bind, "dialect", None)
-    except Exception:
-        dialect = None
-
-    result = None
-    if dialect is not None and getattr(dialect, "name", None) == "postgresql":
-        from sqlalchemy.dialects.postgresql import insert as pg_insert
-
-        stmt = pg_insert(Event).values(events_to_insert).on_conflict_do_nothing(index_elements=[Event.id])
-        result = await session.execute(stmt)
-    elif dialect is not None and getattr(dialect, "name", None) == "sqlite":
-        from sqlalchemy import bindparam
-        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
-
-        # For SQLite, avoid generating a single massive VALUES (...) statement
-        # which can exceed SQLite's variable limit (~999) for large batches.
-        stmt = (
-            sqlite_insert(Event)
-            .values(
-                id=bindparam("id"),
-                timestamp=bindparam("timestamp"),
-                type=bindparam("type"),
-                object_id=bindparam("object_id"),
-                object_name=bindparam("object_name"),
-                client_name=bindparam("client_name"),
-                severity=bindparam("severity"),
-                status=bindparam("status"),
-                code=bindparam("code"),
-                code_group=bindparam("code_group"),
-                code_text=bindparam("code_text"),
-                state_name=bindparam("state_name"),
-                state_is_over_process=bindparam("state_is_over_process"),
-                description=bindparam("description"),
-                location=bindparam("location"),
-                operator_id=bindparam("operator_id"),
-            )
-            .on_conflict_do_update(
-                index_elements=[Event.id],
-                set_={
-                    "timestamp": sqlite_insert(Event).excluded.timestamp,
-                    "type": sqlite_insert(Event).excluded.type,
-                    "object_id": sqlite_insert(Event).excluded.object_id,
-                    "object_name": sqlite_insert(Event).excluded.object_name,
-                    "client_name": sqlite_insert(Event).excluded.client_name,
-                    "severity": sqlite_insert(Event).excluded.severity,
-                    "status": sqlite_insert(Event).excluded.status,
-                    "description": sqlite_insert(Event).excluded.description,
-                    "location": sqlite_insert(Event).excluded.location,
-                    "operator_id": sqlite_insert(Event).excluded.operator_id,
-                    "code": sqlite_insert(Event).excluded.code,
-                    "code_group": sqlite_insert(Event).excluded.code_group,
-                    "code_text": sqlite_insert(Event).excluded.code_text,
-                    "state_name": sqlite_insert(Event).excluded.state_name,
-                    "state_is_over_process": sqlite_insert(Event).excluded.state_is_over_process,
-                },
-            )
+
+async def _upsert_mssql_events(session: AsyncSession, events_to_insert: list[dict[str, Any]]) -> UpsertResult:
+    # Повторное чтение (сброс курсора, backfill) перезаписывает событие актуальным состоянием архива.
+    return await bulk_upsert(
+        session,
+        Event,
+        events_to_insert,
+        update_columns=[c for c in _EVENT_UPDATE_COLUMNS if c in events_to_insert[0]],
+    )
+
+
+def _resolve_archive_dictionaries(agency_mssql_url: str, rows: list[dict[str, Any]]) -> None:
+    """Дополняет строки архива CodeText/StateName/StateIsOverProcess из кэша справочников Code_T/States."""
+    ttl = settings.agency_dictionaries_ttl_seconds
+    dictionaries = cached_dictionaries(agency_mssql_url, ttl=ttl) or get_dictionaries(agency_mssql_url, ttl=ttl)
+
+    unknown = any(
+        not dictionaries.has_code(r.get("Code"), r.get("CodeGroup")) or not dictionaries.has_state(r.get("StateEvent"))
+        for r in rows
+    )
+    if unknown:
+        # Новый код/статус в агентстве — перечитываем справочники досрочно (с ограничением частоты).
+        dictionaries = get_dictionaries(agency_mssql_url, ttl=ttl, refresh_if_missing=True)
+
+    for r in rows:
+        r["CodeText"] = dictionaries.code_text(r.get("Code"), r.get("CodeGroup"))
+        state = dictionaries.state(r.get("StateEvent"))
+        r["StateName"] = state[0] if state else None
+        r["StateIsOverProcess"] = state[1] if state else None
+
+
+def iter_resolved_archive_events(agency_mssql_url: str, **kwargs: Any) -> Iterator[list[dict[str, Any]]]:
+    """iter_archive_events_since + разрешение кодов по справочникам.
+
+    Выполняется целиком в потоке агентского пула (через iterate_agency_batches), поэтому
+    досрочное перечитывание справочников не занимает ещё один поток пула.
+    """
+    for rows in iter_archive_events_since(agency_mssql_url, **kwargs):
+        _resolve_archive_dictionaries(agency_mssql_url, rows)
+        yield rows
+
+
+async def ingest_mssql_archive_stream(
+    session: AsyncSession,
+    batches: AsyncIterable[list[dict[str, Any]]],
+    cur_date_key: int,
+    cur_event_id: int,
+    run: SyncRun,
+    *,
+    save_cursor: Callable[[int, int], Awaitable[None]],
+    after_commit: Callable[[UpsertResult, int, int, int], Awaitable[None]] | None = None,
+    write_lock: asyncio.Lock | None = None,
+) -> tuple[UpsertResult, int, int, int]:
+    """Преобразует и записывает поток пачек архива конвейером (см. run_pipeline).
+
+    Каждая пачка пишется в своей транзакции: upsert событий, save_cursor(date_key, event_id)
+    при сдвиге курсора, commit, затем after_commit(записано, строк в пачке, date_key, event_id).
+    write_lock (если задан) держится на время записи и коммита каждой пачки — так backfill
+    на SQLite чередует свои транзакции с живым синком, а не держит замок весь прогон.
+    Обогащение объектами на этапе transform идёт в отдельной короткой сессии — основная
+    в это время занята записью предыдущей пачки.
+    Возвращает (итог записи, прочитано строк, date_key, event_id).
+    """
+    written = UpsertResult()
+    fetched = 0
+    transform_cursor = (cur_date_key, cur_event_id)
+
+    async def _transform(rows: list[dict[str, Any]]) -> tuple[int, list[dict[str, Any]], int, int]:
+        nonlocal transform_cursor
+        with run.stage("transform"):
+            async with SessionLocal() as lookup_session:
+                events_to_insert, max_date_key, max_event_id = await _mssql_rows_to_events(
+                    lookup_session, rows, *transform_cursor
+                )
+        transform_cursor = (max_date_key, max_event_id)
+        return len(rows), events_to_insert, max_date_key, max_event_id
+
+    async def _write(item: tuple[int, list[dict[str, Any]], int, int]) -> None:
+        nonlocal written, fetched, cur_date_key, cur_event_id
+        n, events_to_insert, max_date_key, max_event_id = item
+        async with write_lock if write_lock is not None else nullcontext():
+            with run.stage("write"):
+                batch_written = (
+                    await _upsert_mssql_events(session, events_to_insert) if events_to_insert else UpsertResult()
+                )
+                if (max_date_key, max_event_id) != (cur_date_key, cur_event_id):
+                    cur_date_key, cur_event_id = max_date_key, max_event_id
+                    await save_cursor(cur_date_key, cur_event_id)
+            with run.stage("commit"):
+                await session.commit()
+        written += batch_written
+        fetched += n
+        if after_commit is not None:
+            await after_commit(batch_written, n, cur_date_key, cur_event_id)
+
+    await run_pipeline(run.batches(batches), _transform, _write)
+    return written, fetched, cur_date_key, cur_event_id
+
+
+async def sync_events_from_agency_mssql_archives(
+    session: AsyncSession,
+    agency_mssql_url: str,
+    *,
+    archives_db_name: str,
+    batch_limit: int = 500,
+) -> dict[str, Any]:
+    """Синхронизирует события из месячных архивных таблиц MSSQL (pult4db_archives).
+
+    Пачки из fetchmany пишутся по мере поступления (конвейером: следующая читается, пока
+    пишется текущая); после каждой пачки курсор сдвигается и фиксируется коммитом.
+    """
+
+    cur_date_key, cur_event_id = await get_mssql_event_cursor(session)
+
+    with track_sync("mssql.events") as run:
+        written, fetched, cur_date_key, cur_event_id = await ingest_mssql_archive_stream(
+            session,
+            iterate_agency_batches(
+                partial(
+                    iter_resolved_archive_events,
+                    agency_mssql_url,
+                    archives_db_name=archives_db_name,
+                    cursor_date_key=cur_date_key,
+                    cursor_event_id=cur_event_id,
+                    limit=batch_limit,
+                    batch_size=settings.agency_fetch_batch_size,
+                    catalog_ttl=settings.agency_archive_catalog_ttl_seconds,
+                ),
+                prefetch=max(1, pipeline_depth()),
+            ),
+            cur_date_key,
+            cur_event_id,
+            run,
+            save_cursor=partial(set_mssql_event_cursor, session),
         )
-        result = await session.execute(stmt, events_to_insert)
-    else:
-        existing_ids = set(
-            (
-                await session.execute(select(Event.id).where(Event.id.in_([r["id"] for r in events_to_insert])))
+
+    return {
+        "status": "ok",
+        "processed": written.written,
+        **written.as_dict(),
+        "fetched": fetched,
+        "cursor": f"{cur_date_key}:{cur_event_id}",
+    }
+
+
+def iter_resolved_state_changes(agency_mssql_url: str, **kwargs: Any) -> Iterator[list[dict[str, Any]]]:
+    """iter_event_state_changes_since + разрешение кодов по справочникам (см. iter_resolved_archive_events)."""
+    for rows in iter_event_state_changes_since(agency_mssql_url, **kwargs):
+        _resolve_archive_dictionaries(agency_mssql_url, rows)
+        yield rows
+
+
+async def _update_event_states(session: AsyncSession, events: list[dict[str, Any]]) -> int:
+    """Обновляет статус/состояние/оператора у уже загруженных событий одним executemany.
+
+    Строки, которых нет локально (курсор их ещё не прошёл) или у которых ничего не
+    изменилось, не трогаются. Заодно очищается description, сохранённый до появления
+    структурированных колонок (в нём зашиты прежние «Статус: …/Оператор: …»): иначе
+    render_description отдавал бы его вместо нового состояния. Возвращает число изменённых событий.
+    """
+    from sqlalchemy import bindparam, or_, update
+
+    if not events:
+        return 0
+
+    t = Event.__table__
+    fields = _MSSQL_STATE_COLUMNS
+    stmt = (
+        update(t)
+        .where(t.c.id == bindparam("b_id"))
+        .where(
+            or_(
+                *(t.c[f].is_distinct_from(bindparam(f"b_{f}")) for f in fields),
+                t.c.description.is_distinct_from(""),
             )
-            .scalars()
-            .all()
         )
-        for r in events_to_insert:
-            if r["id"] in existing_ids:
-                continue
-            session.add(Event(**r))
+        .values({**{f: bindparam(f"b_{f}") for f in fields}, "description": ""})
+    )
+    params = [{"b_id": e["id"], **{f"b_{f}": e.get(f) for f in fields}} for e in events]
+    result = await session.execute(stmt, params)
+    rc = getattr(result, "rowcount", None)
+    return len(events) if (rc is None or rc < 0) else int(rc)
 
-    await set_mssql_event_cursor(session, max_date_key, max_event_id)
-    await session.commit()
 
-    inserted = 0
-    if result is not None:
-        rc = getattr(result, "rowcount", None)
-        inserted = len(events_to_insert) if (rc is None or rc < 0) else int(rc)
-    else:
-        inserted = len(events_to_insert)
+async def refresh_event_states_from_agency_mssql(
+    session: AsyncSession,
+    agency_mssql_url: str,
+    *,
+    archives_db_name: str,
+    batch_limit: int = 2000,
+) -> dict[str, Any]:
+    """Подтягивает изменения состояния уже загруженных событий (обработка оператором и т.п.).
+
+    Читает события, изменённые в eventservice после сохранённого водяного знака, и обновляет
+    у локальных событий status/state_name/state_is_over_process/state_event/operator_id/
+    person/gbr. Водяной знак — (ChangedAt, Date_Key, Event_id) последней строки пачки:
+    следующий опрос продолжает строго после неё, даже если у пачки один ChangedAt.
+    """
+    watermark = await get_mssql_states_watermark(session)
+    if watermark is None:
+        # Первый запуск: всё, что старше, уже загружено с актуальным на тот момент состоянием.
+        watermark = (datetime.now() - timedelta(hours=settings.agency_state_refresh_initial_hours), 0, 0)
+
+    fetched = 0
+    updated = 0
+    new_watermark = watermark
+
+    with track_sync("mssql.states") as run:
+        async for rows in run.batches(
+            iterate_agency_batches(
+                partial(
+                    iter_resolved_state_changes,
+                    agency_mssql_url,
+                    archives_db_name=archives_db_name,
+                    since=watermark[0],
+                    after_date_key=watermark[1],
+                    after_event_id=watermark[2],
+                    limit=batch_limit,
+                    lookback_months=settings.agency_state_refresh_lookback_months,
+                    batch_size=settings.agency_fetch_batch_size,
+                    catalog_ttl=settings.agency_archive_catalog_ttl_seconds,
+                )
+            )
+        ):
+            fetched += len(rows)
+            with run.stage("transform"):
+                events = _mssql_state_rows(rows)
+            with run.stage("write"):
+                updated += await _update_event_states(session, events)
+
+            for r in rows:
+                changed_at = r.get("ChangedAt")
+                if not isinstance(changed_at, datetime):
+                    continue
+                try:
+                    key = (changed_at, int(r.get("Date_Key")), int(r.get("Event_id")))
+                except Exception:
+                    continue
+                if key > new_watermark:
+                    new_watermark = key
+            await set_sync_value(session, SYNC_KEY_MSSQL_STATES_WATERMARK, format_states_watermark(new_watermark))
+            with run.stage("commit"):
+                await session.commit()
 
     return {
         "status": "ok",
-        "processed": int(inserted),
-        "cursor": f"{max_date_key}:{max_event_id}",
+        "fetched": fetched,
+        "updated": int(updated),
+        "watermark": format_states_watermark(new_watermark),
     }
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 
 from app.core.config import settings
 
@@ -26,4 +27,42 @@ celery_app = Celery(
 celery_app.conf.update(
     timezone="Europe/Moscow",
     enable_utc=False,
+    # Синк — короткие задачи; не берём их впрок, чтобы очередь не копилась в одном воркере.
+    worker_prefetch_multiplier=1,
 )
+
+# Расписание синка для `celery beat`: те же интервалы, что у авто-синка в API.
+# Просроченные запуски отбрасываются (expires), чтобы после простоя не выполнять пачку старых.
+# Если одновременно работает авто-синк API, задачи пропускаются: синк ведёт лидер (sync_leader).
+celery_app.conf.beat_schedule = {
+    "sync-events": {
+        "task": "svod.sync_events",
+        "schedule": float(settings.auto_sync_interval_seconds),
+        "options": {"expires": float(settings.auto_sync_interval_seconds)},
+    },
+    "sync-objects": {
+        "task": "svod.sync_objects",
+        "schedule": float(settings.auto_sync_objects_interval_seconds),
+        "kwargs": {"full": None},
+        "options": {"expires": float(settings.auto_sync_objects_interval_seconds)},
+    },
+    "refresh-event-states": {
+        "task": "svod.refresh_event_states",
+        "schedule": float(settings.auto_sync_states_interval_seconds),
+        "options": {"expires": float(settings.auto_sync_states_interval_seconds)},
+    },
+}
+
+
+@worker_process_init.connect
+def _on_worker_process_init(**_: object) -> None:
+    from app.tasks.runtime import init_worker_process
+
+    init_worker_process()
+
+
+@worker_process_shutdown.connect
+def _on_worker_process_shutdown(**_: object) -> None:
+    from app.tasks.runtime import shutdown_worker_process
+
+    shutdown_worker_process()
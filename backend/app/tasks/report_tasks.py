@@ -4,13 +4,20 @@ from celery.utils.log import get_task_logger
 
 from app.services.report_service import export_daily_report_csv
 from app.tasks.celery_app import celery_app
+from app.tasks.runtime import run_async
 
 logger = get_task_logger(__name__)
 
 
 @celery_app.task(name="svod.generate_daily_report")
 def generate_daily_report(date: str) -> dict:
-    # На этапе MVP генерируем файл (CSV) без БД.
-    content = export_daily_report_csv(date=date)
-    logger.info("generate_daily_report: date=%s bytes=%s", date, len(content))
-    return {"status": "ok", "date": date, "bytes": len(content)}
+    # На этапе MVP генерируем файл (CSV) и считаем его размер, не храня целиком в памяти.
+    async def _run() -> int:
+        size = 0
+        async for chunk in export_daily_report_csv(date=date):
+            size += len(chunk)
+        return size
+
+    size = run_async(_run())
+    logger.info("generate_daily_report: date=%s bytes=%s", date, size)
+    return {"status": "ok", "date": date, "bytes": size}
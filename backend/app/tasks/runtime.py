@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Any, Coroutine, TypeVar
+
+from app.db.session import engine
+
+T = TypeVar("T")
+
+# Один event loop на процесс воркера Celery. asyncio.run() на каждую задачу создавал
+# новый loop, а соединения пула async-движка привязаны к loop, в котором открыты, —
+# их приходилось бросать. С постоянным loop пул движка переиспользуется между задачами.
+_LOOP: asyncio.AbstractEventLoop | None = None
+_LOOP_PID: int | None = None
+
+
+def worker_loop() -> asyncio.AbstractEventLoop:
+    global _LOOP, _LOOP_PID
+    # После fork (prefork-пул) loop родителя непригоден: заводим свой.
+    if _LOOP is None or _LOOP.is_closed() or _LOOP_PID != os.getpid():
+        _LOOP = asyncio.new_event_loop()
+        _LOOP_PID = os.getpid()
+        asyncio.set_event_loop(_LOOP)
+    return _LOOP
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """Выполняет корутину задачи в постоянном loop текущего процесса воркера."""
+    return worker_loop().run_until_complete(coro)
+
+
+def init_worker_process() -> None:
+    """worker_process_init: соединения, унаследованные от родителя при fork, не используем."""
+    engine.sync_engine.dispose(close=False)
+    worker_loop()
+
+
+def shutdown_worker_process() -> None:
+    """worker_process_shutdown: закрывает пул движка, агентские пулы и loop."""
+    global _LOOP
+    from app.integrations.agency_async import shutdown_agency_executor
+    from app.integrations.agency_pool import close_agency_pools
+
+    shutdown_agency_executor()
+    close_agency_pools()
+
+    loop, _LOOP = _LOOP, None
+    if loop is None or loop.is_closed() or _LOOP_PID != os.getpid():
+        return
+    try:
+        loop.run_until_complete(engine.dispose())
+    finally:
+        loop.close()
@@ -1,55 +1,132 @@
 from __future__ import annotations
 
-import asyncio
-
 from celery.utils.log import get_task_logger
 
 from app.core.config import settings
 from app.db.session import SessionLocal
 from app.tasks.celery_app import celery_app
-from app.services.sync_service import sync_events_from_agency_mysql, sync_objects_from_agency_mssql
+from app.tasks.runtime import run_async
+from app.services.sync_leader import SYNC_BUSY, exclusive_sync
+from app.services.sync_service import (
+    objects_full_sync_due,
+    refresh_event_states_from_agency_mssql,
+    refresh_recent_alarms_from_agency_mysql,
+    sync_events_from_agency_mssql_archives,
+    sync_events_from_agency_mysql,
+    sync_objects_from_agency_mssql,
+)
 
 logger = get_task_logger(__name__)
 
 
+def _agency_scheme() -> str:
+    url = settings.agency_database_url or ""
+    return (url.split(":", 1)[0] or "").lower()
+
+
 @celery_app.task(name="svod.sync_events")
-def sync_events() -> dict:
+def sync_events(limit: int | None = None) -> dict:
     if not settings.agency_database_url:
         logger.info("sync_events: AGENCY_DATABASE_URL not set")
         return {"status": "skipped", "reason": "AGENCY_DATABASE_URL not set"}
 
+    url = settings.agency_database_url
+    scheme = _agency_scheme()
+    if not (scheme.startswith("mysql") or scheme.startswith("mssql")):
+        logger.info("sync_events: Unsupported scheme: %s", scheme)
+        return {"status": "error", "reason": f"Unsupported scheme: {scheme}"}
+
+    base_limit = max(1, int(settings.auto_sync_events_limit))
+    batch_limit = max(1, int(limit or base_limit))
+
     async def _run() -> dict:
-        async with SessionLocal() as session:
-            return await sync_events_from_agency_mysql(
-                session=session,
-                agency_mysql_url=settings.agency_database_url or "",
-                batch_limit=500,
-            )
-
-    result = asyncio.run(_run())
+        # Если синк ведёт другой процесс (авто-синк API), задача пропускается.
+        async with exclusive_sync("celery") as acquired:
+            if not acquired:
+                return dict(SYNC_BUSY)
+            async with SessionLocal() as session:
+                if scheme.startswith("mysql"):
+                    return await sync_events_from_agency_mysql(
+                        session=session,
+                        agency_mysql_url=url,
+                        batch_limit=batch_limit,
+                    )
+                return await sync_events_from_agency_mssql_archives(
+                    session=session,
+                    agency_mssql_url=url,
+                    archives_db_name=settings.agency_archives_db_name,
+                    batch_limit=batch_limit,
+                )
+
+    result = run_async(_run())
     logger.info("sync_events: %s", result)
+
+    # Полная пачка — догоняем сразу следующей задачей с удвоенной пачкой (как авто-синк в API).
+    if int(result.get("fetched") or 0) >= batch_limit:
+        next_limit = min(batch_limit * 2, max(base_limit, int(settings.auto_sync_events_max_limit)))
+        sync_events.apply_async(kwargs={"limit": next_limit})
     return result
 
 
 @celery_app.task(name="svod.sync_objects")
-def sync_objects() -> dict:
+def sync_objects(full: bool | None = True) -> dict:
+    """full=None — дельта, а полный снапшот раз в сутки (как в авто-синке)."""
     if not settings.agency_database_url:
         logger.info("sync_objects: AGENCY_DATABASE_URL not set")
         return {"status": "skipped", "reason": "AGENCY_DATABASE_URL not set"}
 
     url = settings.agency_database_url
-    scheme = (url.split(":", 1)[0] or "").lower()
+    scheme = _agency_scheme()
     if not scheme.startswith("mssql"):
         logger.info("sync_objects: Unsupported scheme: %s", scheme)
         return {"status": "error", "reason": f"Unsupported scheme: {scheme}"}
 
     async def _run() -> dict:
-        async with SessionLocal() as session:
-            return await sync_objects_from_agency_mssql(
-                session=session,
-                agency_mssql_url=url,
-            )
+        async with exclusive_sync("celery") as acquired:
+            if not acquired:
+                return dict(SYNC_BUSY)
+            async with SessionLocal() as session:
+                return await sync_objects_from_agency_mssql(
+                    session=session,
+                    agency_mssql_url=url,
+                    full=await objects_full_sync_due(session) if full is None else full,
+                )
 
-    result = asyncio.run(_run())
+    result = run_async(_run())
     logger.info("sync_objects: %s", result)
     return result
+
+
+@celery_app.task(name="svod.refresh_event_states")
+def refresh_event_states(limit: int | None = None) -> dict:
+    if not settings.agency_database_url:
+        logger.info("refresh_event_states: AGENCY_DATABASE_URL not set")
+        return {"status": "skipped", "reason": "AGENCY_DATABASE_URL not set"}
+
+    url = settings.agency_database_url
+    scheme = _agency_scheme()
+    if not (scheme.startswith("mysql") or scheme.startswith("mssql")):
+        return {"status": "skipped", "reason": f"Unsupported scheme: {scheme}"}
+
+    async def _run() -> dict:
+        async with exclusive_sync("celery") as acquired:
+            if not acquired:
+                return dict(SYNC_BUSY)
+            async with SessionLocal() as session:
+                if scheme.startswith("mysql"):
+                    # У MySQL нет eventservice: перечитываем недавние тревоги.
+                    return await refresh_recent_alarms_from_agency_mysql(
+                        session=session,
+                        agency_mysql_url=url,
+                        batch_limit=int(limit or settings.auto_sync_states_limit),
+                    )
+                return await refresh_event_states_from_agency_mssql(
+                    session=session,
+                    agency_mssql_url=url,
+                    archives_db_name=settings.agency_archives_db_name,
+                    batch_limit=int(limit or settings.auto_sync_states_limit),
+                )
+
+    result = run_async(_run())
+    logger.info("refresh_event_states: %s", result)
+    return result
@@ -0,0 +1,311 @@
+"""Бенчмарк синка агентство → SVOD на офлайн-эмуляторе MSSQL (см. agency_emulator.py).
+
+Прогоняет точки входа синка на синтетических данных и печатает пропускную способность,
+задержку вызова, перцентили этапов (sync_metrics) и пиковую память процесса:
+
+    python scripts/agency_emulator.py generate --dir /tmp/agency --events 1000000
+    python scripts/bench_sync.py --emulator-dir /tmp/agency --json > bench.json
+
+Локальная БД по умолчанию — временный файл SQLite; --database-url позволяет мерить на Postgres
+(таблицы events/objects/sync_state в ней очищаются!). MySQL-источник не эмулируется.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+_BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+ENTRIES = ("objects-full", "objects-delta", "events", "states", "backfill")
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emulator-dir", required=True, help="Каталог с данными эмулятора (generate)")
+    parser.add_argument("--database-url", default="", help="Локальная БД SVOD (по умолчанию — временный SQLite)")
+    parser.add_argument("--only", default=",".join(ENTRIES), help=f"Точки входа через запятую: {', '.join(ENTRIES)}")
+    parser.add_argument("--events-limit", type=int, default=20000, help="batch_limit одного вызова синка событий")
+    parser.add_argument("--states-limit", type=int, default=20000, help="batch_limit одного вызова обновления состояний")
+    parser.add_argument("--delta-ratio", type=float, default=0.1, help="Доля панелей, изменённых перед дельта-синком")
+    parser.add_argument("--tracemalloc", action="store_true", help="Пик памяти Python-аллокаций по каждой точке входа (медленнее)")
+    parser.add_argument("--json", action="store_true", help="Вывести результат одним JSON (для сравнения между коммитами)")
+    return parser.parse_args(argv)
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=_BACKEND_DIR, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _max_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux — КБ, macOS — байты.
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def _archive_summary(emulator_dir: Path) -> dict[str, Any]:
+    import sqlite3
+
+    from agency_emulator import ARCHIVES_DB_FILE
+
+    conn = sqlite3.connect(str(emulator_dir / ARCHIVES_DB_FILE))
+    try:
+        tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'archive%'")]
+        first = min(tables)
+        total = sum(conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in tables)
+        first_key = conn.execute(f"SELECT MIN(Date_Key) FROM {first}").fetchone()[0]
+        first_time = conn.execute(f"SELECT MIN(TimeEvent) FROM {first}").fetchone()[0]
+    finally:
+        conn.close()
+    return {"events": int(total), "fromDateKey": int(first_key), "fromTime": datetime.fromisoformat(first_time)}
+
+
+async def _run_entry(name: str, call: Callable[[], Awaitable[int]], *, trace: bool) -> dict[str, Any]:
+    from app.services.sync_metrics import reset_sync_metrics, sync_metrics_snapshot
+
+    reset_sync_metrics()
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    rows, calls, latencies = await call()
+    elapsed = time.perf_counter() - started
+    peak = None
+    if trace:
+        peak = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "entry": name,
+        "rows": rows,
+        "calls": calls,
+        "seconds": round(elapsed, 3),
+        "rowsPerSecond": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "callLatencyP50": round(latencies[len(latencies) // 2], 3) if latencies else None,
+        "callLatencyMax": round(latencies[-1], 3) if latencies else None,
+        "tracemallocPeakMb": peak,
+        "maxRssMb": _max_rss_mb(),
+        "stages": sync_metrics_snapshot(),
+    }
+
+
+async def _bench(args: argparse.Namespace, emulator_url: str, summary: dict[str, Any]) -> list[dict[str, Any]]:
+    from sqlalchemy import delete, func, select
+
+    from app.core.config import settings
+    from app.db.init_db import init_db
+    from app.db.session import SessionLocal, engine
+    from app.models.event import Event
+    from app.models.sync_state import SyncState
+    from app.services.backfill_service import run_archive_backfill
+    from app.services.object_cache import invalidate_object_cache
+    from app.services.sync_service import (
+        SYNC_KEY_MSSQL_STATES_WATERMARK,
+        _set_datetime_state,
+        refresh_event_states_from_agency_mssql,
+        sync_events_from_agency_mssql_archives,
+        sync_objects_from_agency_mssql,
+    )
+
+    from agency_emulator import touch_panels
+
+    archives = settings.agency_archives_db_name
+
+    async def _reset_events() -> None:
+        async with SessionLocal() as session:
+            await session.execute(delete(Event))
+            await session.execute(delete(SyncState).where(SyncState.key.like("agency_mssql.%")))
+            await session.commit()
+
+    async def _count_events() -> int:
+        async with SessionLocal() as session:
+            return int((await session.execute(select(func.count()).select_from(Event))).scalar_one())
+
+    async def _timed(fn: Callable[[], Awaitable[dict[str, Any]]], latencies: list[float]) -> dict[str, Any]:
+        started = time.perf_counter()
+        result = await fn()
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    async def _objects(full: bool) -> tuple[int, int, list[float]]:
+        latencies: list[float] = []
+        if not full:
+            touch_panels(args.emulator_dir, args.delta_ratio)
+        invalidate_object_cache()
+        async with SessionLocal() as session:
+            result = await _timed(
+                lambda: sync_objects_from_agency_mssql(session=session, agency_mssql_url=emulator_url, full=full),
+                latencies,
+            )
+        rows = sum(int(result.get(k) or 0) for k in ("sourceObjects", "sourceGroups", "sourceResponsibles", "sourcePhones"))
+        return rows, 1, latencies
+
+    async def _events() -> tuple[int, int, list[float]]:
+        await _reset_events()
+        latencies: list[float] = []
+        async with SessionLocal() as session:
+            while True:
+                result = await _timed(
+                    lambda: sync_events_from_agency_mssql_archives(
+                        session=session,
+                        agency_mssql_url=emulator_url,
+                        archives_db_name=archives,
+                        batch_limit=args.events_limit,
+                    ),
+                    latencies,
+                )
+                if int(result.get("fetched") or 0) < args.events_limit:
+                    break
+        return await _count_events(), len(latencies), latencies
+
+    async def _states() -> tuple[int, int, list[float]]:
+        latencies: list[float] = []
+        rows = 0
+        async with SessionLocal() as session:
+            await _set_datetime_state(session, SYNC_KEY_MSSQL_STATES_WATERMARK, summary["fromTime"])
+            await session.commit()
+            watermark = None
+            while True:
+                result = await _timed(
+                    lambda: refresh_event_states_from_agency_mssql(
+                        session=session,
+                        agency_mssql_url=emulator_url,
+                        archives_db_name=archives,
+                        batch_limit=args.states_limit,
+                    ),
+                    latencies,
+                )
+                rows += int(result.get("fetched") or 0)
+                # Записи на границе водяного знака перечитываются: стоп, когда он не сдвинулся.
+                if int(result.get("fetched") or 0) < args.states_limit or result.get("watermark") == watermark:
+                    break
+                watermark = result.get("watermark")
+        return rows, len(latencies), latencies
+
+    async def _backfill() -> tuple[int, int, list[float]]:
+        await _reset_events()
+        latencies: list[float] = []
+        await _timed(
+            lambda: run_archive_backfill(
+                emulator_url,
+                archives_db_name=archives,
+                from_date_key=summary["fromDateKey"],
+                restart=True,
+            ),
+            latencies,
+        )
+        return await _count_events(), 1, latencies
+
+    calls: dict[str, Callable[[], Awaitable[tuple[int, int, list[float]]]]] = {
+        "objects-full": lambda: _objects(True),
+        "objects-delta": lambda: _objects(False),
+        "events": _events,
+        "states": _states,
+        "backfill": _backfill,
+    }
+
+    await init_db(engine)
+    wanted = [e.strip() for e in args.only.split(",") if e.strip()]
+    unknown = [e for e in wanted if e not in calls]
+    if unknown:
+        raise SystemExit(f"Неизвестные точки входа: {', '.join(unknown)}")
+
+    results = []
+    try:
+        for name in ENTRIES:
+            if name in wanted:
+                results.append(await _run_entry(name, calls[name], trace=args.tracemalloc))
+    finally:
+        await engine.dispose()
+    return results
+
+
+def _print_table(report: dict[str, Any]) -> None:
+    print(f"commit={report['commit']} events={report['source']['events']} db={report['database']}")
+    print(f"{'entry':<14}{'rows':>10}{'calls':>7}{'sec':>10}{'rows/s':>12}{'p50 call':>10}{'rss MB':>9}")
+    for r in report["results"]:
+        print(
+            f"{r['entry']:<14}{r['rows']:>10}{r['calls']:>7}{r['seconds']:>10}"
+            f"{r['rowsPerSecond'] or '-':>12}{r['callLatencyP50'] or '-':>10}{r['maxRssMb'] or '-':>9}"
+        )
+        for pipeline, m in r["stages"].items():
+            stages = ", ".join(
+                f"{stage} p50={s['p50']} p90={s['p90']}"
+                for stage, s in m["stagesSeconds"].items()
+                if "p50" in s
+            )
+            print(f"  {pipeline}: {stages}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
+    args.emulator_dir = Path(args.emulator_dir)
+
+    sys.path.insert(0, str(_BACKEND_DIR))
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+    tmp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        tmp_dir = tempfile.TemporaryDirectory(prefix="svod-bench-")
+        database_url = f"sqlite+aiosqlite:///{Path(tmp_dir.name) / 'svod.db'}"
+
+    # Настройки читаются при импорте app.core.config — окружение задаём до него.
+    summary = _archive_summary(args.emulator_dir)
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["AUTO_SYNC_ENABLED"] = "false"
+    os.environ["AGENCY_MSSQL_ARCHIVE_START_DATE_KEY"] = str(summary["fromDateKey"])
+
+    from agency_emulator import EMULATOR_STATS, install
+
+    from app.core.config import settings
+
+    emulator_url = install(args.emulator_dir, archives_db_name=settings.agency_archives_db_name)
+    settings.agency_database_url = emulator_url
+
+    try:
+        results = asyncio.run(_bench(args, emulator_url, summary))
+    finally:
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    report = {
+        "commit": _git_commit(),
+        "database": database_url.split("://", 1)[0],
+        "source": {"events": summary["events"], "fromDateKey": summary["fromDateKey"]},
+        "settings": {
+            "agencyFetchBatchSize": settings.agency_fetch_batch_size,
+            "syncPipelineDepth": settings.sync_pipeline_depth,
+            "backfillConcurrency": settings.agency_backfill_concurrency,
+        },
+        "emulator": {k: round(v, 3) if isinstance(v, float) else v for k, v in EMULATOR_STATS.items()},
+        "results": results,
+    }
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+    else:
+        _print_table(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Разовая миграция полнотекстового поиска событий на Postgres.
+
+Добавляет events.search_tsv, триггер, заполняет старые строки пачками и строит GIN-индекс
+через CREATE INDEX CONCURRENTLY — API и воркеры при этом продолжают работать (старт
+приложения этих шагов не делает, до завершения миграции поиск идёт через ILIKE):
+
+    python scripts/migrate_event_search.py
+    python scripts/migrate_event_search.py --missing-only   # дозаполнить после прерванного запуска
+
+Повторный запуск безопасен; после изменения состава колонок поиска (EVENT_SEARCH_COLUMNS)
+запускается без --missing-only, чтобы пересчитать все строки.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+_BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=10000, help="Строк в одной транзакции заполнения")
+    parser.add_argument("--missing-only", action="store_true", help="Заполнять только строки без tsvector")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(_BACKEND_DIR))
+    from app.db.session import engine
+    from app.services.event_search import migrate_pg_event_search
+
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("Миграция нужна только для Postgres (на SQLite индекс FTS5 создаётся при старте).")
+
+    async def _run() -> None:
+        try:
+            await migrate_pg_event_search(engine, batch_size=args.batch_size, missing_only=args.missing_only)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
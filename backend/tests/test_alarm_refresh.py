@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any, Iterator
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.event import Event
+from app.services import sync_service
+from app.services.event_counts import count_events
+from app.services.sync_service import (
+    SYNC_KEY_MYSQL_REFRESH_CHANGED_AT,
+    SYNC_KEY_MYSQL_REFRESH_WATERMARK,
+    _alarm_rows_to_events,
+    _upsert_alarm_events,
+    get_sync_value,
+    refresh_recent_alarms_from_agency_mysql,
+    set_last_alarm_id,
+    set_sync_value,
+)
+
+from .conftest import run
+
+# Массовый UPDATE в агентстве: у всех тревог одно время изменения.
+_MODIFIED_AT = datetime(2025, 1, 5, 12, 30)
+
+
+def _alarm(alarm_id: int, **extra: Any) -> dict[str, Any]:
+    row = {
+        "ID_ALARMS": alarm_id,
+        "DATE_ALARM": datetime(2025, 1, 5),
+        "TIME_ALARM": None,
+        "_TS": datetime(2025, 1, 5) + timedelta(minutes=alarm_id),
+        "OBJ_NUMBER": "12",
+        "OBJ_ADRESS": "ул. Лесная, 5",
+        "OBJ_FIO": "ООО Ромашка",
+        "IS_DONE": 0,
+        "_MODIFIED_AT": _MODIFIED_AT,
+    }
+    row.update(extra)
+    return row
+
+
+def _fake_source(rows: list[dict[str, Any]], calls: list[int]):
+    """Та же выборка, что у iter_alarms_window: окно по id или строго после (время, ID_ALARMS)."""
+
+    def _iter(
+        url: str,
+        *,
+        min_id: int,
+        max_id: int,
+        modified_column: str | None,
+        modified_since: datetime | None,
+        modified_after_id: int,
+        limit: int | None,
+        **_: Any,
+    ) -> Iterator[list[dict[str, Any]]]:
+        picked = [r for r in rows if min_id < r["ID_ALARMS"] <= max_id]
+        if modified_column:
+            mark = (modified_since, modified_after_id)
+            picked = sorted(
+                (r for r in picked if (r["_MODIFIED_AT"], r["ID_ALARMS"]) > mark),
+                key=lambda r: (r["_MODIFIED_AT"], r["ID_ALARMS"]),
+            )
+        picked = picked[:limit] if limit is not None else picked
+        calls.append(len(picked))
+        if picked:
+            yield [dict(r) for r in picked]
+
+    return _iter
+
+
+async def _seed(n: int) -> None:
+    async with SessionLocal() as session:
+        events, last_id = _alarm_rows_to_events([_alarm(i) for i in range(1, n + 1)], 0)
+        await _upsert_alarm_events(session, events)
+        await set_last_alarm_id(session, last_id)
+        await session.commit()
+
+
+async def _refresh(session: Any) -> dict[str, Any]:
+    return await refresh_recent_alarms_from_agency_mysql(session, "mysql+pymysql://unused", batch_limit=2)
+
+
+def test_modified_refresh_pages_past_alarms_sharing_timestamp(db: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[int] = []
+    monkeypatch.setattr(settings, "agency_mysql_alarms_modified_column", "UPDATED_AT")
+    monkeypatch.setattr(sync_service, "iter_alarms_window", _fake_source([_alarm(i, IS_DONE=1) for i in range(1, 6)], calls))
+
+    async def _scenario() -> None:
+        await _seed(5)
+        async with SessionLocal() as session:
+            # Водяной знак прежнего формата (только время).
+            await set_sync_value(session, SYNC_KEY_MYSQL_REFRESH_WATERMARK, datetime(2025, 1, 5, 12).isoformat())
+            await session.commit()
+
+            for _ in range(3):
+                await _refresh(session)
+            assert calls == [2, 2, 1]
+            assert (await _refresh(session))["fetched"] == 0
+            assert await get_sync_value(session, SYNC_KEY_MYSQL_REFRESH_WATERMARK) == f"{_MODIFIED_AT.isoformat()};5"
+            statuses = (await session.execute(select(Event.status))).scalars().all()
+            assert statuses == ["resolved"] * 5
+
+    run(_scenario())
+
+
+def test_window_refresh_bumps_data_version_for_count_cache(db: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[int] = []
+    monkeypatch.setattr(settings, "agency_mysql_alarms_modified_column", "")
+    monkeypatch.setattr(sync_service, "iter_alarms_window", _fake_source([_alarm(i, IS_DONE=1) for i in range(1, 4)], calls))
+
+    async def _scenario() -> None:
+        await _seed(3)
+        async with SessionLocal() as session:
+            resolved = Event.status == "resolved"
+            assert await count_events(session, resolved) == (0, "exact")
+
+            result = await _refresh(session)
+            assert result["mode"] == "window" and result["updated"] == 3
+            assert await get_sync_value(session, SYNC_KEY_MYSQL_REFRESH_CHANGED_AT) is not None
+            # Кэш точного total сброшен новой версией данных в sync_state.
+            assert await count_events(session, resolved) == (3, "exact")
+
+    run(_scenario())
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import asyncio
+
+from sqlalchemy import func, select
+
+from app.db.session import SessionLocal
+from app.models.event import Event
+from app.services import sync_leader
+from app.services.backfill_service import run_archive_backfill
+from app.services.sync_leader import SYNC_BUSY, SYNC_LOCK
+
+from .conftest import run
+from .test_event_text import _archive_row, ingest_archive_rows
+
+
+def test_backfill_is_busy_while_another_process_leads_sync(db: None) -> None:
+    async def _scenario() -> None:
+        # Отдельный дескриптор lock-файла ведёт себя как чужой процесс-лидер.
+        other = sync_leader._make_lock()
+        assert await other.acquire()
+        try:
+            result = await run_archive_backfill(
+                "mssql+pyodbc://unused", archives_db_name="pult4db_archives", from_date_key=20250101
+            )
+        finally:
+            await other.release()
+        assert result == SYNC_BUSY
+        assert not sync_leader.is_sync_leader()
+
+    run(_scenario())
+
+
+def test_archive_writes_wait_for_write_lock(db: None) -> None:
+    async def _count() -> int:
+        async with SessionLocal() as session:
+            return (await session.execute(select(func.count()).select_from(Event))).scalar_one()
+
+    async def _scenario() -> None:
+        async with SYNC_LOCK:
+            ingest = asyncio.create_task(ingest_archive_rows([_archive_row(1, "P-0001")], write_lock=SYNC_LOCK))
+            await asyncio.sleep(0.2)
+            assert not ingest.done()
+            assert await _count() == 0
+        await ingest
+        assert await _count() == 1
+
+    run(_scenario())
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from app.db import bulk_upsert as bulk_upsert_module
+from app.db.bulk_upsert import UpsertResult, bulk_upsert, chunk_size
+from app.db.session import SessionLocal
+from app.models.object import Object
+
+from .conftest import run
+
+
+def _obj(i: int, name: str = "Объект") -> dict[str, Any]:
+    return {"id": f"P-{i:04d}", "name": f"{name} {i}", "client_name": "ООО Ромашка", "disabled": False}
+
+
+async def _names(session: Any) -> dict[str, str]:
+    return dict((await session.execute(select(Object.id, Object.name))).all())
+
+
+@pytest.mark.parametrize(
+    ("dialect", "columns", "rows"),
+    [
+        ("sqlite", 20, 1638),  # 32766 // 20: ровно в лимит переменных SQLite
+        ("sqlite", 7, 2000),  # 4680 строк влезло бы, но кусок ограничен _MAX_CHUNK_ROWS
+        ("postgresql", 40, 1638),  # 65535 // 40
+        ("postgresql", 70000, 1),  # колонок больше лимита — всё равно по строке
+        ("mysql", 3, 666),  # неизвестный диалект — консервативные 2000 параметров
+    ],
+)
+def test_chunk_size_fits_dialect_parameter_limit(
+    dialect: str, columns: int, rows: int, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setitem(bulk_upsert_module._MAX_PARAMS, "sqlite", 32766)
+    assert chunk_size(dialect, columns) == rows
+    limit = bulk_upsert_module._MAX_PARAMS.get(dialect, bulk_upsert_module._DEFAULT_MAX_PARAMS)
+    if rows > 1:
+        assert rows * columns <= limit
+
+
+def test_sqlite_upsert_splits_key_lookups_at_parameter_limit(db: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Лимит в 10 переменных: поиск существующих ключей идёт кусками по 10 id.
+    monkeypatch.setitem(bulk_upsert_module._MAX_PARAMS, "sqlite", 10)
+
+    async def _scenario() -> None:
+        async with SessionLocal() as session:
+            first = await bulk_upsert(session, Object, [_obj(i) for i in range(12)])
+            await session.commit()
+            second = await bulk_upsert(
+                session, Object, [_obj(i, "Новое") for i in range(25)], update_columns=["name"]
+            )
+            await session.commit()
+            names = await _names(session)
+
+        assert first.as_dict() == {"inserted": 12, "updated": 0, "skipped": 0}
+        assert second.as_dict() == {"inserted": 13, "updated": 12, "skipped": 0}
+        assert len(names) == 25
+        assert set(names.values()) == {f"Новое {i}" for i in range(25)}
+
+    run(_scenario())
+
+
+def test_sqlite_upsert_dedupes_keys_within_batch(db: None) -> None:
+    async def _scenario() -> None:
+        async with SessionLocal() as session:
+            result = await bulk_upsert(
+                session, Object, [_obj(1, "Первое"), _obj(2), _obj(1, "Последнее")], update_columns=["name"]
+            )
+            await session.commit()
+            names = await _names(session)
+
+        # Побеждает последняя строка с ключом; повтор считается пропущенным.
+        assert result.as_dict() == {"inserted": 2, "updated": 0, "skipped": 1}
+        assert names == {"P-0001": "Последнее 1", "P-0002": "Объект 2"}
+
+    run(_scenario())
+
+
+async def _insert_update_noop(session: Any) -> tuple[UpsertResult, UpsertResult, UpsertResult]:
+    inserted = await bulk_upsert(session, Object, [_obj(i) for i in range(3)])
+    await session.commit()
+    updated = await bulk_upsert(session, Object, [_obj(i, "Новое") for i in range(3)], update_columns=["name"])
+    await session.commit()
+    # DO NOTHING по существующим ключам: ничего не записано, всё пропущено.
+    noop = await bulk_upsert(session, Object, [_obj(i, "Игнор") for i in range(3)])
+    await session.commit()
+    return inserted, updated, noop
+
+
+def _assert_counts(inserted: UpsertResult, updated: UpsertResult, noop: UpsertResult, names: dict[str, str]) -> None:
+    assert inserted.as_dict() == {"inserted": 3, "updated": 0, "skipped": 0}
+    assert updated.as_dict() == {"inserted": 0, "updated": 3, "skipped": 0}
+    assert noop.as_dict() == {"inserted": 0, "updated": 0, "skipped": 3}
+    assert (inserted.written, updated.written, noop.written) == (3, 3, 0)
+    assert names == {f"P-{i:04d}": f"Новое {i}" for i in range(3)}
+
+
+def test_sqlite_upsert_counts_insert_update_and_noop(db: None) -> None:
+    async def _scenario() -> None:
+        async with SessionLocal() as session:
+            results = await _insert_update_noop(session)
+            _assert_counts(*results, await _names(session))
+
+    run(_scenario())
+
+
+def test_postgres_upsert_counts_match_sqlite(pg_engine: AsyncEngine) -> None:
+    sessions = async_sessionmaker(pg_engine, expire_on_commit=False)
+
+    async def _scenario() -> None:
+        async with sessions() as session:
+            results = await _insert_update_noop(session)
+            _assert_counts(*results, await _names(session))
+
+    run(_scenario())
+
+
+def test_postgres_upsert_pages_one_statement(pg_engine: AsyncEngine, monkeypatch: pytest.MonkeyPatch) -> None:
+    # 4 колонки при лимите в 8 параметров: страницы по 2 строки.
+    monkeypatch.setitem(bulk_upsert_module._MAX_PARAMS, "postgresql", 8)
+    sessions = async_sessionmaker(pg_engine, expire_on_commit=False)
+    statements: list[str] = []
+
+    def _capture(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        if statement.lstrip().upper().startswith("INSERT"):
+            statements.append(statement)
+
+    event.listen(pg_engine.sync_engine, "before_cursor_execute", _capture)
+
+    async def _scenario() -> None:
+        async with sessions() as session:
+            first = await bulk_upsert(session, Object, [_obj(i) for i in range(5)])
+            await session.commit()
+            second = await bulk_upsert(
+                session, Object, [_obj(i, "Новое") for i in range(3, 10)], update_columns=["name"]
+            )
+            await session.commit()
+            names = await _names(session)
+
+        assert first.as_dict() == {"inserted": 5, "updated": 0, "skipped": 0}
+        assert second.as_dict() == {"inserted": 5, "updated": 2, "skipped": 0}
+        assert len(names) == 10
+        # Страницы 2+2+1 и 2+2+2+1: полные страницы одного вызова — одна и та же строка SQL.
+        assert len(statements) == 7
+        assert len(set(statements[0:2])) == 1 and statements[2] != statements[0]
+        assert len(set(statements[3:6])) == 1 and statements[6] != statements[3]
+
+    try:
+        run(_scenario())
+    finally:
+        event.remove(pg_engine.sync_engine, "before_cursor_execute", _capture)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from app.db.bulk_upsert import bulk_upsert
+from app.models.event import Event
+from app.services.event_counts import _ExplainJson, count_events
+from app.services.event_search import event_search_condition
+from app.services.event_text import event_text_match
+
+from .conftest import run
+
+
+def _event(i: int) -> dict:
+    return {
+        "id": f"e{i:05d}",
+        "timestamp": datetime(2025, 1, 1) + timedelta(minutes=i),
+        "type": "alarm",
+        "object_id": f"P-{i % 10:04d}",
+        "object_name": "ООО Ромашка",
+        "client_name": "ООО Ромашка",
+        "severity": ("critical", "warning", "info")[i % 3],
+        "status": "active",
+        "description": "",
+        "code_text": "Пожарная тревога" if i % 2 else "Снятие",
+    }
+
+
+def test_explain_binds_expanding_in_and_search_parameters() -> None:
+    stmt = select(Event.id).where(
+        and_(Event.severity.in_(["critical", "warning"]), event_text_match("%ромашка%"))
+    )
+    compiled = _ExplainJson(stmt).compile(dialect=postgresql.psycopg.dialect())
+    sql = str(compiled)
+    assert sql.startswith("EXPLAIN (FORMAT JSON) SELECT events.id")
+    # IN раскрывается при выполнении, остальные значения — именованные параметры драйвера.
+    assert "POSTCOMPILE_severity" in sql
+    assert compiled.params["severity_1"] == ["critical", "warning"]
+    assert "%ромашка%" in compiled.params.values()
+
+
+def test_estimated_count_with_search_filter(pg_engine: AsyncEngine) -> None:
+    sessions = async_sessionmaker(pg_engine, expire_on_commit=False)
+
+    async def _scenario() -> None:
+        async with sessions() as session:
+            await bulk_upsert(session, Event, [_event(i) for i in range(200)])
+            await session.commit()
+        async with sessions() as session:
+            where = and_(
+                Event.severity.in_(["critical", "warning"]),
+                await event_search_condition(session, "тревога"),
+            )
+            total, mode = await count_events(session, where, "estimate")
+            assert mode == "estimate"
+            assert isinstance(total, int) and total >= 1
+
+    run(_scenario())
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import base64
+from datetime import datetime, timedelta
+from typing import Any
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1.events import list_events
+from app.api.v1.objects import list_object_events
+from app.db.bulk_upsert import bulk_upsert
+from app.db.session import SessionLocal
+from app.models.event import Event
+from app.services.event_pages import decode_event_cursor, encode_event_cursor
+
+from .conftest import run
+
+_T0 = datetime(2025, 1, 5, 12, 0, 0, 250000)
+
+
+def _event(event_id: str, ts: datetime, object_id: str = "P-0042") -> dict[str, Any]:
+    return {
+        "id": event_id,
+        "timestamp": ts,
+        "type": "alarm",
+        "object_id": object_id,
+        "object_name": "ООО Ромашка",
+        "client_name": "ООО Ромашка",
+        "severity": "info",
+        "status": "active",
+        "description": "",
+        "code": "E130",
+    }
+
+
+async def _seed() -> list[str]:
+    """Семь событий, пять из них с одним timestamp; возвращает id в порядке ленты."""
+    rows = [_event(f"e{i}", _T0) for i in (3, 1, 4, 5, 2)]
+    rows.append(_event("e9", _T0 + timedelta(seconds=1)))
+    rows.append(_event("e0", _T0 - timedelta(seconds=1)))
+    async with SessionLocal() as session:
+        await bulk_upsert(session, Event, rows)
+        await session.commit()
+    return ["e9", "e5", "e4", "e3", "e2", "e1", "e0"]
+
+
+def _events_page(session: Any, cursor: str | None) -> Any:
+    return list_events(
+        page=1,
+        pageSize=2,
+        dateFrom=None,
+        dateTo=None,
+        type=None,
+        objectId=None,
+        severity=None,
+        status=None,
+        search=None,
+        cursor=cursor,
+        count="exact",
+        session=session,
+    )
+
+
+def _object_page(session: Any, cursor: str | None) -> Any:
+    return list_object_events(object_id="P-0042", page=1, pageSize=2, cursor=cursor, count="exact", session=session)
+
+
+def test_cursor_round_trip() -> None:
+    class _Row:
+        timestamp = _T0
+        id = "mssql:20250105:17|x"
+
+    cursor = encode_event_cursor(_Row())
+    assert "=" not in cursor
+    assert decode_event_cursor(cursor) == (_T0, "mssql:20250105:17|x")
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "!!!",
+        base64.urlsafe_b64encode(b"no-separator").decode(),
+        base64.urlsafe_b64encode(b"not-a-date|e1").decode(),
+        base64.urlsafe_b64encode(b"\xff\xfe|e1").decode(),
+    ],
+)
+def test_malformed_cursor_is_rejected_with_400(db: None, cursor: str) -> None:
+    with pytest.raises(ValueError):
+        decode_event_cursor(cursor)
+
+    async def _scenario() -> None:
+        async with SessionLocal() as session:
+            for page in (_events_page, _object_page):
+                with pytest.raises(HTTPException) as exc:
+                    await page(session, cursor)
+                assert exc.value.status_code == 400
+                assert exc.value.detail["code"] == "VALIDATION"
+
+    run(_scenario())
+
+
+@pytest.mark.parametrize("page", [_events_page, _object_page])
+def test_cursor_pages_walk_timestamp_ties_without_gaps(db: None, page: Any) -> None:
+    async def _scenario() -> None:
+        expected = await _seed()
+        seen: list[str] = []
+        cursor: str | None = ""
+        async with SessionLocal() as session:
+            while cursor is not None:
+                result = await page(session, cursor)
+                assert len(result["data"]) <= 2
+                assert result["hasMore"] is (result["nextCursor"] is not None)
+                seen.extend(e["id"] for e in result["data"])
+                cursor = result["nextCursor"]
+            first = (await page(session, None))["data"][0]
+
+        assert seen == expected
+        # Ленты /events и /objects/{id}/events отдают событие одним сериализатором.
+        assert first["code"] == "E130" and first["objectId"] == "P-0042"
+
+    run(_scenario())
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from sqlalchemy import text
+
+from app.api.v1.events import list_events
+from app.api.v1.search import search_events
+from app.db.bulk_upsert import bulk_upsert
+from app.db.session import SessionLocal, engine
+from app.models.object import Object
+from app.services.event_search import ensure_event_search_index
+
+from .conftest import run
+from .test_event_text import _archive_row, ingest_archive_rows
+
+_LIST_KWARGS = dict(
+    page=1,
+    pageSize=50,
+    dateFrom=None,
+    dateTo=None,
+    type=None,
+    objectId=None,
+    severity=None,
+    status=None,
+    cursor=None,
+    count="exact",
+)
+
+
+def test_full_text_search_finds_mssql_event_by_panel_code_zone_and_line(db: None) -> None:
+    async def _scenario() -> None:
+        async with SessionLocal() as session:
+            await bulk_upsert(session, Object, [{"id": "P-0042", "name": "ООО Ромашка", "client_name": "ООО Ромашка"}])
+            await session.commit()
+        await ingest_archive_rows(
+            [_archive_row(1, "P-0042"), _archive_row(2, "P-0077", Code="R401", Zone=12, Line="L9")]
+        )
+
+        async with SessionLocal() as session:
+
+            async def ids(q: str) -> list[str]:
+                page = await list_events(search=q, session=session, **_LIST_KWARGS)
+                return sorted(e["id"] for e in page["data"])
+
+            assert await ids("P-0042") == ["mssql:20250105:1"]
+            assert await ids("R401") == ["mssql:20250105:2"]
+            assert await ids("12") == ["mssql:20250105:2"]
+            assert await ids("L9") == ["mssql:20250105:2"]
+            assert await ids("ромашка") == ["mssql:20250105:1"]
+            assert [e["id"] for e in await search_events(q="p-0077", session=session)] == ["mssql:20250105:2"]
+
+    run(_scenario())
+
+
+def test_sqlite_fts_is_rebuilt_when_event_rowids_drift(db: None) -> None:
+    async def _scenario() -> None:
+        if engine.dialect.name != "sqlite":
+            return
+        await ingest_archive_rows([_archive_row(1, "P-0042"), _archive_row(2, "P-0077", Code="R401")])
+
+        # Смена rowid (VACUUM, выгрузка/загрузка таблицы) не вызывает триггеры FTS.
+        async with engine.begin() as conn:
+            await conn.execute(text("UPDATE events SET rowid = rowid + 1000"))
+
+        async with SessionLocal() as session:
+            page = await list_events(search="R401", session=session, **_LIST_KWARGS)
+            assert page["data"] == []
+
+        async with engine.begin() as conn:
+            await ensure_event_search_index(conn, "sqlite")
+
+        async with SessionLocal() as session:
+            page = await list_events(search="R401", session=session, **_LIST_KWARGS)
+            assert [e["id"] for e in page["data"]] == ["mssql:20250105:2"]
+
+    run(_scenario())
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from app.db.bulk_upsert import bulk_upsert
+from app.models.event import Event
+from app.services import event_search
+from app.services.event_search import event_search_condition, migrate_pg_event_search
+
+from .conftest import run
+
+
+def _event(i: int, code_text: str) -> dict:
+    return {
+        "id": f"e{i:05d}",
+        "timestamp": datetime(2025, 1, 1) + timedelta(minutes=i),
+        "type": "alarm",
+        "object_id": f"P-{i % 10:04d}",
+        "object_name": "ООО Ромашка",
+        "client_name": "ООО Ромашка",
+        "severity": "info",
+        "status": "active",
+        "description": "",
+        "code_text": code_text,
+    }
+
+
+def test_migration_backfills_and_trigger_keeps_index_fresh(pg_engine: AsyncEngine) -> None:
+    sessions = async_sessionmaker(pg_engine, expire_on_commit=False)
+
+    async def _search(session, q: str) -> list[str]:
+        condition = await event_search_condition(session, q)
+        return list((await session.execute(select(Event.id).where(condition).order_by(Event.id))).scalars().all())
+
+    async def _scenario() -> None:
+        event_search._PG_READY.update(ready=False, checked_at=None)
+        async with sessions() as session:
+            await bulk_upsert(session, Event, [_event(i, "Пожарная тревога" if i % 2 else "Снятие") for i in range(50)])
+            await session.commit()
+
+        # Пачки меньше таблицы: проверяем продвижение границы между транзакциями.
+        result = await migrate_pg_event_search(pg_engine, batch_size=7, log=lambda _: None)
+        assert result["backfilled"] == 50
+        assert (await migrate_pg_event_search(pg_engine, missing_only=True, log=lambda _: None))["backfilled"] == 0
+
+        async with sessions() as session:
+            valid = (
+                await session.execute(
+                    text(
+                        "SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                        "WHERE c.relname = 'ix_events_search_tsv'"
+                    )
+                )
+            ).scalar_one()
+            assert valid is True
+            # Стемминг: «тревоги» находит «тревога».
+            assert len(await _search(session, "тревоги")) == 25
+            # Номер панели (object_id) тоже в индексе.
+            assert await _search(session, "P-0003") == [f"e{i:05d}" for i in range(3, 50, 10)]
+
+            await bulk_upsert(session, Event, [_event(100, "Затопление подвала")])
+            await session.commit()
+            assert await _search(session, "затоплен") == ["e00100"]
+
+            await session.execute(update(Event).where(Event.id == "e00100").values(code_text="Взлом"))
+            await session.commit()
+            assert await _search(session, "затоплен") == []
+            assert await _search(session, "взлом") == ["e00100"]
+
+    try:
+        run(_scenario())
+    finally:
+        event_search._PG_READY.update(ready=False, checked_at=None)
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import select
+
+from app.db.bulk_upsert import bulk_upsert
+from app.db.session import SessionLocal
+from app.models.event import Event
+from app.models.object import Object
+from app.services.event_text import event_text_match, render_description
+from app.services.sync_metrics import track_sync
+from app.services.sync_service import ingest_mssql_archive_stream
+
+from .conftest import run
+
+
+def _archive_row(event_id: int, panel_id: str, **extra: Any) -> dict[str, Any]:
+    row = {
+        "Date_Key": 20250105,
+        "Event_id": event_id,
+        "TimeEvent": datetime(2025, 1, 5, 12, 0, event_id % 60),
+        "Panel_id": panel_id,
+        "Code": "E130",
+        "CodeGroup": 1,
+        "CodeText": "Тревога",
+        "Zone": 7,
+        "Line": "L3",
+    }
+    row.update(extra)
+    return row
+
+
+async def ingest_archive_rows(rows: list[dict[str, Any]], write_lock: asyncio.Lock | None = None) -> None:
+    """Пишет строки архива MSSQL тем же путём, что и синк (преобразование + upsert)."""
+
+    async def _batches():
+        yield rows
+
+    async def _save_cursor(date_key: int, event_id: int) -> None:
+        return None
+
+    async with SessionLocal() as session:
+        with track_sync("test.mssql.events") as sync_run:
+            await ingest_mssql_archive_stream(
+                session, _batches(), 0, 0, sync_run, save_cursor=_save_cursor, write_lock=write_lock
+            )
+
+
+async def _matching_ids(pattern: str) -> list[str]:
+    async with SessionLocal() as session:
+        rows = await session.execute(select(Event.id).where(event_text_match(pattern)).order_by(Event.id))
+        return list(rows.scalars().all())
+
+
+def test_mssql_event_found_by_panel_code_zone_and_line(db: None) -> None:
+    async def _scenario() -> None:
+        async with SessionLocal() as session:
+            # Название объекта — компания: номер панели в object_name не попадает.
+            await bulk_upsert(session, Object, [{"id": "P-0042", "name": "ООО Ромашка", "client_name": "ООО Ромашка"}])
+            await session.commit()
+        await ingest_archive_rows(
+            [_archive_row(1, "P-0042"), _archive_row(2, "P-0077", Code="R401", Zone=12, Line="L9")]
+        )
+
+        async with SessionLocal() as session:
+            stored = await session.get(Event, "mssql:20250105:1")
+        assert stored is not None
+        assert stored.description == ""
+        assert stored.object_name == "ООО Ромашка"
+        assert "Panel_id: P-0042" in render_description(stored)
+
+        assert await _matching_ids("%P-0042%") == ["mssql:20250105:1"]
+        assert await _matching_ids("%R401%") == ["mssql:20250105:2"]
+        assert await _matching_ids("%12%") == ["mssql:20250105:2"]
+        assert await _matching_ids("%L3%") == ["mssql:20250105:1"]
+
+    run(_scenario())
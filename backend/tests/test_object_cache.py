@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from sqlalchemy import update
+
+from app.db.bulk_upsert import bulk_upsert
+from app.db.session import SessionLocal
+from app.models.object import Object
+from app.services.object_cache import get_object_infos
+from app.services.sync_service import SYNC_KEY_MSSQL_OBJECTS_WATERMARK, set_sync_value
+
+from .conftest import run
+
+
+def test_object_rename_by_another_process_reaches_cache(db: None) -> None:
+    async def _scenario() -> None:
+        async with SessionLocal() as session:
+            await bulk_upsert(session, Object, [{"id": "P-0042", "name": "Склад", "client_name": "ООО Ромашка"}])
+            await set_sync_value(session, SYNC_KEY_MSSQL_OBJECTS_WATERMARK, "2025-01-05T12:00:00")
+            await session.commit()
+            assert (await get_object_infos(session, ["P-0042"]))["P-0042"].name == "Склад"
+
+        # Синк объектов в другом процессе: пишет в БД, но не в кэш этого процесса.
+        async with SessionLocal() as other:
+            await other.execute(update(Object).where(Object.id == "P-0042").values(name="Склад №2"))
+            await set_sync_value(other, SYNC_KEY_MSSQL_OBJECTS_WATERMARK, "2025-01-05T13:00:00")
+            await other.commit()
+
+        async with SessionLocal() as session:
+            assert (await get_object_infos(session, ["P-0042"]))["P-0042"].name == "Склад №2"
+
+    run(_scenario())
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from app.api.v1.objects import list_objects
+from app.db.bulk_upsert import bulk_upsert
+from app.db.session import SessionLocal
+from app.models.object import Object
+from app.services import object_search
+
+from .conftest import run
+
+_OBJECTS = [
+    {"id": "P-0100", "name": "Склад", "address": "ул. Лесная, 5", "client_name": "ООО Лесная", "disabled": False},
+    {"id": "P-0200", "name": "Лесная", "address": "пр. Мира, 1", "client_name": "ИП Иванов", "disabled": False},
+    {"id": "P-0300", "name": "Офис", "address": "ул. Садовая, 2", "client_name": "ООО Сад", "disabled": False},
+    {"id": "P-0400", "name": "Лесная дача", "address": None, "client_name": None, "disabled": True},
+]
+
+
+async def _search(session: Any, q: str) -> list[str]:
+    page = await list_objects(
+        page=1,
+        pageSize=50,
+        search=q,
+        includeDisabled=False,
+        includeIdPrefix=False,
+        includeStarPrefix=False,
+        session=session,
+    )
+    return [o["id"] for o in page["data"]]
+
+
+def test_sqlite_search_uses_in_memory_index(db: None) -> None:
+    async def _scenario() -> None:
+        async with SessionLocal() as session:
+            await bulk_upsert(session, Object, _OBJECTS)
+            await session.commit()
+        object_search.invalidate_object_search()
+        async with SessionLocal() as session:
+            # Точное совпадение поля выше подстроки в адресе; отключённый объект скрыт.
+            assert await _search(session, "лесная") == ["P-0200", "P-0100"]
+            assert await _search(session, "p-03") == ["P-0300"]
+
+    run(_scenario())
+
+
+def test_postgres_search_is_plain_ilike_without_pg_trgm(
+    pg_engine: AsyncEngine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    sessions = async_sessionmaker(pg_engine, expire_on_commit=False)
+
+    async def _no_index(session: Any) -> Any:
+        raise AssertionError("in-memory object index must not be used on Postgres")
+
+    async def _scenario() -> None:
+        async with sessions() as session:
+            await bulk_upsert(session, Object, _OBJECTS)
+            await session.commit()
+            available = await object_search._pg_trgm_available(session)
+            await session.rollback()
+        async with sessions() as session:
+            found = await _search(session, "лесная")
+        if available:
+            assert found == ["P-0200", "P-0100"]
+        else:
+            assert found == ["P-0100", "P-0200"]
+
+    monkeypatch.setattr(object_search, "_PG_TRGM", None)
+    monkeypatch.setattr(object_search, "_current_index", _no_index)
+    run(_scenario())
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from app.db.bulk_upsert import bulk_upsert
+from app.db.pg_copy import copy_upsert
+from app.models.event import Event
+
+from .conftest import run
+
+# Значения, которые текстовый формат COPY обязан экранировать.
+_TRICKY = 'Шлейф\t2\nстрока\\путь "кавычки" ;|'
+
+
+def _event(i: int, **extra: Any) -> dict[str, Any]:
+    row = {
+        "id": f"mssql:20250105:{i}",
+        "timestamp": datetime(2025, 1, 5, 12) + timedelta(seconds=i, microseconds=123),
+        "type": "alarm",
+        "object_id": f"P-{i % 7:04d}",
+        "object_name": "ООО Ромашка",
+        "client_name": "ООО Ромашка",
+        "severity": "info",
+        "status": "active",
+        "description": "",
+        "code": "E130",
+        "zone": i,
+        "line": None,
+        "state_is_over_process": bool(i % 2),
+        "result_text": _TRICKY,
+    }
+    row.update(extra)
+    return row
+
+
+def test_copy_upsert_counts_and_round_trips_values(pg_engine: AsyncEngine) -> None:
+    sessions = async_sessionmaker(pg_engine, expire_on_commit=False)
+
+    async def _scenario() -> None:
+        async with sessions() as session:
+            first = await bulk_upsert(session, Event, [_event(i) for i in range(120)], copy_min_rows=1)
+            await session.commit()
+
+            # Вторая пачка в той же сессии: staging-таблица переиспользуется на соединении.
+            second = await bulk_upsert(
+                session,
+                Event,
+                [_event(i, status="resolved") for i in range(100, 150)],
+                update_columns=["status"],
+                copy_min_rows=1,
+            )
+            noop = await bulk_upsert(session, Event, [_event(i) for i in range(140, 150)], copy_min_rows=1)
+            await session.commit()
+
+            assert first.as_dict() == {"inserted": 120, "updated": 0, "skipped": 0}
+            assert second.as_dict() == {"inserted": 30, "updated": 20, "skipped": 0}
+            assert noop.as_dict() == {"inserted": 0, "updated": 0, "skipped": 10}
+
+            row = (await session.execute(select(Event).where(Event.id == "mssql:20250105:7"))).scalar_one()
+            assert row.result_text == _TRICKY
+            assert row.timestamp == datetime(2025, 1, 5, 12, 0, 7, 123)
+            assert (row.zone, row.line, row.state_is_over_process) == (7, None, True)
+            statuses = (await session.execute(select(Event.status).where(Event.zone >= 100))).scalars().all()
+            assert sorted(set(statuses)) == ["resolved"]
+            assert (await session.execute(text("SELECT count(*) FROM events"))).scalar_one() == 150
+
+    run(_scenario())
+
+
+def test_copy_upsert_collapses_duplicate_keys_and_rolls_back(pg_engine: AsyncEngine) -> None:
+    sessions = async_sessionmaker(pg_engine, expire_on_commit=False)
+
+    async def _scenario() -> None:
+        async with sessions() as session:
+            # Напрямую, без _dedupe из bulk_upsert: ON CONFLICT DO UPDATE не должен упасть
+            # на двух строках с одним ключом.
+            inserted, updated = await copy_upsert(
+                session,
+                Event.__table__,
+                [_event(1), _event(1, status="resolved"), _event(2)],
+                conflict_columns=("id",),
+                update_columns=["status"],
+            )
+            assert (inserted, updated) == (2, 0)
+            await session.rollback()
+
+            assert (await session.execute(text("SELECT count(*) FROM events"))).scalar_one() == 0
+            # После отката (staging пропала вместе с транзакцией) COPY снова работает.
+            assert await copy_upsert(session, Event.__table__, [_event(3)], conflict_columns=("id",)) == (1, 0)
+            await session.commit()
+
+    run(_scenario())
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Iterator
+
+import pytest
+from sqlalchemy import select, update
+
+from app.db.session import SessionLocal
+from app.models.event import Event
+from app.services import sync_service
+from app.services.event_text import render_description
+from app.services.sync_service import (
+    SYNC_KEY_MSSQL_STATES_WATERMARK,
+    get_mssql_states_watermark,
+    refresh_event_states_from_agency_mssql,
+    set_sync_value,
+)
+
+from .conftest import run
+from .test_event_text import _archive_row, ingest_archive_rows
+
+_CHANGED_AT = datetime(2025, 1, 5, 12, 30)
+
+
+def _changes(person: str) -> list[dict[str, Any]]:
+    # Пять событий, обработанных оператором одной операцией: общий ChangedAt.
+    return [
+        _archive_row(i, "P-0042", PersonName=person, OperationTime=_CHANGED_AT, ChangedAt=_CHANGED_AT)
+        for i in range(1, 6)
+    ]
+
+
+def _fake_source(rows: list[dict[str, Any]], calls: list[int]):
+    """Та же выборка, что у iter_event_state_changes_since: строго после водяного знака, TOP(limit)."""
+
+    def _iter(url: str, *, since: datetime, after_date_key: int, after_event_id: int, limit: int, **_: Any) -> Iterator:
+        mark = (since, after_date_key, after_event_id)
+        picked = sorted(
+            (r for r in rows if (r["ChangedAt"], r["Date_Key"], r["Event_id"]) > mark),
+            key=lambda r: (r["ChangedAt"], r["Date_Key"], r["Event_id"]),
+        )[:limit]
+        calls.append(len(picked))
+        if picked:
+            yield [dict(r) for r in picked]
+
+    return _iter
+
+
+def test_state_refresh_advances_past_rows_sharing_changed_at(db: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[int] = []
+    monkeypatch.setattr(sync_service, "iter_resolved_state_changes", _fake_source(_changes("Иванов"), calls))
+
+    async def _scenario() -> None:
+        await ingest_archive_rows([_archive_row(i, "P-0042") for i in range(1, 6)])
+        async with SessionLocal() as session:
+            # Водяной знак прежнего формата (только время): граница перечитывается целиком.
+            await set_sync_value(session, SYNC_KEY_MSSQL_STATES_WATERMARK, datetime(2025, 1, 5, 12).isoformat())
+            await session.commit()
+
+            for _ in range(3):
+                await refresh_event_states_from_agency_mssql(
+                    session, "mssql+pyodbc://unused", archives_db_name="pult4db_archives", batch_limit=2
+                )
+            assert calls == [2, 2, 1]
+            assert await get_mssql_states_watermark(session) == (_CHANGED_AT, 20250105, 5)
+
+            result = await refresh_event_states_from_agency_mssql(
+                session, "mssql+pyodbc://unused", archives_db_name="pult4db_archives", batch_limit=2
+            )
+            assert result["fetched"] == 0
+            assert result["watermark"] == f"{_CHANGED_AT.isoformat()};20250105:5"
+            persons = (await session.execute(select(Event.person))).scalars().all()
+            assert persons == ["Иванов"] * 5
+
+    run(_scenario())
+
+
+def test_state_refresh_clears_legacy_description(db: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[int] = []
+    monkeypatch.setattr(sync_service, "iter_resolved_state_changes", _fake_source(_changes("Иванов")[:1], calls))
+
+    async def _no_lookup(*args: Any, **kwargs: Any) -> Any:
+        raise AssertionError("state refresh must not enrich events with objects")
+
+    async def _scenario() -> None:
+        await ingest_archive_rows([_archive_row(1, "P-0042")])
+        monkeypatch.setattr(sync_service, "get_object_infos", _no_lookup)
+        async with SessionLocal() as session:
+            # Событие, загруженное до структурированных колонок: состояние зашито в description.
+            await session.execute(update(Event).values(description="Код: E130\nСтатус: Новое\nОператор: —"))
+            await set_sync_value(session, SYNC_KEY_MSSQL_STATES_WATERMARK, datetime(2025, 1, 5, 12).isoformat())
+            await session.commit()
+
+            result = await refresh_event_states_from_agency_mssql(
+                session, "mssql+pyodbc://unused", archives_db_name="pult4db_archives", batch_limit=10
+            )
+            assert result["updated"] == 1
+            event = (await session.execute(select(Event))).scalar_one()
+            assert event.description == ""
+            assert "Иванов" in render_description(event)
+            assert "Статус: Новое" not in render_description(event)
+
+    run(_scenario())
@@ -27,7 +27,7 @@ const severityStyles: Record<EventSeverity, string> = {
 
 export function RecentEvents() {
   const { data: page } = useApiGet(
-    '/events?page=1&pageSize=5',
+    '/events?page=1&pageSize=5&count=none',
     { data: [], total: 0, page: 1, pageSize: 5, totalPages: 1 }
   );
   const recentEvents = page.data;
@@ -0,0 +1,17 @@
+import { PaginatedResponse } from '@/types';
+
+// total/totalPages are null when the list was requested with count=none.
+export function hasNextPage(page: PaginatedResponse<unknown>, pageNumber: number): boolean {
+  if (page.totalPages != null) return pageNumber < page.totalPages;
+  return page.hasMore ?? false;
+}
+
+export function formatTotal(page: PaginatedResponse<unknown>): string {
+  if (page.total == null) return '—';
+  return page.countMode === 'estimate' ? `≈${page.total}` : String(page.total);
+}
+
+export function formatShown(page: PaginatedResponse<unknown>): string {
+  const shown = `Показано ${page.data.length}`;
+  return page.total == null ? shown : `${shown} из ${formatTotal(page)}`;
+}
@@ -7,6 +7,8 @@ import { Download, RefreshCw } from 'lucide-react';
 import { toast } from '@/hooks/use-toast';
 import { useMemo, useState } from 'react';
 import { API_BASE_URL } from '@/lib/api';
+import { formatShown, formatTotal, hasNextPage } from '@/lib/pagination';
+import { Event, PaginatedResponse } from '@/types';
 
 const defaultFilters: EventFiltersValue = {
   search: '',
@@ -42,7 +44,7 @@ export default function Events() {
     return `/events?${params.toString()}`;
   }, [appliedFilters, pageNumber]);
 
-  const { data: page, refetch, error, isLoading } = useApiGet(path, {
+  const { data: page, refetch, error, isLoading } = useApiGet<PaginatedResponse<Event>>(path, {
     data: [],
     total: 0,
     page: 1,
@@ -59,7 +61,7 @@ export default function Events() {
         {/* Actions bar */}
         <div className="flex items-center justify-between">
           <div className="flex items-center gap-2 text-sm text-muted-foreground">
-            <span>Найдено: <strong className="text-foreground">{page.total}</strong> событий</span>
+            <span>Найдено: <strong className="text-foreground">{formatTotal(page)}</strong> событий</span>
           </div>
           <div className="flex items-center gap-2">
             <Button variant="outline" size="sm" className="gap-2" onClick={refetch}>
@@ -114,7 +116,7 @@ export default function Events() {
         {/* Pagination */}
         <div className="flex items-center justify-between text-sm text-muted-foreground">
           <span>
-            {isLoading ? 'Загрузка…' : `Показано ${page.data.length} из ${page.total}`}
+            {isLoading ? 'Загрузка…' : formatShown(page)}
           </span>
           <div className="flex items-center gap-2">
             <Button
@@ -128,8 +130,8 @@ export default function Events() {
             <Button
               variant="outline"
               size="sm"
-              disabled={pageNumber >= page.totalPages}
-              onClick={() => setPageNumber((p) => Math.min(page.totalPages, p + 1))}
+              disabled={!hasNextPage(page, pageNumber)}
+              onClick={() => setPageNumber((p) => p + 1)}
             >
               Вперёд
             </Button>
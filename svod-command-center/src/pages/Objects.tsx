@@ -13,6 +13,7 @@ import {
 } from '@/components/ui/table';
 import { useMemo, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { formatShown, formatTotal, hasNextPage } from '@/lib/pagination';
 
 const emptyPage: PaginatedResponse<ObjectListItem> = {
   data: [],
@@ -43,7 +44,7 @@ export default function Objects() {
       <div className="space-y-4 animate-fade-in">
         <div className="flex items-center justify-between gap-3">
           <div className="text-sm text-muted-foreground">
-            Найдено: <strong className="text-foreground">{page.total}</strong>
+            Найдено: <strong className="text-foreground">{formatTotal(page)}</strong>
           </div>
           <div className="flex items-center gap-2">
             <Input
@@ -125,7 +126,7 @@ export default function Objects() {
         </div>
 
         <div className="flex items-center justify-between text-sm text-muted-foreground">
-          <span>{isLoading ? 'Загрузка…' : `Показано ${page.data.length} из ${page.total}`}</span>
+          <span>{isLoading ? 'Загрузка…' : formatShown(page)}</span>
           <div className="flex items-center gap-2">
             <Button
               variant="outline"
@@ -138,8 +139,8 @@ export default function Objects() {
             <Button
               variant="outline"
               size="sm"
-              disabled={pageNumber >= page.totalPages}
-              onClick={() => setPageNumber((p) => Math.min(page.totalPages, p + 1))}
+              disabled={!hasNextPage(page, pageNumber)}
+              onClick={() => setPageNumber((p) => p + 1)}
             >
               Вперёд
             </Button>
@@ -4,6 +4,7 @@ import { apiGet } from '@/lib/api';
 import { Event, ObjectDetails as ObjectDetailsType, PaginatedResponse } from '@/types';
 import { useMemo, useState } from 'react';
 import { useParams } from 'react-router-dom';
+import { formatShown, formatTotal, hasNextPage } from '@/lib/pagination';
 import { Separator } from '@/components/ui/separator';
 import { EventsTable } from '@/components/events/EventsTable';
 import { Button } from '@/components/ui/button';
@@ -175,7 +176,7 @@ export default function ObjectDetails() {
           <div className="flex items-center justify-between">
             <div className="text-lg font-semibold text-foreground">События объекта</div>
             <div className="text-sm text-muted-foreground">
-              {eventsLoading ? 'Загрузка…' : `Всего: ${eventsPageData.total}`}
+              {eventsLoading ? 'Загрузка…' : `Всего: ${formatTotal(eventsPageData)}`}
             </div>
           </div>
 
@@ -185,7 +186,7 @@ export default function ObjectDetails() {
 
           <div className="flex items-center justify-between text-sm text-muted-foreground">
             <span>
-              {eventsLoading ? 'Загрузка…' : `Показано ${eventsPageData.data.length} из ${eventsPageData.total}`}
+              {eventsLoading ? 'Загрузка…' : formatShown(eventsPageData)}
             </span>
             <div className="flex items-center gap-2">
               <Button
@@ -199,8 +200,8 @@ export default function ObjectDetails() {
               <Button
                 variant="outline"
                 size="sm"
-                disabled={eventsPage >= eventsPageData.totalPages}
-                onClick={() => setEventsPage((p) => Math.min(eventsPageData.totalPages, p + 1))}
+                disabled={!hasNextPage(eventsPageData, eventsPage)}
+                onClick={() => setEventsPage((p) => p + 1)}
               >
                 Вперёд
               </Button>
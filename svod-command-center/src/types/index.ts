@@ -130,10 +130,15 @@ export interface EventFilters {
 // API Response Types
 export interface PaginatedResponse<T> {
   data: T[];
-  total: number;
+  // null when the total was not counted (countMode: 'none')
+  total: number | null;
   page: number;
   pageSize: number;
-  totalPages: number;
+  totalPages: number | null;
+  // exact: cached until the next sync; estimate: planner estimate; none: total not counted
+  countMode?: 'exact' | 'estimate' | 'none';
+  hasMore?: boolean;
+  nextCursor?: string | null;
 }
 
 export interface ApiError {